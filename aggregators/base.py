@@ -0,0 +1,58 @@
+"""
+Interface shared by passive data sources.
+
+An aggregator fetches new activity from one source and yields it in
+batches of log entry payloads (the JSON accepted by /api/logs), each with
+the cursors that become valid once that batch is stored. The runtime
+(aggregators/runtime.py) writes the batches and then saves the cursors, so
+a failed run resumes from the last stored batch.
+"""
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Type
+
+from aggregators.cursors import SyncCursors, get_sync_cursors
+
+# (entries, cursors): cursors is {key: value} for SyncCursors under the source name
+Batch = Tuple[List[Dict], Dict[str, str]]
+
+# name -> aggregator class, filled by @register
+REGISTRY: Dict[str, Type["Aggregator"]] = {}
+
+
+def register(cls: Type["Aggregator"]) -> Type["Aggregator"]:
+    """Class decorator making an aggregator available to the runtime by name"""
+    REGISTRY[cls.name] = cls
+    return cls
+
+
+class Aggregator(ABC):
+    name = ""
+
+    def __init__(self, cursors: Optional[SyncCursors] = None):
+        self.cursors = cursors if cursors is not None else get_sync_cursors()
+        # Minutes between runs and requests in flight; subclasses read theirs from settings
+        self.interval_minutes = 60.0
+        self.concurrency = 1
+
+    def configured(self) -> bool:
+        """False when the source lacks the settings it needs; the runtime skips it"""
+        return True
+
+    @asynccontextmanager
+    async def session(self):
+        """
+        Connections shared by the runs inside the block; a long-running
+        runtime keeps one open so pools are reused across runs
+        """
+        yield None
+
+    def cursor(self, key: str) -> Optional[str]:
+        return self.cursors.get(self.name, key)
+
+    @abstractmethod
+    def fetch(self) -> AsyncIterator[Batch]:
+        """
+        Async generator yielding (entries, cursors) batches of everything
+        new since the stored cursors
+        """
@@ -0,0 +1,60 @@
+"""
+Persistent high-water marks for incremental aggregator syncs.
+
+Each (source, key) pair, e.g. ("github", "owner/repo:commits"), keeps
+the newest timestamp a sync has fully delivered, so the next sync asks
+only for what came after it.
+"""
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from config import settings
+
+
+class SyncCursors:
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_cursors ("
+            "source TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, updated_at REAL NOT NULL, "
+            "PRIMARY KEY (source, key))"
+        )
+
+    def get(self, source: str, key: str) -> Optional[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT value FROM sync_cursors WHERE source = ? AND key = ?", (source, key)
+            ).fetchall()
+        return rows[0][0] if rows else None
+
+    def set_many(self, source: str, values: Dict[str, str]):
+        """Store several cursors in one transaction"""
+        if not values:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sync_cursors (source, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                [(source, key, value, now) for key, value in values.items()]
+            )
+            self._conn.execute("COMMIT")
+
+    def clear(self, source: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sync_cursors WHERE source = ?", (source,))
+
+
+_default_cursors: Optional[SyncCursors] = None
+
+
+def get_sync_cursors() -> SyncCursors:
+    """Process-wide cursor store at SYNC_STATE_PATH"""
+    global _default_cursors
+    if _default_cursors is None:
+        _default_cursors = SyncCursors(settings.sync_state_path)
+    return _default_cursors
@@ -1,23 +1,125 @@
 import httpx
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 from config import settings
+from aggregators.base import Aggregator, Batch, register
+from aggregators.cursors import SyncCursors
+from aggregators.http_cache import ConditionalCache, get_github_cache
+from aggregators.rate_limit import RateLimitScheduler
 import asyncio
 
 
-class GitHubAggregator:
-    def __init__(self):
+def _parse_time(value: str) -> datetime:
+    """GitHub timestamp ("2024-01-01T10:00:00Z") as naive UTC"""
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+
+
+@register
+class GitHubAggregator(Aggregator):
+    name = "github"
+    
+    def __init__(self, cache: Optional[ConditionalCache] = None, cursors: Optional[SyncCursors] = None):
+        # High-water marks per "repo:stream"; fetches record the newest
+        # timestamp seen and the runtime stores them once the entries are logged
+        super().__init__(cursors)
+        self.interval_minutes = settings.github_sync_interval_minutes
+        self.concurrency = settings.github_max_concurrency
+        # Repos without a cursor start this many days back
+        self.days = 1
         self.token = settings.github_token
         self.username = settings.github_username
         self.repos = settings.github_repos.split(",") if settings.github_repos else []
-        self.base_url = "https://api.github.com"
+        self.base_url = settings.github_api_url.rstrip("/")
         self.headers = {
             "Authorization": f"token {self.token}",
             "Accept": "application/vnd.github.v3+json"
         }
+        # Shared by every request while a sync is running (see session())
+        self.client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.cache = cache if cache is not None else get_github_cache()
+        self.rate_limiter = RateLimitScheduler()
+        self.stats = {"requests": 0, "not_modified": 0}
+        self.pending_cursors: Dict[str, str] = {}
+    
+    @asynccontextmanager
+    async def session(self):
+        """
+        One pooled client (kept-alive connections, one TLS handshake per
+        connection) for all requests inside the block, with at most
+        GITHUB_MAX_CONCURRENCY requests in flight.
+        """
+        if self.client is not None:
+            yield self.client
+            return
+        
+        concurrency = self.concurrency
+        async with httpx.AsyncClient(
+            timeout=settings.github_timeout_seconds,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        ) as client:
+            self.client = client
+            self._semaphore = asyncio.Semaphore(concurrency)
+            try:
+                yield client
+            finally:
+                self.client = None
+                self._semaphore = None
+    
+    async def _get_page(self, url: str, params: Optional[Dict] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        GET one page of a GitHub API list: (items, URL of the next page).
+        Sends the stored ETag / Last-Modified and reuses the stored page on
+        304; waits and retries as the rate limit requires.
+        """
+        key = str(httpx.URL(url, params=params))
+        cached = self.cache.get(key) if self.cache is not None else None
+        headers = dict(self.headers)
+        if self.cache is not None:
+            headers.update(self.cache.conditional_headers(cached))
+        
+        async with self.session() as client:
+            attempt = 0
+            while True:
+                await self.rate_limiter.wait()
+                async with self._semaphore:
+                    response = await client.get(url, headers=headers, params=params)
+                self.stats["requests"] += 1
+                self.rate_limiter.update(response)
+                delay = self.rate_limiter.retry_delay(response, attempt)
+                if delay is None:
+                    break
+                print(f"⏳ GitHub returned {response.status_code} for {key}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+        
+        if response.status_code == 304 and cached is not None:
+            self.stats["not_modified"] += 1
+            self.cache.touch(key)
+            return cached["body"]["items"], cached["body"]["next"]
+        
+        response.raise_for_status()
+        page = {"items": response.json(), "next": response.links.get("next", {}).get("url")}
+        if self.cache is not None:
+            self.cache.set(key, response.headers.get("etag"), response.headers.get("last-modified"), page)
+        return page["items"], page["next"]
+    
+    def _cursor(self, repo: str, stream: str) -> Optional[datetime]:
+        value = self.cursor(f"{repo}:{stream}")
+        return _parse_time(value) if value else None
+    
+    def _advance(self, repo: str, stream: str, value: Optional[str]):
+        key = f"{repo}:{stream}"
+        if value and (key not in self.pending_cursors or _parse_time(value) > _parse_time(self.pending_cursors[key])):
+            self.pending_cursors[key] = value
     
     async def fetch_commits(self, repo: str, since: datetime = None) -> List[Dict]:
-        """Fetch commits from a repository"""
+        """
+        Fetch commits from a repository committed after `since`, following
+        pagination; records the newest commit time as the commits cursor.
+        """
         if not self.token or not self.username:
             return []
         
@@ -30,29 +132,40 @@ class GitHubAggregator:
         }
         
         if since:
-            params["since"] = since.isoformat()
+            params["since"] = since.strftime("%Y-%m-%dT%H:%M:%SZ")
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, headers=self.headers, params=params)
-                response.raise_for_status()
-                commits = response.json()
-                
-                return [
-                    {
+        commits = []
+        try:
+            while url:
+                page, url = await self._get_page(url, params)
+                # The next-page URL already carries the query
+                params = None
+                for commit in page:
+                    committed_at = commit["commit"]["committer"]["date"]
+                    # `since` is inclusive; the cursor's own commit was already synced
+                    if since and _parse_time(committed_at) <= since:
+                        continue
+                    commits.append({
                         "sha": commit["sha"],
                         "message": commit["commit"]["message"],
                         "date": commit["commit"]["author"]["date"],
                         "repo": repo
-                    }
-                    for commit in commits
-                ]
-            except Exception as e:
-                print(f"Error fetching commits from {repo}: {str(e)}")
-                return []
+                    })
+                    self._advance(repo, "commits", committed_at)
+        except Exception as e:
+            print(f"Error fetching commits from {repo}: {str(e)}")
+            # Keep the cursor where it was so the next sync retries
+            self.pending_cursors.pop(f"{repo}:commits", None)
+            return []
+        
+        return commits
     
     async def fetch_prs(self, repo: str, since: datetime = None) -> List[Dict]:
-        """Fetch pull requests from a repository"""
+        """
+        Fetch the user's pull requests updated after `since`: pages sorted
+        by last update are followed only until PRs older than `since` show
+        up. Records the newest update time as the PRs cursor.
+        """
         if not self.token or not self.username:
             return []
         
@@ -61,109 +174,136 @@ class GitHubAggregator:
         url = f"{self.base_url}/repos/{owner}/{repo_name}/pulls"
         params = {
             "state": "all",
+            "sort": "updated",
+            "direction": "desc",
             "per_page": 100
         }
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, headers=self.headers, params=params)
-                response.raise_for_status()
-                prs = response.json()
-                
-                # Filter by author and date
-                filtered_prs = []
-                for pr in prs:
+        filtered_prs = []
+        try:
+            while url:
+                page, url = await self._get_page(url, params)
+                params = None
+                for pr in page:
+                    if since and _parse_time(pr["updated_at"]) <= since:
+                        # Everything after this was updated even earlier
+                        url = None
+                        break
+                    self._advance(repo, "pulls", pr["updated_at"])
+                    # Filter by author
                     if pr["user"]["login"].lower() == self.username.lower():
-                        pr_date = datetime.fromisoformat(pr["created_at"].replace("Z", "+00:00"))
-                        if not since or pr_date >= since:
-                            filtered_prs.append({
-                                "number": pr["number"],
-                                "title": pr["title"],
-                                "state": pr["state"],
-                                "created_at": pr["created_at"],
-                                "repo": repo
-                            })
-                
-                return filtered_prs
-            except Exception as e:
-                print(f"Error fetching PRs from {repo}: {str(e)}")
-                return []
+                        filtered_prs.append({
+                            "number": pr["number"],
+                            "title": pr["title"],
+                            "state": pr["state"],
+                            "created_at": pr["created_at"],
+                            "repo": repo
+                        })
+        except Exception as e:
+            print(f"Error fetching PRs from {repo}: {str(e)}")
+            self.pending_cursors.pop(f"{repo}:pulls", None)
+            return []
+        
+        return filtered_prs
     
-    async def sync_to_loglify(self, entries: List[Dict], entry_type: str):
-        """Send entries to Loglify API"""
-        async with httpx.AsyncClient() as client:
-            for entry in entries:
-                if entry_type == "commit":
-                    log_entry = {
-                        "source": "github",
-                        "raw_text": entry["message"],
-                        "action": "GitHub Commit",
-                        "project": entry["repo"],
-                        "tags": ["coding", "github", "commit"],
-                        "metadata": {
-                            "sha": entry["sha"],
-                            "repo": entry["repo"]
-                        }
-                    }
-                elif entry_type == "pr":
-                    log_entry = {
-                        "source": "github",
-                        "raw_text": entry["title"],
-                        "action": f"GitHub PR ({entry['state']})",
-                        "project": entry["repo"],
-                        "tags": ["coding", "github", "pr"],
-                        "metadata": {
-                            "number": entry["number"],
-                            "repo": entry["repo"]
-                        }
-                    }
-                else:
-                    continue
-                
-                try:
-                    response = await client.post(
-                        f"http://localhost:{settings.port}/api/logs",
-                        json=log_entry,
-                        timeout=10.0
-                    )
-                    if response.status_code != 200:
-                        print(f"Error logging entry: {response.text}")
-                except Exception as e:
-                    print(f"Error sending to Loglify: {str(e)}")
+    async def fetch_repo(self, repo: str, since: datetime = None,
+                         use_cursors: bool = True) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Commits and PRs of one repository, fetched concurrently; each stream
+        continues from its cursor when it has one, else from `since`.
+        Prints the time taken.
+        """
+        started = time.perf_counter()
+        commits_since = (use_cursors and self._cursor(repo, "commits")) or since
+        prs_since = (use_cursors and self._cursor(repo, "pulls")) or since
+        async with self.session():
+            commits, prs = await asyncio.gather(
+                self.fetch_commits(repo, commits_since),
+                self.fetch_prs(repo, prs_since)
+            )
+        print(f"  {repo}: {len(commits)} commits, {len(prs)} PRs in {time.perf_counter() - started:.2f}s")
+        return commits, prs
     
-    async def sync(self, days: int = 1):
-        """Sync GitHub data from the last N days"""
-        if not self.token or not self.username:
-            print("GitHub token or username not configured")
-            return
-        
-        since = datetime.utcnow() - timedelta(days=days)
-        
-        all_commits = []
-        all_prs = []
-        
+    async def fetch_all(self, since: datetime = None, use_cursors: bool = True) -> Tuple[List[Dict], List[Dict]]:
+        """Commits and PRs of every tracked repository, all repos fetched concurrently"""
         repos_to_sync = self.repos if self.repos else [self.username]
         
-        for repo in repos_to_sync:
-            commits = await self.fetch_commits(repo, since)
-            all_commits.extend(commits)
-            
-            prs = await self.fetch_prs(repo, since)
-            all_prs.extend(prs)
+        async with self.session():
+            results = await asyncio.gather(
+                *(self.fetch_repo(repo, since, use_cursors) for repo in repos_to_sync)
+            )
         
-        print(f"Found {len(all_commits)} commits and {len(all_prs)} PRs")
+        all_commits = [commit for commits, _ in results for commit in commits]
+        all_prs = [pr for _, prs in results for pr in prs]
+        return all_commits, all_prs
+    
+    def to_log_entry(self, entry: Dict, entry_type: str) -> Optional[Dict]:
+        """Convert a fetched commit or PR into a log entry payload"""
+        if entry_type == "commit":
+            return {
+                "source": "github",
+                "raw_text": entry["message"],
+                "action": "GitHub Commit",
+                "project": entry["repo"],
+                "tags": ["coding", "github", "commit"],
+                "timestamp": entry["date"],
+                "metadata": {
+                    "sha": entry["sha"],
+                    "repo": entry["repo"]
+                }
+            }
+        elif entry_type == "pr":
+            return {
+                "source": "github",
+                "raw_text": entry["title"],
+                "action": f"GitHub PR ({entry['state']})",
+                "project": entry["repo"],
+                "tags": ["coding", "github", "pr"],
+                "timestamp": entry["created_at"],
+                "metadata": {
+                    "number": entry["number"],
+                    "repo": entry["repo"]
+                }
+            }
+        return None
+    
+    def configured(self) -> bool:
+        return bool(self.token and self.username)
+    
+    async def fetch(self, use_cursors: bool = True) -> AsyncIterator[Batch]:
+        """
+        Commits and PRs since the last sync of each repo (or from the last
+        `days` days for repos never synced, or with use_cursors=False),
+        as one batch carrying the advanced cursors
+        """
+        since = (datetime.utcnow() - timedelta(days=self.days)).replace(hour=0, minute=0, second=0, microsecond=0)
+        started = time.perf_counter()
+        self.pending_cursors = {}
+        self.stats = {"requests": 0, "not_modified": 0}
         
-        await self.sync_to_loglify(all_commits, "commit")
-        await self.sync_to_loglify(all_prs, "pr")
+        all_commits, all_prs = await self.fetch_all(since, use_cursors)
         
-        print("✅ GitHub sync completed")
+        print(f"Found {len(all_commits)} commits and {len(all_prs)} PRs "
+              f"in {time.perf_counter() - started:.2f}s")
+        print(f"GitHub API: {self.stats['requests']} requests, {self.stats['not_modified']} not modified, "
+              f"{self.rate_limiter.remaining} remaining, {self.rate_limiter.waited:.1f}s waiting for the rate limit")
+        
+        entries = [self.to_log_entry(commit, "commit") for commit in all_commits]
+        entries += [self.to_log_entry(pr, "pr") for pr in all_prs]
+        yield entries, self.pending_cursors
 
 
 async def main():
+    from aggregators.runtime import AggregatorRuntime
+    from database import dispose_engines
+    
     aggregator = GitHubAggregator()
-    await aggregator.sync(days=7)
+    aggregator.days = 7
+    try:
+        await AggregatorRuntime([aggregator]).run_once(aggregator)
+    finally:
+        await dispose_engines()
 
 
 if __name__ == "__main__":
     asyncio.run(main())
-
@@ -0,0 +1,80 @@
+"""
+Persistent validator cache for conditional GET requests.
+
+For each request URL the last ETag / Last-Modified and response body are
+kept in a SQLite file, so the next request can send If-None-Match /
+If-Modified-Since and reuse the stored body when the server answers
+304 Not Modified (which GitHub does not count against the rate limit).
+"""
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from config import settings
+
+
+class ConditionalCache:
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS http_cache ("
+            "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body TEXT NOT NULL, "
+            "last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_http_cache_last_used ON http_cache (last_used)")
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """Stored validators and parsed body for url, or None"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT etag, last_modified, body FROM http_cache WHERE url = ?", (url,)
+            ).fetchall()
+        if not rows:
+            return None
+        etag, last_modified, body = rows[0]
+        return {"etag": etag, "last_modified": last_modified, "body": json.loads(body)}
+
+    def conditional_headers(self, cached: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        headers = {}
+        if cached and cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+        return headers
+
+    def set(self, url: str, etag: Optional[str], last_modified: Optional[str], body: Any):
+        if not etag and not last_modified:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO http_cache (url, etag, last_modified, body, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (url, etag, last_modified, json.dumps(body), time.time())
+            )
+            self._conn.execute(
+                "DELETE FROM http_cache WHERE url IN ("
+                "SELECT url FROM http_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def touch(self, url: str):
+        with self._lock:
+            self._conn.execute("UPDATE http_cache SET last_used = ? WHERE url = ?", (time.time(), url))
+
+
+_default_cache: Optional[ConditionalCache] = None
+
+
+def get_github_cache() -> Optional[ConditionalCache]:
+    """Process-wide cache from settings, or None when disabled"""
+    global _default_cache
+    if not settings.github_cache_enabled:
+        return None
+    if _default_cache is None:
+        _default_cache = ConditionalCache(settings.github_cache_path)
+    return _default_cache
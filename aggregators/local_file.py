@@ -0,0 +1,75 @@
+"""
+Local file source: tails an NDJSON file of log entries.
+
+Each line of LOCAL_FILE_PATH is one entry as accepted by /api/logs
+(source defaults to "local_file"). The cursor, kept per path, is the
+byte offset after the last line read, so each run only reads lines
+appended since; a file that got shorter than the cursor is read again
+from the start. Lines are yielded in batches of AGGREGATOR_BATCH_SIZE,
+each with the offset after its last line, so a run that fails part way
+resumes after the last stored batch. Useful for scripts that log by
+appending to a file, and for testing the runtime.
+"""
+import asyncio
+import json
+import os
+from typing import AsyncIterator, Dict, List, Tuple
+
+from aggregators.base import Aggregator, Batch, register
+from config import settings
+
+
+@register
+class LocalFileAggregator(Aggregator):
+    name = "local_file"
+
+    def __init__(self, path: str = None, cursors=None):
+        super().__init__(cursors)
+        self.path = path or settings.local_file_path
+        self.interval_minutes = settings.local_file_interval_minutes
+
+    def configured(self) -> bool:
+        return bool(self.path)
+
+    def _read(self, offset: int) -> Tuple[List[Tuple[Dict, int]], int]:
+        """
+        (entry, offset after its line) for complete lines after offset,
+        and the offset after the last line read
+        """
+        if not os.path.exists(self.path):
+            return [], offset
+        if os.path.getsize(self.path) < offset:
+            print(f"{self.path} was truncated, reading it from the start")
+            offset = 0
+
+        entries = []
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Still being written; picked up by the next run
+                    break
+                offset += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError as e:
+                    print(f"Skipping invalid line in {self.path}: {str(e)}")
+                    continue
+                if isinstance(entry, dict):
+                    entry.setdefault("source", self.name)
+                entries.append((entry, offset))
+        return entries, offset
+
+    async def fetch(self) -> AsyncIterator[Batch]:
+        offset = int(self.cursor(self.path) or 0)
+        entries, offset = await asyncio.to_thread(self._read, offset)
+        size = settings.aggregator_batch_size
+        for start in range(0, len(entries), size):
+            batch = entries[start:start + size]
+            # The last batch also covers skipped lines after it
+            end = batch[-1][1] if start + size < len(entries) else offset
+            yield [entry for entry, _ in batch], {self.path: str(end)}
+        if not entries:
+            yield [], {self.path: str(offset)}
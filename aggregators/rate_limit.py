@@ -0,0 +1,97 @@
+"""
+Request pacing from GitHub's rate-limit headers.
+
+Every response updates the known quota (X-RateLimit-Remaining / -Reset).
+While plenty of quota is left requests go out immediately; below
+GITHUB_RATE_LIMIT_RESERVE they are spread evenly over the time left until
+the reset, and with no quota left they wait for the reset. Rate-limited
+(403/429) and server-error responses are retried after Retry-After, the
+reset time or an exponential delay, always with random jitter so
+concurrent requests do not retry in lockstep.
+"""
+import asyncio
+import random
+import time
+from typing import Optional
+
+import httpx
+
+from config import settings
+
+
+class RateLimitScheduler:
+    def __init__(self, reserve: int = None, max_retries: int = None, base_delay: float = 1.0,
+                 max_delay: float = 900.0):
+        self.reserve = settings.github_rate_limit_reserve if reserve is None else reserve
+        self.max_retries = settings.github_max_retries if max_retries is None else max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_at: Optional[float] = None
+        self.waited = 0.0
+        self.retries = 0
+        self._next_at = 0.0
+
+    def update(self, response: httpx.Response):
+        """Read the quota from a response's headers"""
+        headers = response.headers
+        try:
+            if "x-ratelimit-remaining" in headers:
+                self.remaining = int(headers["x-ratelimit-remaining"])
+            if "x-ratelimit-limit" in headers:
+                self.limit = int(headers["x-ratelimit-limit"])
+            if "x-ratelimit-reset" in headers:
+                self.reset_at = float(headers["x-ratelimit-reset"])
+        except ValueError:
+            pass
+
+    def _delay(self) -> float:
+        now = time.time()
+        if self.remaining is None or self.reset_at is None or self.reset_at <= now:
+            return 0.0
+        if self.remaining <= 0:
+            return self.reset_at - now + random.uniform(0, 1)
+        if self.remaining > self.reserve:
+            return 0.0
+        # Spread what is left evenly until the reset; slots are reserved so
+        # concurrent callers do not all take the same one
+        spacing = (self.reset_at - now) / self.remaining
+        slot = max(now, self._next_at)
+        self._next_at = slot + spacing
+        return slot - now
+
+    async def wait(self):
+        """Sleep as long as the known quota requires before the next request"""
+        delay = min(self._delay(), self.max_delay)
+        if delay > 0:
+            self.waited += delay
+            await asyncio.sleep(delay)
+
+    def retry_delay(self, response: httpx.Response, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying response, or None if it should not be retried"""
+        if attempt >= self.max_retries:
+            return None
+        status = response.status_code
+        limited = status == 429 or (status == 403 and (
+            "retry-after" in response.headers or response.headers.get("x-ratelimit-remaining") == "0"
+        ))
+        if not limited and status < 500:
+            return None
+
+        backoff = self.base_delay * 2 ** attempt
+        if "retry-after" in response.headers:
+            try:
+                delay = float(response.headers["retry-after"])
+            except ValueError:
+                delay = backoff
+            # Secondary limits: wait at least as long as asked, plus jitter
+            delay += random.uniform(0, max(delay, self.base_delay) * 0.1)
+        elif limited and self.reset_at:
+            delay = max(self.reset_at - time.time(), 0) + random.uniform(0, self.base_delay)
+        else:
+            # Full jitter
+            delay = random.uniform(0, backoff)
+
+        self.retries += 1
+        return min(delay, self.max_delay)
@@ -0,0 +1,130 @@
+"""
+Runs the registered aggregators concurrently on one event loop.
+
+Each source runs every `interval_minutes` in its own task; a failing
+source is reported and retried at its next run without affecting the
+others. Entries are validated and written straight to the database in
+chunks of AGGREGATOR_BATCH_SIZE (no HTTP round trip to the API), and a
+batch's cursors are saved only after all of its entries are stored.
+
+    python -m aggregators.runtime                # run enabled sources forever
+    python -m aggregators.runtime once [NAME...] # run sources once
+"""
+import asyncio
+import sys
+import time
+from contextlib import AsyncExitStack
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from aggregators.base import REGISTRY, Aggregator
+# Imported for their @register side effect
+import aggregators.github  # noqa: F401
+import aggregators.local_file  # noqa: F401
+from config import settings
+from database import AsyncSessionLocal, dispose_engines
+from ingest import upsert_entries, validate_entries
+
+# Stores a list of entry payloads from the named source, returns the counts
+Writer = Callable[[str, List[Dict]], Awaitable[Dict[str, int]]]
+
+
+async def write_entries(source: str, entries: List[Dict]) -> Dict[str, int]:
+    """Validate and upsert entries in one transaction; invalid entries are reported and skipped"""
+    rows, errors = validate_entries(entries)
+    for error in errors:
+        print(f"Error in {source} entry {error['index']}: {error['error']}")
+
+    async with AsyncSessionLocal() as db:
+        _, counts = await db.run_sync(upsert_entries, rows)
+        await db.commit()
+    counts["invalid"] = len(errors)
+    return counts
+
+
+def create_aggregators(names: Optional[List[str]] = None) -> List[Aggregator]:
+    """Instances of the named (default: AGGREGATORS) sources"""
+    if names is None:
+        names = [name.strip() for name in settings.aggregators.split(",") if name.strip()]
+    unknown = [name for name in names if name not in REGISTRY]
+    if unknown:
+        raise ValueError(f"Unknown aggregators: {', '.join(unknown)} (available: {', '.join(sorted(REGISTRY))})")
+    return [REGISTRY[name]() for name in names]
+
+
+class AggregatorRuntime:
+    def __init__(self, aggregators: List[Aggregator], writer: Writer = write_entries):
+        self.aggregators = aggregators
+        self.writer = writer
+
+    async def run_once(self, aggregator: Aggregator) -> bool:
+        """Fetch and store everything new from one source; False if it failed"""
+        if not aggregator.configured():
+            print(f"⏭️ {aggregator.name}: not configured, skipped")
+            return True
+
+        started = time.perf_counter()
+        totals = {"inserted": 0, "updated": 0, "unchanged": 0, "invalid": 0}
+        try:
+            async for entries, cursors in aggregator.fetch():
+                for start in range(0, len(entries), settings.aggregator_batch_size):
+                    counts = await self.writer(aggregator.name, entries[start:start + settings.aggregator_batch_size])
+                    for key in totals:
+                        totals[key] += counts.get(key, 0)
+                aggregator.cursors.set_many(aggregator.name, cursors)
+        except Exception as e:
+            # Cursors of stored batches were saved; the rest is fetched again next run
+            print(f"❌ {aggregator.name} failed after {time.perf_counter() - started:.2f}s: {str(e)}")
+            return False
+
+        print(f"✅ {aggregator.name}: {totals['inserted']} inserted, {totals['updated']} updated, "
+              f"{totals['unchanged']} unchanged, {totals['invalid']} invalid "
+              f"in {time.perf_counter() - started:.2f}s")
+        return True
+
+    async def run_all(self) -> Dict[str, bool]:
+        """Run every source once, concurrently"""
+        results = await asyncio.gather(*(self.run_once(aggregator) for aggregator in self.aggregators))
+        return {aggregator.name: ok for aggregator, ok in zip(self.aggregators, results)}
+
+    async def _loop(self, aggregator: Aggregator):
+        while True:
+            await self.run_once(aggregator)
+            await asyncio.sleep(aggregator.interval_minutes * 60)
+
+    async def run_forever(self):
+        """Run each configured source every interval_minutes until cancelled"""
+        aggregators = [aggregator for aggregator in self.aggregators if aggregator.configured()]
+        async with AsyncExitStack() as stack:
+            for aggregator in aggregators:
+                # One connection pool per source for all its runs
+                await stack.enter_async_context(aggregator.session())
+                print(f"🔄 {aggregator.name} sync scheduled (every {aggregator.interval_minutes:g} minutes)")
+            await asyncio.gather(*(self._loop(aggregator) for aggregator in aggregators))
+
+
+async def run_aggregators(names: Optional[List[str]] = None) -> Dict[str, bool]:
+    """Run the named (default: AGGREGATORS) sources once"""
+    try:
+        return await AggregatorRuntime(create_aggregators(names)).run_all()
+    finally:
+        # Pooled connections are bound to this event loop
+        await dispose_engines()
+
+
+async def main(args: List[str]):
+    if not args:
+        try:
+            await AggregatorRuntime(create_aggregators()).run_forever()
+        finally:
+            await dispose_engines()
+    elif args[0] == "once":
+        results = await run_aggregators(args[1:] or None)
+        if not all(results.values()):
+            sys.exit(1)
+    else:
+        print(__doc__)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
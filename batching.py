@@ -0,0 +1,92 @@
+"""
+Window/size-bounded collection of concurrent requests into batches.
+
+Callers queue an item and wait on a future; one background task takes the
+first queued item, keeps collecting for up to `window_ms` (or until
+`max_items` are queued) and hands the batch to `_handle`, which resolves
+the futures. Used for group commits (ingest.GroupCommitWriter) and LLM
+parse micro-batching (llm_parser.BatchingParser).
+"""
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Any, List, Optional, Tuple
+
+
+class MicroBatcher(ABC):
+    def __init__(self, window_ms: float, max_items: int):
+        self.window = window_ms / 1000
+        self.max_items = max_items
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Handle everything already submitted, then stop the collector task.
+        Submissions are refused from the moment stop() is called.
+        """
+        if not self.running:
+            return
+        self._stopping = True
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        # Nothing should be left behind the sentinel, but never leave a caller waiting
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None and not item[1].done():
+                item[1].set_exception(RuntimeError(f"{type(self).__name__} stopped"))
+
+    async def _submit(self, payload: Any) -> Any:
+        """Queue payload and wait for the result _handle gives it"""
+        if self._stopping:
+            raise RuntimeError(f"{type(self).__name__} is stopping")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((payload, future))
+        return await future
+
+    @abstractmethod
+    async def _handle(self, batch: List[Tuple[Any, asyncio.Future]]):
+        """Process a batch of (payload, future) pairs and resolve the futures"""
+
+    async def _collect(self, first) -> Tuple[List, bool]:
+        batch = [first]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window
+
+        while len(batch) < self.max_items:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if item is None:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch, stopping = await self._collect(item)
+            await self._handle(batch)
@@ -0,0 +1,200 @@
+"""
+Version-aware response cache for read endpoints.
+
+Cache keys combine the endpoint name and its parameters with the data
+version, a counter in the database that every transaction writing log
+entries bumps (see database.DataVersion). Writes from any process, such
+as the scheduler's syncs, therefore make older cached responses
+unreachable; the version is read once per lookup.
+
+Entries live in an in-process LRU. When several API workers run,
+settings.cache_shared_path points all of them at a SQLite file that holds
+a shared entry store behind the local LRU.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from config import settings
+from database import async_read_engine, engine, read_data_version
+
+
+class MemoryStore:
+    """Thread-safe LRU store"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            if key not in self._entries:
+                return False, None
+            self._entries.move_to_end(key)
+            return True, self._entries[key]
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteStore:
+    """
+    LRU store kept in a local SQLite file, shared by every worker process
+    on the host.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_entries_last_used ON cache_entries (last_used)")
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            # fetchall() finishes the statement so no read transaction is left open
+            rows = self._conn.execute("SELECT value FROM cache_entries WHERE key = ?", (key,)).fetchall()
+            if not rows:
+                return False, None
+            self._conn.execute("UPDATE cache_entries SET last_used = ? WHERE key = ?", (time.time(), key))
+            return True, json.loads(rows[0][0])
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, last_used) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time())
+            )
+            self._conn.execute(
+                "DELETE FROM cache_entries WHERE key IN ("
+                "SELECT key FROM cache_entries ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache_entries")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache_entries").fetchall()[0][0]
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int, shared_path: Optional[str] = None, enabled: bool = True):
+        self.enabled = enabled
+        self.local = MemoryStore(max_entries)
+        self.shared = SQLiteStore(shared_path, max_entries) if shared_path else None
+        self.hits = 0
+        self.misses = 0
+        self._version: Optional[int] = None
+
+    def _observe(self, version: int) -> int:
+        if version != self._version:
+            # Local entries of older versions can no longer be hit; shared
+            # ones age out of the shared LRU
+            self.local.clear()
+            self._version = version
+        return version
+
+    def version(self) -> int:
+        """Current data version from the database"""
+        with engine.connect() as connection:
+            return self._observe(read_data_version(connection))
+
+    async def aversion(self) -> int:
+        """version() on the async read pool"""
+        async with async_read_engine.connect() as connection:
+            return self._observe(await connection.run_sync(read_data_version))
+
+    def invalidate(self):
+        """Drop every cached response, e.g. after the tables were recreated"""
+        if self.shared is not None:
+            self.shared.clear()
+        self.local.clear()
+        self._version = None
+
+    def make_key(self, name: str, params: Dict[str, Any], version: int) -> str:
+        return json.dumps([name, version, params], sort_keys=True, default=str)
+
+    def _lookup(self, key: str) -> Tuple[bool, Any]:
+        found, value = self.local.get(key)
+        if not found and self.shared is not None:
+            found, value = self.shared.get(key)
+            if found:
+                self.local.set(key, value)
+
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return found, value
+
+    def _store(self, key: str, value: Any):
+        self.local.set(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value)
+
+    def get_or_compute(self, name: str, params: Dict[str, Any], compute: Callable[[], Any]) -> Any:
+        """Return the cached value for (name, params) at the current data version, computing it on a miss"""
+        if not self.enabled:
+            return compute()
+
+        key = self.make_key(name, params, self.version())
+        found, value = self._lookup(key)
+        if not found:
+            value = compute()
+            self._store(key, value)
+        return value
+
+    async def aget_or_compute(self, name: str, params: Dict[str, Any],
+                              compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Async variant of get_or_compute for coroutine producers"""
+        if not self.enabled:
+            return await compute()
+
+        key = self.make_key(name, params, await self.aversion())
+        found, value = self._lookup(key)
+        if not found:
+            value = await compute()
+            self._store(key, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "shared": self.shared is not None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size": len(self.local),
+            "version": self.version(),
+        }
+
+
+response_cache = ResponseCache(
+    max_entries=settings.cache_max_entries,
+    shared_path=settings.cache_shared_path,
+    enabled=settings.cache_enabled
+)
+
@@ -1,11 +1,15 @@
 #!/usr/bin/env python3
+import asyncio
+import builtins
 import click
 import httpx
 import sys
 from datetime import datetime
 from typing import Optional
 from config import settings
+import json
 import re
+import uuid
 
 
 def parse_duration(duration_str: str) -> Optional[float]:
@@ -56,16 +60,27 @@ def log(message: str, tag: tuple, duration: Optional[str], project: Optional[str
         "action": message,
         "project": project,
         "duration": duration_minutes,
-        "tags": list(tag) if tag else None
+        "tags": list(tag) if tag else None,
+        # Lets a retried request be recognised instead of logged twice
+        "idempotency_key": f"cli:{uuid.uuid4()}"
     }
     
     try:
         with httpx.Client() as client:
-            response = client.post(
-                f"http://localhost:{settings.port}/api/logs",
-                json=log_entry,
-                timeout=10.0
-            )
+            try:
+                response = client.post(
+                    f"http://localhost:{settings.port}/api/logs",
+                    json=log_entry,
+                    timeout=10.0
+                )
+            except httpx.TimeoutException:
+                # The first request may still have been stored; same key, so no duplicate
+                click.echo("⏳ Request timed out, retrying...", err=True)
+                response = client.post(
+                    f"http://localhost:{settings.port}/api/logs",
+                    json=log_entry,
+                    timeout=30.0
+                )
             
             if response.status_code == 200:
                 entry = response.json()
@@ -111,8 +126,18 @@ def stats(days: int):
                     click.echo(f"  • {source}: {count}")
                 
                 click.echo("\nTop Actions:")
-                for action, count in list(stats_data['top_actions'].items())[:10]:
+                for action, count in builtins.list(stats_data['top_actions'].items())[:10]:
                     click.echo(f"  • {action}: {count}")
+                
+                if stats_data.get('top_projects_minutes'):
+                    click.echo("\nTop Projects:")
+                    for project, minutes in stats_data['top_projects_minutes'].items():
+                        click.echo(f"  • {project}: {round(minutes / 60, 1)} hours")
+                
+                if stats_data.get('top_tags_minutes'):
+                    click.echo("\nTop Tags:")
+                    for tag, minutes in stats_data['top_tags_minutes'].items():
+                        click.echo(f"  • #{tag}: {round(minutes / 60, 1)} hours")
             else:
                 click.echo(f"❌ Error: {response.status_code}", err=True)
                 sys.exit(1)
@@ -125,41 +150,68 @@ def stats(days: int):
         sys.exit(1)
 
 
+def _print_entry(entry: dict):
+    """Print a single log entry"""
+    timestamp = datetime.fromisoformat(entry['timestamp'].replace('Z', '+00:00'))
+    click.echo(f"[{timestamp.strftime('%Y-%m-%d %H:%M')}] {entry['action']}")
+    if entry.get('project'):
+        click.echo(f"  Project: {entry['project']}")
+    if entry.get('duration'):
+        click.echo(f"  Duration: {entry['duration']} min")
+    if entry.get('tags'):
+        click.echo(f"  Tags: {', '.join(entry['tags'])}")
+    click.echo()
+
+
 @cli.command()
-@click.option("--limit", "-l", default=10, help="Number of entries to show")
+@click.option("--limit", "-l", default=10, help="Number of entries to show (page size with --all)")
 @click.option("--source", "-s", help="Filter by source")
-def list(limit: int, source: Optional[str]):
+@click.option("--tag", "-t", multiple=True, help="Filter by tag (repeatable)")
+@click.option("--any-tag", is_flag=True, help="Match entries with any of the tags instead of all")
+@click.option("--all", "show_all", is_flag=True, help="Page through the full history")
+def list(limit: int, source: Optional[str], tag: tuple, any_tag: bool, show_all: bool):
     """List recent log entries"""
     try:
-        url = f"http://localhost:{settings.port}/api/logs?limit={limit}"
+        url = f"http://localhost:{settings.port}/api/logs"
+        params = {"limit": limit}
         if source:
-            url += f"&source={source}"
+            params["source"] = source
+        if tag:
+            params["tag"] = builtins.list(tag)
+            params["tag_mode"] = "any" if any_tag else "all"
+        
+        shown = 0
         
         with httpx.Client() as client:
-            response = client.get(url, timeout=10.0)
-            
-            if response.status_code == 200:
+            while True:
+                response = client.get(url, params=params, timeout=10.0)
+                
+                if response.status_code != 200:
+                    click.echo(f"❌ Error: {response.status_code}", err=True)
+                    sys.exit(1)
+                
                 entries = response.json()
                 
-                if not entries:
+                if not entries and not shown:
                     click.echo("No log entries found.")
                     return
                 
-                click.echo(f"\n📝 Recent Log Entries ({len(entries)})\n")
+                if not shown and not show_all:
+                    click.echo(f"\n📝 Recent Log Entries ({len(entries)})\n")
+                elif not shown:
+                    click.echo("\n📝 All Log Entries\n")
                 
                 for entry in entries:
-                    timestamp = datetime.fromisoformat(entry['timestamp'].replace('Z', '+00:00'))
-                    click.echo(f"[{timestamp.strftime('%Y-%m-%d %H:%M')}] {entry['action']}")
-                    if entry.get('project'):
-                        click.echo(f"  Project: {entry['project']}")
-                    if entry.get('duration'):
-                        click.echo(f"  Duration: {entry['duration']} min")
-                    if entry.get('tags'):
-                        click.echo(f"  Tags: {', '.join(entry['tags'])}")
-                    click.echo()
-            else:
-                click.echo(f"❌ Error: {response.status_code}", err=True)
-                sys.exit(1)
+                    _print_entry(entry)
+                shown += len(entries)
+                
+                next_cursor = response.headers.get("X-Next-Cursor")
+                if not show_all or not next_cursor:
+                    break
+                params["cursor"] = next_cursor
+        
+        if show_all:
+            click.echo(f"Total: {shown} entries")
                 
     except httpx.ConnectError:
         click.echo("❌ Error: Could not connect to Loglify API. Is the server running?", err=True)
@@ -169,17 +221,179 @@ def list(limit: int, source: Optional[str]):
         sys.exit(1)
 
 
+def _stream_file(path: str, chunk_size: int = 64 * 1024):
+    """Yield a file's bytes in chunks so uploads never load it whole"""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _import_ndjson(path: str):
+    """Stream an NDJSON file to the ingest endpoint"""
+    with httpx.Client() as client:
+        response = client.post(
+            f"http://localhost:{settings.port}/api/logs/ingest",
+            params={"source": "cli"},
+            content=_stream_file(path),
+            headers={"Content-Type": "application/x-ndjson"},
+            timeout=None
+        )
+
+        if response.status_code != 200:
+            click.echo(f"❌ Error: {response.status_code} - {response.text}", err=True)
+            sys.exit(1)
+
+        result = response.json()
+        for error in result["errors"]:
+            click.echo(f"⚠️  Line {error['line']}: {error['error']}", err=True)
+        if result["errors_truncated"]:
+            click.echo("⚠️  More lines were rejected than reported", err=True)
+
+        click.echo(
+            f"✅ Imported {result['accepted']} entries"
+            + (f" ({result['rejected']} rejected)" if result['rejected'] else "")
+        )
+
+
+@cli.command(name="import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--batch-size", "-b", default=1000, help="Entries per request (JSON files)")
+def import_logs(path: str, batch_size: int):
+    """
+    Import log entries from a file.
+    .ndjson/.jsonl files are streamed line by line; other files must hold a
+    JSON list of entries, which is sent in batches.
+    """
+    if path.endswith((".ndjson", ".jsonl")):
+        try:
+            _import_ndjson(path)
+        except httpx.ConnectError:
+            click.echo("❌ Error: Could not connect to Loglify API. Is the server running?", err=True)
+            sys.exit(1)
+        except Exception as e:
+            click.echo(f"❌ Error: {str(e)}", err=True)
+            sys.exit(1)
+        return
+
+    try:
+        with open(path) as f:
+            entries = json.load(f)
+    except json.JSONDecodeError as e:
+        click.echo(f"❌ Error: Invalid JSON - {str(e)}", err=True)
+        sys.exit(1)
+
+    if not isinstance(entries, builtins.list):
+        click.echo("❌ Error: Expected a JSON list of log entries", err=True)
+        sys.exit(1)
+
+    for entry in entries:
+        if isinstance(entry, dict):
+            entry.setdefault("source", "cli")
+
+    inserted = 0
+    failed = 0
+
+    try:
+        with httpx.Client() as client:
+            for start in range(0, len(entries), batch_size):
+                batch = entries[start:start + batch_size]
+                response = client.post(
+                    f"http://localhost:{settings.port}/api/logs/batch",
+                    json=batch,
+                    timeout=60.0
+                )
+
+                if response.status_code != 200:
+                    click.echo(f"❌ Error: {response.status_code} - {response.text}", err=True)
+                    sys.exit(1)
+
+                result = response.json()
+                inserted += result["inserted"]
+                for error in result["errors"]:
+                    failed += 1
+                    click.echo(f"⚠️  Entry {start + error['index']}: {error['error']}", err=True)
+
+        click.echo(f"✅ Imported {inserted} entries" + (f" ({failed} rejected)" if failed else ""))
+
+    except httpx.ConnectError:
+        click.echo("❌ Error: Could not connect to Loglify API. Is the server running?", err=True)
+        sys.exit(1)
+    except Exception as e:
+        click.echo(f"❌ Error: {str(e)}", err=True)
+        sys.exit(1)
+
+
+@cli.command()
+@click.option("--output", "-o", required=True, type=click.Path(dir_okay=False, writable=True), help="File to write")
+@click.option("--format", "-f", "fmt", type=click.Choice(["ndjson", "csv"]), default="ndjson", help="Export format")
+@click.option("--source", "-s", help="Filter by source")
+@click.option("--project", "-p", help="Filter by project")
+@click.option("--tag", "-t", multiple=True, help="Only entries with this tag (repeatable)")
+@click.option("--start", help="Start date (ISO format)")
+@click.option("--end", help="End date (ISO format)")
+def export(output: str, fmt: str, source: Optional[str], project: Optional[str],
+           tag: tuple, start: Optional[str], end: Optional[str]):
+    """Export log entries to a file"""
+    params = {"format": fmt}
+    if source:
+        params["source"] = source
+    if project:
+        params["project"] = project
+    if tag:
+        params["tag"] = builtins.list(tag)
+    if start:
+        params["start_date"] = start
+    if end:
+        params["end_date"] = end
+
+    try:
+        written = 0
+        with httpx.Client() as client:
+            with client.stream(
+                "GET",
+                f"http://localhost:{settings.port}/api/logs/export",
+                params=params,
+                timeout=httpx.Timeout(10.0, read=None)
+            ) as response:
+                if response.status_code != 200:
+                    response.read()
+                    click.echo(f"❌ Error: {response.status_code} - {response.text}", err=True)
+                    sys.exit(1)
+
+                with open(output, "wb") as f:
+                    for chunk in response.iter_bytes():
+                        f.write(chunk)
+                        written += len(chunk)
+
+        click.echo(f"✅ Exported to {output} ({written} bytes)")
+
+    except httpx.ConnectError:
+        click.echo("❌ Error: Could not connect to Loglify API. Is the server running?", err=True)
+        sys.exit(1)
+    except Exception as e:
+        click.echo(f"❌ Error: {str(e)}", err=True)
+        sys.exit(1)
+
+
 @cli.command()
 @click.option("--github", is_flag=True, help="Sync GitHub data")
-def sync(github: bool):
-    """Sync passive data sources"""
-    if github:
-        click.echo("🔄 Syncing GitHub data...")
-        # This would trigger the GitHub aggregator
-        # For now, just a placeholder
-        click.echo("✅ GitHub sync completed")
-    else:
-        click.echo("Please specify a source to sync (e.g., --github)")
+@click.option("--source", "-s", multiple=True, help="Aggregator to sync (e.g. github, local_file)")
+def sync(github: bool, source: tuple):
+    """Sync passive data sources (default: all in AGGREGATORS)"""
+    from aggregators.runtime import run_aggregators
+    
+    names = builtins.list(source) + (["github"] if github else [])
+    click.echo(f"🔄 Syncing {', '.join(names) if names else 'all sources'}...")
+    try:
+        results = asyncio.run(run_aggregators(names or None))
+    except ValueError as e:
+        click.echo(f"❌ Error: {str(e)}", err=True)
+        sys.exit(1)
+    if not all(results.values()):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
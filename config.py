@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Literal, Optional
 
 
 class Settings(BaseSettings):
@@ -10,23 +10,123 @@ class Settings(BaseSettings):
     # OpenAI
     openai_api_key: str
     openai_model: str = "gpt-4o-mini"
+    openai_timeout_seconds: float = 30.0
+    openai_parse_timeout_seconds: float = 10.0  # parsing falls back to regex when exceeded
+    openai_max_retries: int = 2
+    openai_max_concurrency: int = 4  # in-flight requests per process
+    openai_max_connections: int = 10
+    # Micro-batching of LLM parses: messages arriving within the window are
+    # parsed with one request
+    llm_batch_enabled: bool = True
+    llm_batch_window_ms: float = 250.0
+    llm_batch_max_items: int = 10
+    
+    # Local fast-path parser: messages parsed with at least this confidence
+    # (0..1) skip the LLM
+    fast_parser_enabled: bool = True
+    fast_parser_min_confidence: float = 0.75
+    fast_parser_vocabulary_size: int = 500  # known actions/projects loaded from past entries
+    
+    # Cache of LLM parse results (in-process LRU backed by a SQLite file)
+    llm_cache_enabled: bool = True
+    llm_cache_path: str = "./llm_cache.db"
+    llm_cache_ttl_days: float = 30
+    llm_cache_max_entries: int = 10000
+    llm_cache_memory_entries: int = 1024
+    
+    # Retrieval for /api/query: embedder is "hashing" (offline, built in) or
+    # "module:factory" for a custom one
+    retrieval_embedder: str = "hashing"
+    retrieval_dim: int = 256
+    retrieval_top_k: int = 50
+    # Aggregate questions ("hours on X this month") are answered with SQL;
+    # the LLM only phrases the computed result when enabled
+    query_planner_enabled: bool = True
+    query_planner_llm_phrasing: bool = False
+    # Token budget for log entries in /api/query and daily review prompts
+    llm_context_max_tokens: int = 1500
+    # Print token counts before and after packing each prompt context
+    llm_context_log_tokens: bool = False
     
     # Database
     database_url: str = "sqlite:///./loglify.db"
+    db_pool_size: int = 10  # connections kept open by the async engine
+    db_max_overflow: int = 20  # extra connections allowed under burst load
+    db_pool_timeout: float = 30.0
+    
+    # SQLite performance profile (opt-in): WAL, tuned pragmas, a separate
+    # read-only connection pool and periodic checkpoint/ANALYZE
+    sqlite_performance_profile: bool = False
+    sqlite_synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_cache_size_kib: int = 65536
+    sqlite_mmap_size: int = 268435456
+    sqlite_read_pool_size: int = 4
+    sqlite_maintenance_interval_minutes: float = 60
     
     # GitHub
     github_token: Optional[str] = None
     github_username: Optional[str] = None
     github_repos: Optional[str] = None
+    github_api_url: str = "https://api.github.com"
+    github_max_concurrency: int = 8  # requests in flight during a sync
+    github_timeout_seconds: float = 30.0
+    # ETag / Last-Modified cache so unchanged pages come back as 304s
+    github_cache_enabled: bool = True
+    github_cache_path: str = "./github_cache.db"
+    # Below this many remaining calls, requests are spread until the reset
+    github_rate_limit_reserve: int = 100
+    github_max_retries: int = 5
+    github_sync_interval_minutes: float = 360
+    # Per-repo sync cursors (high-water marks) of incremental aggregator syncs
+    sync_state_path: str = "./sync_state.db"
+    
+    # Aggregator runtime: sources run concurrently, each on its own interval,
+    # and write entries to the database in batches of this size
+    aggregators: str = "github,local_file"
+    aggregator_batch_size: int = 500
+    # NDJSON file of log entries tailed by the local_file aggregator
+    local_file_path: Optional[str] = None
+    local_file_interval_minutes: float = 5
     
     # Server
     host: str = "0.0.0.0"
     port: int = 8000
     debug: bool = True
     
+    # Ingest
+    batch_max_entries: int = 5000
+    ingest_chunk_size: int = 1000
+    ingest_max_line_bytes: int = 1_000_000
+    ingest_max_reported_errors: int = 1000
+    # Group commit for single-entry writes: wait up to this long to collect
+    # more entries into one transaction (0 = only group what is already queued)
+    group_commit_window_ms: float = 2.0
+    group_commit_max_batch: int = 500
+    
+    # Export
+    export_chunk_size: int = 1000
+    
+    # Response cache
+    cache_enabled: bool = True
+    cache_max_entries: int = 1024
+    cache_shared_path: Optional[str] = None  # SQLite file shared by all API workers
+    
     # AI Review
     enable_daily_review: bool = True
     review_time: str = "22:00"
+    # Weekly (Sundays) and monthly (last day) reviews from stored daily summaries
+    enable_weekly_review: bool = True
+    enable_monthly_review: bool = True
+    review_backfill_concurrency: int = 4
+    
+    # Job scheduler (scheduler.py): run state is kept in this SQLite file
+    scheduler_state_path: str = "./scheduler_state.db"
+    scheduler_job_timeout_minutes: float = 60
+    # Runs missed while the scheduler was down are caught up if less late than this
+    scheduler_catch_up_hours: float = 24
+    # First runs after startup are spread over up to this many seconds
+    scheduler_startup_jitter_seconds: float = 30
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,147 @@
+"""
+Token-budgeted context for LLM prompts about log entries.
+
+Entries are packed into compact lines and measured in tokens (with
+tiktoken when it is installed, otherwise about four characters per
+token). Repeats of the same action and project on the same day become one
+line with a count, time range and total duration; if that still does not
+fit the budget, tags and then times are dropped, and finally the lines
+with the least logged time are left out and summarized in a last line.
+"""
+import math
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from config import settings
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_encodings: Dict[str, Any] = {}
+
+
+def count_tokens(text: str, model: str = None) -> int:
+    """Tokens in text for the model; estimated when tiktoken is not installed"""
+    if tiktoken is None:
+        return math.ceil(len(text) / 4)
+    model = model or settings.openai_model
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("o200k_base")
+    return len(_encodings[model].encode(text))
+
+
+def _timestamp(value) -> Optional[datetime]:
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def _duration(minutes: float) -> str:
+    if minutes >= 60:
+        return f"{round(minutes / 60, 1)}h"
+    return f"{round(minutes)}m"
+
+
+def verbose_lines(entries: Sequence[Dict[str, Any]]) -> List[str]:
+    """One line per entry with every field (the size before packing)"""
+    return [
+        f"- {entry.get('action', 'Unknown')} ({entry.get('duration') or 0} min)"
+        + (f" - {entry['project']}" if entry.get("project") else "")
+        + (f" [{', '.join(entry['tags'])}]" if entry.get("tags") else "")
+        + f" - {entry.get('timestamp', '')}"
+        for entry in entries
+    ]
+
+
+def collapse(entries: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Group entries by (day, action, project) in order of first appearance"""
+    groups: Dict[Tuple, Dict[str, Any]] = {}
+    for entry in entries:
+        timestamp = _timestamp(entry.get("timestamp"))
+        key = (timestamp.date() if timestamp else None, entry.get("action"), entry.get("project"))
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                "day": key[0], "action": key[1], "project": key[2],
+                "first": timestamp, "last": timestamp, "count": 0, "minutes": 0.0, "tags": [],
+            }
+        group["count"] += 1
+        group["minutes"] += entry.get("duration") or 0.0
+        if timestamp:
+            group["first"] = min(group["first"], timestamp)
+            group["last"] = max(group["last"], timestamp)
+        for tag in entry.get("tags") or []:
+            if tag not in group["tags"]:
+                group["tags"].append(tag)
+    return list(groups.values())
+
+
+def _group_line(group: Dict[str, Any], show_day: bool, show_time: bool, show_tags: bool) -> str:
+    parts = []
+    if group["day"] and show_day:
+        parts.append(group["day"].isoformat())
+    if group["first"] and show_time:
+        times = group["first"].strftime("%H:%M")
+        if group["last"] != group["first"]:
+            times += "-" + group["last"].strftime("%H:%M")
+        parts.append(times)
+    parts.append(group["action"] or "Unknown")
+    if group["count"] > 1:
+        parts.append(f"x{group['count']}")
+    if group["minutes"]:
+        parts.append(_duration(group["minutes"]))
+    if group["project"]:
+        parts.append(f"@{group['project']}")
+    if show_tags and group["tags"]:
+        parts.append(" ".join(f"#{tag}" for tag in group["tags"]))
+    return " ".join(parts)
+
+
+def build_context(entries: Sequence[Dict[str, Any]], max_tokens: int = None, label: str = "context",
+                  show_day: bool = True) -> str:
+    """
+    Pack entries (dicts with action, project, duration, timestamp, tags;
+    in the order they should appear) into at most max_tokens tokens.
+    Prints the token counts before and after packing when
+    LLM_CONTEXT_LOG_TOKENS is set.
+    """
+    max_tokens = max_tokens or settings.llm_context_max_tokens
+    if not entries:
+        return ""
+    groups = collapse(entries)
+
+    text = ""
+    for show_time, show_tags in ((True, True), (True, False), (False, False)):
+        text = "\n".join(_group_line(group, show_day, show_time, show_tags) for group in groups)
+        if count_tokens(text) <= max_tokens:
+            break
+    else:
+        # Keep the groups with the most logged time (then the most entries)
+        lines = [_group_line(group, show_day, False, False) for group in groups]
+        ranked = sorted(range(len(groups)), key=lambda i: (-groups[i]["minutes"], -groups[i]["count"], i))
+        kept: List[int] = []
+        used = 0
+        for index in ranked:
+            cost = count_tokens(lines[index]) + 1
+            # Leave room for the summary line
+            if used + cost > max_tokens - 20:
+                break
+            kept.append(index)
+            used += cost
+        kept_set = set(kept)
+        dropped = [group for i, group in enumerate(groups) if i not in kept_set]
+        dropped_minutes = sum(group["minutes"] for group in dropped)
+        text = "\n".join(lines[i] for i in sorted(kept))
+        text += f"\n... {sum(group['count'] for group in dropped)} more entries"
+        text += f" ({_duration(dropped_minutes)})" if dropped_minutes else ""
+        text += " not shown"
+
+    if settings.llm_context_log_tokens:
+        before = count_tokens("\n".join(verbose_lines(entries)))
+        print(f"🧮 {label}: {len(entries)} entries, {before} -> {count_tokens(text)} tokens")
+    return text
@@ -1,11 +1,27 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, Text, JSON
+import asyncio
+from itertools import chain
+from sqlalchemy import (
+    create_engine, event, func, insert, select, update, delete,
+    Column, ForeignKey, Index, Integer, String, Date, DateTime, Float, Text, JSON
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from datetime import datetime
 from config import settings
 
 Base = declarative_base()
 
+# Session.info flag set when a transaction writes log entries; the
+# transaction then bumps the data version (see DataVersion).
+ENTRIES_CHANGED = "log_entries_changed"
+# Session.info set of ids of existing entries the transaction changed or
+# deleted; they are recorded in log_entry_changes on commit.
+UPDATED_ENTRY_IDS = "updated_log_entry_ids"
+# Rows kept in log_entry_changes; readers further behind start over
+ENTRY_CHANGES_KEPT = 10000
+
 
 class LogEntry(Base):
     __tablename__ = "log_entries"
@@ -18,8 +34,106 @@ class LogEntry(Base):
     project = Column(String, nullable=True)
     duration = Column(Float, nullable=True)  # in minutes
     tags = Column(JSON, nullable=True)  # list of strings
-    metadata = Column(JSON, nullable=True)  # additional structured data
+    # "metadata" is reserved by the declarative API, so the attribute is renamed
+    # while the column keeps its original name.
+    entry_metadata = Column("metadata", JSON, nullable=True)  # additional structured data
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Client-supplied (or derived, see ingest.idempotency_key_for) key; an
+    # entry sent again with the same key updates the stored one instead of
+    # adding a duplicate
+    idempotency_key = Column(String, nullable=True, unique=True, index=True)
+
+
+class DataVersion(Base):
+    """
+    Single-row counter bumped by every transaction that writes log entries,
+    so every process (API workers, scheduler, CLI sync) sees the same
+    version. Keys the response cache (see cache.py).
+    """
+    __tablename__ = "data_version"
+    
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class LogEntryChange(Base):
+    """Ids of existing log entries updated or deleted, in commit order (see retrieval.py)"""
+    __tablename__ = "log_entry_changes"
+    
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    entry_id = Column(Integer, nullable=False)
+
+
+class DailyRollup(Base):
+    """Pre-aggregated counts and durations per day, source, action and project"""
+    __tablename__ = "daily_rollups"
+    
+    # Missing values are stored as "" so the composite key can be upserted
+    day = Column(Date, primary_key=True)
+    source = Column(String, primary_key=True)
+    action = Column(String, primary_key=True)
+    project = Column(String, primary_key=True)
+    entry_count = Column(Integer, nullable=False, default=0)
+    duration_sum = Column(Float, nullable=False, default=0.0)  # in minutes
+
+
+class Tag(Base):
+    """Interned tag names"""
+    __tablename__ = "tags"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)  # normalized (see tags.normalize_tags)
+
+
+class LogEntryTag(Base):
+    """Association between log entries and their interned tags"""
+    __tablename__ = "log_entry_tags"
+    __table_args__ = (
+        Index("ix_log_entry_tags_tag_id_entry_id", "tag_id", "entry_id"),
+    )
+    
+    entry_id = Column(Integer, ForeignKey("log_entries.id", ondelete="CASCADE"), primary_key=True)
+    tag_id = Column(Integer, ForeignKey("tags.id"), primary_key=True)
+
+
+class DailyTagRollup(Base):
+    """Pre-aggregated counts and durations per day and tag"""
+    __tablename__ = "daily_tag_rollups"
+    
+    day = Column(Date, primary_key=True)
+    tag = Column(String, primary_key=True)
+    entry_count = Column(Integer, nullable=False, default=0)
+    duration_sum = Column(Float, nullable=False, default=0.0)  # in minutes
+
+
+class ReviewSummary(Base):
+    """Stored AI review of a day, week or month"""
+    __tablename__ = "review_summaries"
+    
+    period = Column(String, primary_key=True)  # 'day', 'week' or 'month'
+    start = Column(Date, primary_key=True)
+    # Hash of what the summary was generated from (the day's entries, or
+    # the daily summaries of a week or month); a new hash means regenerate
+    content_hash = Column(String(64), nullable=False)
+    summary = Column(Text, nullable=False)
+    entry_count = Column(Integer, nullable=False, default=0)
+    duration_sum = Column(Float, nullable=False, default=0.0)  # in minutes
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+def upsert_insert(connection, table):
+    """
+    INSERT construct with ON CONFLICT support for the connection's dialect,
+    or None when the dialect has no native upsert.
+    """
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(table)
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+        return postgresql_insert(table)
+    return None
 
 
 # Create engine and session
@@ -31,11 +145,189 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+def async_database_url(url: str) -> str:
+    """Map a sync database URL to its asyncio driver (aiosqlite / asyncpg)"""
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if url.startswith("postgresql://") or url.startswith("postgresql+psycopg2://"):
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql+asyncpg://", 1)
+    return url
+
+
+def async_engine_options(url: str) -> dict:
+    """Pool options for the async engine"""
+    if ":memory:" in url:
+        # Every connection would see its own empty database
+        return {"poolclass": StaticPool}
+
+    options = {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_pre_ping": True,
+    }
+    if url.startswith("sqlite"):
+        # aiosqlite defaults to NullPool, which reopens the file (and its
+        # worker thread) on every checkout
+        options["poolclass"] = AsyncAdaptedQueuePool
+    return options
+
+
+# Async engine and session used by the API and other asyncio code
+async_engine = create_async_engine(
+    async_database_url(settings.database_url),
+    **async_engine_options(settings.database_url)
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+
+# SQLite performance profile (SQLITE_PERFORMANCE_PROFILE=True)
+sqlite_profile_enabled = (
+    settings.sqlite_performance_profile
+    and settings.database_url.startswith("sqlite")
+    and ":memory:" not in settings.database_url
+)
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Per-connection tuning; WAL lets readers run while a writer commits"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+    cursor.execute(f"PRAGMA cache_size=-{int(settings.sqlite_cache_size_kib)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def _set_sqlite_read_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+    cursor.execute(f"PRAGMA cache_size=-{int(settings.sqlite_cache_size_kib)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+    cursor.close()
+
+
+def sqlite_read_only_url(url: str) -> str:
+    """Async URL opening the same SQLite file in read-only mode"""
+    path = url.split(":///", 1)[1]
+    return f"sqlite+aiosqlite:///file:{path}?mode=ro&uri=true"
+
+
+def apply_sqlite_profile(target):
+    """Tune every new connection of a sync or async engine (WAL and pragmas)"""
+    event.listen(getattr(target, "sync_engine", target), "connect", _set_sqlite_pragmas)
+
+
+def create_sqlite_read_engine(url: str):
+    """Async engine with a pool of read-only connections to the SQLite file at url"""
+    read_engine = create_async_engine(
+        sqlite_read_only_url(url),
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=settings.sqlite_read_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_pre_ping=True
+    )
+    event.listen(read_engine.sync_engine, "connect", _set_sqlite_read_pragmas)
+    return read_engine
+
+
+if sqlite_profile_enabled:
+    apply_sqlite_profile(engine)
+    apply_sqlite_profile(async_engine)
+
+    # Reads get their own pool of read-only connections so list and stats
+    # queries never queue behind ingest for a pooled connection
+    async_read_engine = create_sqlite_read_engine(settings.database_url)
+else:
+    async_read_engine = async_engine
+
+AsyncReadSessionLocal = async_sessionmaker(
+    async_read_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+
 def init_db():
     """Initialize database tables"""
     Base.metadata.create_all(bind=engine)
 
 
+async def init_async_db():
+    """Initialize database tables without blocking the event loop"""
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+def mark_entries_changed(session):
+    """Flag the session's current transaction as having written log entries"""
+    session.info[ENTRIES_CHANGED] = True
+
+
+def mark_entries_updated(session, entry_ids):
+    """Record ids of existing log entries changed or deleted in the session's current transaction"""
+    session.info.setdefault(UPDATED_ENTRY_IDS, set()).update(entry_ids)
+
+
+def read_data_version(connection) -> int:
+    return connection.scalar(select(DataVersion.version).where(DataVersion.id == 1)) or 0
+
+
+def _bump_data_version(connection):
+    table = DataVersion.__table__
+    statement = upsert_insert(connection, table)
+    if statement is not None:
+        connection.execute(statement.values(id=1, version=1).on_conflict_do_update(
+            index_elements=["id"], set_={"version": table.c.version + 1}
+        ))
+    elif not connection.execute(update(table).where(table.c.id == 1).values(version=table.c.version + 1)).rowcount:
+        connection.execute(insert(table).values(id=1, version=1))
+
+
+@event.listens_for(Session, "after_flush")
+def _track_entry_writes(session: Session, flush_context):
+    # Any flushed LogEntry counts, including columns the rollups ignore (raw_text)
+    written = [obj for obj in chain(session.new, session.dirty, session.deleted) if isinstance(obj, LogEntry)]
+    if written:
+        mark_entries_changed(session)
+        mark_entries_updated(session, [obj.id for obj in written if obj not in session.new and obj.id])
+
+
+@event.listens_for(Session, "before_commit")
+def _record_entry_writes(session: Session):
+    """Bump the data version and log updated ids in the committing transaction"""
+    # Objects still pending are otherwise flushed after this hook
+    session.flush()
+    updated = session.info.pop(UPDATED_ENTRY_IDS, None)
+    if not session.info.pop(ENTRIES_CHANGED, False) and not updated:
+        return
+    connection = session.connection()
+    # The version row lock orders concurrent writers, so change seqs follow commit order
+    _bump_data_version(connection)
+    if updated:
+        connection.execute(insert(LogEntryChange), [{"entry_id": entry_id} for entry_id in sorted(updated)])
+        last = connection.scalar(select(func.max(LogEntryChange.seq)))
+        connection.execute(delete(LogEntryChange).where(LogEntryChange.seq <= last - ENTRY_CHANGES_KEPT))
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_uncommitted_writes(session: Session):
+    session.info.pop(ENTRIES_CHANGED, None)
+    session.info.pop(UPDATED_ENTRY_IDS, None)
+
+
 def get_db():
     """Dependency for getting database session"""
     db = SessionLocal()
@@ -44,3 +336,42 @@ def get_db():
     finally:
         db.close()
 
+
+async def get_async_db():
+    """Dependency for getting an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_read_db():
+    """Dependency for a session on the read pool (same as get_async_db unless the SQLite profile is on)"""
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
+async def dispose_engines():
+    """Close every pooled async connection"""
+    await async_engine.dispose()
+    if async_read_engine is not async_engine:
+        await async_read_engine.dispose()
+
+
+async def run_sqlite_maintenance():
+    """Checkpoint the WAL back into the database file and refresh planner statistics"""
+    if not sqlite_profile_enabled:
+        return
+    async with async_engine.connect() as conn:
+        await conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        await conn.exec_driver_sql("ANALYZE")
+        await conn.commit()
+
+
+async def sqlite_maintenance_loop():
+    """Run run_sqlite_maintenance every SQLITE_MAINTENANCE_INTERVAL_MINUTES"""
+    while True:
+        await asyncio.sleep(settings.sqlite_maintenance_interval_minutes * 60)
+        try:
+            await run_sqlite_maintenance()
+        except Exception as e:
+            print(f"SQLite maintenance failed: {str(e)}")
+
@@ -0,0 +1,81 @@
+"""
+Streaming export of log entries as NDJSON or CSV.
+
+Rows are read from a server-side cursor in chunks of
+settings.export_chunk_size and serialized chunk by chunk, so memory use
+does not depend on how many entries are exported.
+"""
+import csv
+import io
+import json
+from typing import AsyncIterator, List
+
+from sqlalchemy import select
+
+from config import settings
+from database import LogEntry, async_read_engine
+
+EXPORT_COLUMNS = [
+    "id", "timestamp", "source", "raw_text", "action",
+    "project", "duration", "tags", "metadata", "created_at"
+]
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def export_statement():
+    """Select the exported columns, oldest first"""
+    return select(
+        LogEntry.id,
+        LogEntry.timestamp,
+        LogEntry.source,
+        LogEntry.raw_text,
+        LogEntry.action,
+        LogEntry.project,
+        LogEntry.duration,
+        LogEntry.tags,
+        LogEntry.entry_metadata,
+        LogEntry.created_at,
+    ).order_by(LogEntry.timestamp, LogEntry.id)
+
+
+def _row_to_dict(row) -> dict:
+    record = dict(zip(EXPORT_COLUMNS, row))
+    record["timestamp"] = record["timestamp"].isoformat() if record["timestamp"] else None
+    record["created_at"] = record["created_at"].isoformat() if record["created_at"] else None
+    return record
+
+
+def _format_ndjson(rows: List) -> str:
+    return "".join(json.dumps(_row_to_dict(row)) + "\n" for row in rows)
+
+
+def _format_csv(rows: List) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        record = _row_to_dict(row)
+        record["tags"] = ";".join(record["tags"]) if record["tags"] else ""
+        record["metadata"] = json.dumps(record["metadata"]) if record["metadata"] else ""
+        writer.writerow([record[column] for column in EXPORT_COLUMNS])
+    return buffer.getvalue()
+
+
+async def iter_export(statement, fmt: str) -> AsyncIterator[str]:
+    """Stream the statement on a dedicated connection and yield serialized chunks"""
+    formatter = _format_csv if fmt == "csv" else _format_ndjson
+
+    if fmt == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(EXPORT_COLUMNS)
+        yield buffer.getvalue()
+
+    async with async_read_engine.connect() as conn:
+        result = await conn.stream(
+            statement.execution_options(yield_per=settings.export_chunk_size)
+        )
+        async for partition in result.partitions():
+            yield formatter(partition)
@@ -0,0 +1,310 @@
+"""
+Deterministic local parser for short log messages.
+
+Messages like "gym 45m" or "coding loglify 2h #backend" are parsed without
+a network round trip: tags, durations and explicit times are taken out
+with patterns, then the action and project are matched against
+vocabularies of known names (built-in keywords plus what past entries
+used). Every result has a confidence score; HybridParser sends only
+low-confidence messages to the LLM and counts how often each path is taken.
+"""
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Tuple
+
+from sqlalchemy import desc, func, select
+from sqlalchemy.orm import Session
+
+from cli import parse_duration
+from config import settings
+from database import DailyRollup
+from llm_parser import BatchingParser, LLMParser
+
+# Keyword -> action name, used until past entries provide better names
+BUILTIN_ACTIONS = {
+    "coding": "Coding",
+    "code": "Coding",
+    "programming": "Coding",
+    "debugging": "Debugging",
+    "reading": "Reading",
+    "read": "Reading",
+    "writing": "Writing",
+    "studying": "Studying",
+    "study": "Studying",
+    "meeting": "Meeting",
+    "call": "Meeting",
+    "code review": "Code Review",
+    "gym": "Exercise",
+    "workout": "Exercise",
+    "exercise": "Exercise",
+    "running": "Exercise",
+    "yoga": "Exercise",
+    "walk": "Walking",
+    "walking": "Walking",
+    "cooking": "Cooking",
+    "cleaning": "Cleaning",
+    "breakfast": "Eating",
+    "lunch": "Eating",
+    "dinner": "Eating",
+    "nap": "Sleep",
+    "sleep": "Sleep",
+}
+
+# Words that carry no information of their own
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "to", "for", "on", "in", "at", "with", "of",
+    "i", "i'm", "im", "just", "did", "done", "some", "my", "was", "been", "spent",
+    "today", "session", "about", "around", "then",
+}
+
+# Learned names longer than this are free-text messages, not reusable names
+MAX_NAME_WORDS = 3
+MAX_NAME_LENGTH = 40
+
+TAG_RE = re.compile(r"(?<!\w)#([\w-]+)")
+PROJECT_MARKER_RE = re.compile(r"(?<!\w)@([\w.-]+)|\bproject\s+([\w.-]+)", re.IGNORECASE)
+DURATION_RE = re.compile(
+    r"(?<![\d.])(\d+(?:\.\d+)?)\s*(hours?|hrs?|h|minutes?|mins?|m)(?![a-z])",
+    re.IGNORECASE
+)
+DURATION_WORDS_RE = re.compile(r"\b(half an hour|half hour|an hour|one hour)\b", re.IGNORECASE)
+DURATION_WORDS = {"half an hour": 30.0, "half hour": 30.0, "an hour": 60.0, "one hour": 60.0}
+CLOCK_RE = re.compile(
+    r"\b(?:at\s+)?(\d{1,2})(?::(\d{2}))?\s*(am|pm)\b|\b(?:at\s+)?(\d{1,2}):(\d{2})\b",
+    re.IGNORECASE
+)
+YESTERDAY_RE = re.compile(r"\byesterday\b", re.IGNORECASE)
+WORD_RE = re.compile(r"[\w'-]+")
+
+
+def _phrase_pattern(phrases: Iterable[str]) -> Optional[Pattern]:
+    """One regex matching any of the phrases as whole words, longest first"""
+    phrases = sorted(set(phrases), key=len, reverse=True)
+    if not phrases:
+        return None
+    return re.compile(
+        r"(?<!\w)(" + "|".join(re.escape(phrase) for phrase in phrases) + r")(?!\w)",
+        re.IGNORECASE
+    )
+
+
+def _is_name(value: Optional[str]) -> bool:
+    return bool(value) and len(value) <= MAX_NAME_LENGTH and len(value.split()) <= MAX_NAME_WORDS
+
+
+def _content_words(text: str) -> List[str]:
+    return [word for word in WORD_RE.findall(text.lower()) if word not in STOPWORDS]
+
+
+class LocalParser:
+    """Pattern and vocabulary based parser; no I/O while parsing"""
+
+    def __init__(self):
+        self.actions: Dict[str, str] = dict(BUILTIN_ACTIONS)
+        self.projects: Dict[str, str] = {}
+        self._action_re: Optional[Pattern] = None
+        self._project_re: Optional[Pattern] = None
+        self._compile()
+
+    def _compile(self):
+        self._action_re = _phrase_pattern(self.actions)
+        self._project_re = _phrase_pattern(self.projects)
+
+    def learn(self, action: Optional[str] = None, project: Optional[str] = None):
+        """Add an action or project name seen in a logged entry"""
+        changed = False
+        if _is_name(action) and action.lower() not in self.actions:
+            self.actions[action.lower()] = action
+            changed = True
+        if _is_name(project) and project.lower() not in self.projects:
+            self.projects[project.lower()] = project
+            changed = True
+        if changed:
+            self._compile()
+
+    def load_vocabulary(self, db: Session, limit: int = None):
+        """Learn the most used action and project names from the daily rollup"""
+        limit = limit or settings.fast_parser_vocabulary_size
+        total = func.sum(DailyRollup.entry_count)
+        for column in (DailyRollup.action, DailyRollup.project):
+            names = db.scalars(
+                select(column).where(column != "").group_by(column).order_by(desc(total)).limit(limit)
+            ).all()
+            for name in names:
+                if column is DailyRollup.action:
+                    self.learn(action=name)
+                else:
+                    self.learn(project=name)
+
+    def _take_duration(self, text: str) -> Tuple[Optional[float], str]:
+        duration = None
+        for pattern in (DURATION_RE, DURATION_WORDS_RE):
+            for match in pattern.finditer(text):
+                minutes = DURATION_WORDS.get(match.group(0).lower()) or parse_duration(match.group(0))
+                if minutes is not None:
+                    duration = (duration or 0.0) + minutes
+            text = pattern.sub(" ", text)
+
+        if duration is None:
+            # Wordings the patterns above do not cover
+            duration = LLMParser._extract_duration(text)
+        return duration, text
+
+    def _take_timestamp(self, text: str, now: datetime) -> Tuple[Optional[datetime], str]:
+        """Explicit local times ("at 14:30", "9am", "yesterday") as naive UTC"""
+        day = now
+        explicit = False
+        if YESTERDAY_RE.search(text):
+            day = now - timedelta(days=1)
+            explicit = True
+            text = YESTERDAY_RE.sub(" ", text)
+
+        match = CLOCK_RE.search(text)
+        if match:
+            if match.group(1):
+                hour, minute = int(match.group(1)), int(match.group(2) or 0)
+                if hour > 12:
+                    match = None
+                else:
+                    hour = hour % 12 + (12 if match.group(3).lower() == "pm" else 0)
+            else:
+                hour, minute = int(match.group(4)), int(match.group(5))
+            if match and hour < 24 and minute < 60:
+                day = day.replace(hour=hour, minute=minute, second=0, microsecond=0)
+                explicit = True
+                text = text[:match.start()] + " " + text[match.end():]
+
+        if not explicit:
+            return None, text
+        return day.astimezone(timezone.utc).replace(tzinfo=None), text
+
+    @staticmethod
+    def _take_phrase(pattern: Optional[Pattern], names: Dict[str, str], text: str) -> Tuple[Optional[str], str]:
+        match = pattern.search(text) if pattern else None
+        if not match:
+            return None, text
+        return names[match.group(1).lower()], text[:match.start()] + " " + text[match.end():]
+
+    def parse(self, text: str, now: datetime = None) -> Dict[str, Any]:
+        """
+        Parse a message into action, project, duration, tags and timestamp.
+        confidence is 0..1: half for the share of content words explained
+        by the action and project, half for recognizing an action, which
+        only counts when no word is left over (a project the parser has
+        not learned would otherwise be lost).
+        """
+        now = now or datetime.now()
+        remaining = text
+
+        tags = []
+        for tag in TAG_RE.findall(remaining):
+            if tag.lower() not in tags:
+                tags.append(tag.lower())
+        remaining = TAG_RE.sub(" ", remaining)
+
+        duration, remaining = self._take_duration(remaining)
+        timestamp, remaining = self._take_timestamp(remaining, now)
+
+        project = None
+        marker = PROJECT_MARKER_RE.search(remaining)
+        if marker:
+            name = marker.group(1) or marker.group(2)
+            project = self.projects.get(name.lower(), name)
+            remaining = remaining[:marker.start()] + " " + remaining[marker.end():]
+        else:
+            project, remaining = self._take_phrase(self._project_re, self.projects, remaining)
+
+        before = len(_content_words(remaining))
+        action, remaining = self._take_phrase(self._action_re, self.actions, remaining)
+        unexplained = len(_content_words(remaining))
+
+        # Tags and durations are matched by pattern; they say nothing about the other words
+        explained = (before - unexplained) + (project is not None)
+        coverage = explained / (explained + unexplained) if explained + unexplained else 0.0
+        confidence = (0.5 if action and not unexplained else 0.0) + 0.5 * coverage
+
+        return {
+            "action": action or text.strip()[:50],
+            "project": project,
+            "duration": duration,
+            "tags": tags,
+            "timestamp": timestamp,
+            "confidence": round(confidence, 3),
+        }
+
+
+class HybridParser:
+    """
+    Local parser first, LLM only when the local result is not confident
+    enough. Tracks calls and time spent per path. With a batcher, async
+    LLM parses of concurrent messages share requests.
+    """
+
+    def __init__(self, llm_parser: LLMParser = None, local_parser: LocalParser = None,
+                 min_confidence: float = None, enabled: bool = None,
+                 batcher: Optional[BatchingParser] = None):
+        self.llm = llm_parser or LLMParser()
+        self.local = local_parser or LocalParser()
+        self.batcher = batcher
+        self.min_confidence = settings.fast_parser_min_confidence if min_confidence is None else min_confidence
+        self.enabled = settings.fast_parser_enabled if enabled is None else enabled
+        self.metrics = {
+            "local": {"count": 0, "seconds": 0.0},
+            "llm": {"count": 0, "seconds": 0.0},
+        }
+
+    def _record(self, path: str, started: float):
+        self.metrics[path]["count"] += 1
+        self.metrics[path]["seconds"] += time.perf_counter() - started
+
+    def parse(self, text: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        local = self.local.parse(text)
+        if self.enabled and local["confidence"] >= self.min_confidence:
+            self._record("local", started)
+            return local
+
+        parsed = self.llm.parse_natural_language(text)
+        # The LLM does not resolve explicit times
+        parsed["timestamp"] = local["timestamp"]
+        parsed["confidence"] = None
+        self._record("llm", started)
+        return parsed
+
+    async def aparse(self, text: str) -> Dict[str, Any]:
+        """Like parse, but awaits the LLM on the shared async client"""
+        started = time.perf_counter()
+        local = self.local.parse(text)
+        if self.enabled and local["confidence"] >= self.min_confidence:
+            self._record("local", started)
+            return local
+
+        if self.batcher is not None:
+            parsed = await self.batcher.parse(text)
+        else:
+            parsed = await self.llm.aparse_natural_language(text)
+        parsed["timestamp"] = local["timestamp"]
+        parsed["confidence"] = None
+        self._record("llm", started)
+        return parsed
+
+    def learn(self, action: Optional[str] = None, project: Optional[str] = None):
+        self.local.learn(action, project)
+
+    def stats(self) -> Dict[str, Any]:
+        total = sum(path["count"] for path in self.metrics.values())
+        llm_cache = getattr(self.llm, "cache", None)
+        return {
+            "total": total,
+            "llm_cache": llm_cache.stats() if llm_cache is not None else None,
+            "llm_batches": self.batcher.stats() if self.batcher is not None else None,
+            "local_ratio": round(self.metrics["local"]["count"] / total, 4) if total else 0.0,
+            **{
+                path: {
+                    "count": values["count"],
+                    "avg_ms": round(values["seconds"] * 1000 / values["count"], 2) if values["count"] else 0.0,
+                }
+                for path, values in self.metrics.items()
+            }
+        }
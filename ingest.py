@@ -0,0 +1,361 @@
+"""
+Bulk write path for log entries.
+
+Validation and insertion are kept apart so every ingest route (single,
+batch, streaming NDJSON) shares the same row shape and the same
+single-statement insert.
+
+Entries with an idempotency key are written at most once: a key that is
+already stored updates that entry (or is a no-op when nothing changed),
+so re-syncs and client retries do not add duplicates.
+"""
+import asyncio
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import inspect, insert, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from batching import MicroBatcher
+from config import settings
+from database import LogEntry, mark_entries_changed, mark_entries_updated, upsert_insert
+from models import LogEntryCreate
+import rollup
+import tags
+
+
+# Columns an idempotent re-send may change
+UPSERT_COLUMNS = ("timestamp", "source", "raw_text", "action", "project", "duration", "tags", "entry_metadata")
+
+
+def idempotency_key_for(entry: LogEntryCreate) -> Optional[str]:
+    """
+    The entry's own key, or one derived from aggregator metadata: the
+    commit SHA, or the repository and number of a pull request.
+    """
+    if entry.idempotency_key:
+        return entry.idempotency_key
+    metadata = entry.metadata or {}
+    if metadata.get("sha"):
+        return f"{entry.source}:commit:{metadata['sha']}"
+    if metadata.get("number") is not None and metadata.get("repo"):
+        return f"{entry.source}:pr:{metadata['repo']}#{metadata['number']}"
+    return None
+
+
+def entry_to_row(entry: LogEntryCreate, now: datetime = None) -> Dict[str, Any]:
+    """Convert a validated entry into a row for a bulk insert"""
+    now = now or datetime.utcnow()
+    return {
+        "timestamp": entry.timestamp or now,
+        "source": entry.source,
+        "raw_text": entry.raw_text,
+        "action": entry.action,
+        "project": entry.project,
+        "duration": entry.duration,
+        "tags": entry.tags,
+        "entry_metadata": entry.metadata,
+        "created_at": now,
+        "idempotency_key": idempotency_key_for(entry),
+    }
+
+
+def validate_entries(items: Iterable[Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Validate raw items against LogEntryCreate.
+    Returns (rows, errors) where each error carries the index of the item.
+    """
+    now = datetime.utcnow()
+    rows = []
+    errors = []
+
+    for index, item in enumerate(items):
+        try:
+            entry = LogEntryCreate.model_validate(item)
+        except ValidationError as e:
+            errors.append({
+                "index": index,
+                "error": e.errors(include_url=False, include_context=False)
+            })
+            continue
+        rows.append(entry_to_row(entry, now))
+
+    return rows, errors
+
+
+def _comparable(value: Any) -> Any:
+    # Stored timestamps come back naive
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    return value
+
+
+def _insert_rows(db: Session, rows: List[Dict[str, Any]]) -> List[int]:
+    result = db.scalars(
+        insert(LogEntry).returning(LogEntry.id, sort_by_parameter_order=True),
+        rows
+    )
+    return list(result.all())
+
+
+def upsert_entries(db: Session, rows: List[Dict[str, Any]]) -> Tuple[List[int], Dict[str, int]]:
+    """
+    Write rows and return their ids in order, plus counts of rows that were
+    inserted, updated (idempotency key already stored, values changed) and
+    unchanged. Rows repeating a key within the batch resolve to one entry
+    (the last one wins). The tag index and daily rollups are updated in the
+    same transaction; the caller owns the transaction and must commit.
+    """
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    if not rows:
+        return [], counts
+
+    latest = {row["idempotency_key"]: row for row in rows if row.get("idempotency_key")}
+    stored: Dict[str, Any] = {}
+    keys = list(latest)
+    for start in range(0, len(keys), 500):
+        for entry in db.execute(
+            select(LogEntry.id, LogEntry.idempotency_key, *(getattr(LogEntry, column) for column in UPSERT_COLUMNS))
+            .where(LogEntry.idempotency_key.in_(keys[start:start + 500]))
+        ):
+            stored[entry.idempotency_key] = entry
+
+    # Keyless rows are always new; keyed rows once per key unless stored
+    fresh = [row for row in rows if not row.get("idempotency_key")]
+    fresh_keyed = [row for key, row in latest.items() if key not in stored]
+    changed = []
+    for key, row in latest.items():
+        if key not in stored:
+            continue
+        old = stored[key]
+        if all(_comparable(getattr(old, column)) == _comparable(row[column]) for column in UPSERT_COLUMNS):
+            counts["unchanged"] += 1
+        else:
+            changed.append((old, row))
+
+    if changed:
+        db.execute(update(LogEntry), [
+            {"id": old.id, **{column: row[column] for column in UPSERT_COLUMNS}} for old, row in changed
+        ])
+        connection = db.connection()
+        tags.unindex_entries(connection, [old.id for old, _ in changed])
+        tags.index_entries(connection, [(old.id, row["tags"]) for old, row in changed])
+        rollup.apply_rows(db, [{column: getattr(old, column) for column in UPSERT_COLUMNS} for old, _ in changed], -1)
+        rollup.apply_rows(db, [row for _, row in changed])
+        # Bulk UPDATE bypasses the flush listeners
+        mark_entries_updated(db, [old.id for old, _ in changed])
+        counts["updated"] = len(changed)
+
+    inserted = []
+    ids = _insert_rows(db, fresh) if fresh else []
+    inserted.extend(zip(ids, fresh))
+    ids_by_key = {key: old.id for key, old in stored.items()}
+
+    if fresh_keyed:
+        statement = upsert_insert(db.connection(), LogEntry)
+        if statement is not None:
+            # A concurrent writer may have stored the same key meanwhile
+            statement = statement.on_conflict_do_nothing(index_elements=["idempotency_key"])
+        else:
+            statement = insert(LogEntry)
+        for entry_id, key in db.execute(statement.returning(LogEntry.id, LogEntry.idempotency_key), fresh_keyed):
+            ids_by_key[key] = entry_id
+            inserted.append((entry_id, latest[key]))
+        missing = [row["idempotency_key"] for row in fresh_keyed if row["idempotency_key"] not in ids_by_key]
+        if missing:
+            ids_by_key.update(db.execute(
+                select(LogEntry.idempotency_key, LogEntry.id).where(LogEntry.idempotency_key.in_(missing))
+            ).all())
+            counts["unchanged"] += len(missing)
+
+    if inserted:
+        tags.index_entries(db.connection(), [(entry_id, row["tags"]) for entry_id, row in inserted])
+        rollup.apply_rows(db, [row for _, row in inserted])
+        counts["inserted"] = len(inserted)
+    if inserted or changed:
+        mark_entries_changed(db)
+
+    fresh_ids = iter(ids)
+    return [
+        ids_by_key[row["idempotency_key"]] if row.get("idempotency_key") else next(fresh_ids)
+        for row in rows
+    ], counts
+
+
+def insert_entries(db: Session, rows: List[Dict[str, Any]]) -> List[int]:
+    """
+    Insert rows with a single bulk statement and return their ids in order.
+    Rows with an idempotency key that is already stored update that entry
+    (see upsert_entries). The tag index and daily rollups are updated in the
+    same transaction; the caller owns the transaction and must commit.
+    """
+    return upsert_entries(db, rows)[0]
+
+
+def ensure_idempotency_key(db: Session):
+    """Add the idempotency_key column and its unique index to databases that predate it"""
+    connection = db.connection()
+    columns = {column["name"] for column in inspect(connection).get_columns(LogEntry.__tablename__)}
+    if "idempotency_key" in columns:
+        return
+    connection.execute(text(f"ALTER TABLE {LogEntry.__tablename__} ADD COLUMN idempotency_key VARCHAR"))
+    for index in LogEntry.__table__.indexes:
+        if index.columns.keys() == ["idempotency_key"]:
+            index.create(connection)
+    db.commit()
+
+
+async def iter_ndjson_lines(
+    chunks: AsyncIterator[bytes],
+    max_line_bytes: int
+) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """
+    Split a byte stream into numbered lines as it arrives.
+    Lines longer than max_line_bytes are yielded as None instead of being
+    buffered, so memory stays bounded regardless of the input.
+    """
+    buffer = bytearray()
+    line_number = 0
+    oversized = False
+
+    async for chunk in chunks:
+        start = 0
+        while True:
+            newline = chunk.find(b"\n", start)
+            if newline == -1:
+                if not oversized:
+                    buffer += chunk[start:]
+                    if len(buffer) > max_line_bytes:
+                        oversized = True
+                        buffer.clear()
+                break
+
+            line_number += 1
+            if oversized:
+                yield line_number, None
+            else:
+                buffer += chunk[start:newline]
+                yield line_number, bytes(buffer) if len(buffer) <= max_line_bytes else None
+            buffer.clear()
+            oversized = False
+            start = newline + 1
+
+    if buffer or oversized:
+        yield line_number + 1, None if oversized else bytes(buffer)
+
+
+async def ingest_ndjson(
+    db: AsyncSession,
+    chunks: AsyncIterator[bytes],
+    default_source: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Ingest newline-delimited JSON log entries from a byte stream.
+    Valid lines are inserted in transactions of settings.ingest_chunk_size
+    rows; only the first settings.ingest_max_reported_errors rejections are
+    reported in detail, the rest are only counted.
+    """
+    accepted = 0
+    rejected = 0
+    errors = []
+    rows = []
+
+    def reject(line_number: int, error: Any):
+        nonlocal rejected
+        rejected += 1
+        if len(errors) < settings.ingest_max_reported_errors:
+            errors.append({"line": line_number, "error": error})
+
+    async def flush():
+        nonlocal accepted
+        await db.run_sync(insert_entries, rows)
+        await db.commit()
+        accepted += len(rows)
+        rows.clear()
+
+    async for line_number, line in iter_ndjson_lines(chunks, settings.ingest_max_line_bytes):
+        if line is None:
+            reject(line_number, f"Line exceeds {settings.ingest_max_line_bytes} bytes")
+            continue
+        if not line.strip():
+            continue
+
+        try:
+            item = json.loads(line)
+            if default_source and isinstance(item, dict):
+                item.setdefault("source", default_source)
+            entry = LogEntryCreate.model_validate(item)
+        except ValidationError as e:
+            reject(line_number, e.errors(include_url=False, include_context=False))
+            continue
+        except ValueError as e:
+            reject(line_number, f"Invalid JSON: {str(e)}")
+            continue
+
+        rows.append(entry_to_row(entry))
+        if len(rows) >= settings.ingest_chunk_size:
+            await flush()
+
+    if rows:
+        await flush()
+
+    return {
+        "accepted": accepted,
+        "rejected": rejected,
+        "errors": errors,
+        "errors_truncated": rejected > len(errors)
+    }
+
+
+class GroupCommitWriter(MicroBatcher):
+    """
+    Single writer task that commits single-entry inserts in groups.
+
+    Callers submit a row and wait; the writer collects rows for up to
+    `window_ms` (or until `max_batch` rows are queued), inserts them in one
+    transaction and then resolves every caller with its new id. Under load
+    this turns one commit (one fsync on SQLite) per entry into one per
+    batch, and only one connection writes at a time.
+    """
+
+    def __init__(self, session_factory, window_ms: float, max_batch: int):
+        super().__init__(window_ms, max_batch)
+        self.session_factory = session_factory
+        self.batches = 0
+        self.rows = 0
+
+    async def submit(self, row: Dict[str, Any]) -> int:
+        """Queue a row for insertion and wait until its batch has committed"""
+        if not self.running:
+            raise RuntimeError("GroupCommitWriter is not running")
+        # Raises once stop() was called
+        return await self._submit(row)
+
+    async def _handle(self, batch: List):
+        await self._commit(batch)
+
+    async def _commit(self, batch: List):
+        rows = [row for row, _ in batch]
+        try:
+            async with self.session_factory() as db:
+                ids = await db.run_sync(insert_entries, rows)
+                await db.commit()
+        except Exception as e:
+            if len(batch) > 1:
+                # Retry one by one so a bad row only fails its own caller
+                for item in batch:
+                    await self._commit([item])
+                return
+            future = batch[0][1]
+            if not future.done():
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.rows += len(rows)
+        for (_, future), entry_id in zip(batch, ids):
+            if not future.done():
+                future.set_result(entry_id)
@@ -0,0 +1,284 @@
+"""
+Persistent asyncio job scheduler.
+
+All jobs run on one long-lived event loop, each in its own task, so a slow
+job never delays another and connection pools (database, OpenAI, HTTP)
+are reused across runs. A job never overlaps itself: its next run is
+scheduled from the time the current one finished (or hit its timeout),
+and slots that passed meanwhile are counted as skipped rather than run
+in a burst.
+
+Run times and outcomes are kept in SCHEDULER_STATE_PATH. A run missed
+while the scheduler was down is caught up once at startup if it is less
+than SCHEDULER_CATCH_UP_HOURS late, and first runs after startup are
+spread by up to SCHEDULER_STARTUP_JITTER_SECONDS.
+"""
+import asyncio
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from config import settings
+
+# Jobs are called with the time they were scheduled for (local time)
+JobFunc = Callable[[datetime], Awaitable[Any]]
+
+
+class CronTrigger:
+    """
+    Five-field cron expression (minute hour day month weekday) in local
+    time. Fields take *, numbers, ranges, lists and steps (*/15, 1-5,
+    0,30); weekday 0 or 7 is Sunday; day L is the last day of the month.
+    """
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression}")
+        self.expression = expression
+        self.minutes = self._parse(fields[0], 0, 59)
+        self.hours = self._parse(fields[1], 0, 23)
+        self.last_day = "L" in fields[2].split(",")
+        self.days = self._parse(",".join(part for part in fields[2].split(",") if part != "L"), 1, 31)
+        self.months = self._parse(fields[3], 1, 12)
+        self.weekdays = {day % 7 for day in self._parse(fields[4], 0, 7)}
+        self.day_restricted = fields[2] != "*"
+        self.weekday_restricted = fields[4] != "*"
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int) -> Set[int]:
+        values = set()
+        for part in filter(None, field.split(",")):
+            part, _, step = part.partition("/")
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start, end = (int(value) for value in part.split("-", 1))
+            else:
+                start = int(part)
+                end = high if step else start
+            if not low <= start <= end <= high:
+                raise ValueError(f"Cron field out of range ({low}-{high}): {field}")
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        in_month = moment.day in self.days or (self.last_day and (moment + timedelta(days=1)).day == 1)
+        # Cron's weekday numbering starts at Sunday
+        on_weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.day_restricted and self.weekday_restricted:
+            return in_month or on_weekday
+        if self.day_restricted:
+            return in_month
+        return on_weekday
+
+    def next_after(self, moment: datetime) -> datetime:
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Leap days can be up to 8 years apart
+        limit = candidate + timedelta(days=366 * 8)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                candidate = (candidate.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression never matches: {self.expression}")
+
+    def __str__(self) -> str:
+        return f"cron {self.expression}"
+
+
+class IntervalTrigger:
+    """Every N minutes, counted from the end of the previous run"""
+    def __init__(self, minutes: float):
+        self.interval = timedelta(minutes=minutes)
+
+    def next_after(self, moment: datetime) -> datetime:
+        return moment + self.interval
+
+    def __str__(self) -> str:
+        return f"every {self.interval.total_seconds() / 60:g} min"
+
+
+class JobStore:
+    """Last run, next run and failure counts of each job in a SQLite file"""
+    COLUMNS = ("name", "trigger", "next_run", "running", "last_started", "last_duration", "last_status",
+               "last_error", "runs", "failures", "consecutive_failures", "skipped")
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "name TEXT PRIMARY KEY, trigger TEXT, next_run REAL, running INTEGER NOT NULL DEFAULT 0, "
+            "last_started REAL, last_duration REAL, last_status TEXT, last_error TEXT, "
+            "runs INTEGER NOT NULL DEFAULT 0, failures INTEGER NOT NULL DEFAULT 0, "
+            "consecutive_failures INTEGER NOT NULL DEFAULT 0, skipped INTEGER NOT NULL DEFAULT 0)"
+        )
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        rows = self._execute(f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE name = ?", (name,))
+        return dict(zip(self.COLUMNS, rows[0])) if rows else None
+
+    def all(self) -> List[Dict[str, Any]]:
+        rows = self._execute(f"SELECT {', '.join(self.COLUMNS)} FROM jobs ORDER BY name")
+        return [dict(zip(self.COLUMNS, row)) for row in rows]
+
+    def schedule(self, name: str, trigger: str, next_run: datetime):
+        self._execute(
+            "INSERT INTO jobs (name, trigger, next_run) VALUES (?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET trigger = excluded.trigger, next_run = excluded.next_run, running = 0",
+            (name, trigger, next_run.timestamp())
+        )
+
+    def start(self, name: str, started: float):
+        self._execute("UPDATE jobs SET running = 1, last_started = ? WHERE name = ?", (started, name))
+
+    def finish(self, name: str, duration: float, status: str, error: Optional[str]):
+        failed = int(status != "ok")
+        self._execute(
+            "UPDATE jobs SET running = 0, last_duration = ?, last_status = ?, last_error = ?, runs = runs + 1, "
+            "failures = failures + ?, consecutive_failures = (consecutive_failures + 1) * ? WHERE name = ?",
+            (duration, status, error, failed, failed, name)
+        )
+
+    def skip(self, name: str, count: int):
+        self._execute("UPDATE jobs SET skipped = skipped + ? WHERE name = ?", (count, name))
+
+
+_default_store: Optional[JobStore] = None
+
+
+def get_job_store() -> JobStore:
+    """Process-wide job store at SCHEDULER_STATE_PATH"""
+    global _default_store
+    if _default_store is None:
+        _default_store = JobStore(settings.scheduler_state_path)
+    return _default_store
+
+
+class Job:
+    def __init__(self, name: str, func: JobFunc, trigger, timeout_minutes: float, catch_up: bool):
+        self.name = name
+        self.func = func
+        self.trigger = trigger
+        self.timeout = timeout_minutes * 60
+        self.catch_up = catch_up
+
+
+class JobScheduler:
+    def __init__(self, store: Optional[JobStore] = None, jitter_seconds: float = None,
+                 catch_up_hours: float = None, clock: Callable[[], datetime] = datetime.now,
+                 sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep):
+        self.store = store if store is not None else get_job_store()
+        # Replaceable so tests can run the schedule on virtual time
+        self.clock = clock
+        self.sleep = sleep
+        self.jitter_seconds = settings.scheduler_startup_jitter_seconds if jitter_seconds is None else jitter_seconds
+        self.catch_up = timedelta(hours=settings.scheduler_catch_up_hours if catch_up_hours is None else catch_up_hours)
+        self.jobs: Dict[str, Job] = {}
+
+    def add_job(self, name: str, func: JobFunc, trigger, timeout_minutes: float = None,
+                catch_up: bool = True) -> Job:
+        """Register func to run on trigger; runs longer than timeout_minutes are cancelled"""
+        job = Job(name, func, trigger,
+                  settings.scheduler_job_timeout_minutes if timeout_minutes is None else timeout_minutes, catch_up)
+        self.jobs[name] = job
+        return job
+
+    def _first_run(self, job: Job, now: datetime) -> Tuple[datetime, datetime]:
+        """(time the first run is scheduled for, time to start it) after a restart"""
+        jitter = timedelta(seconds=random.uniform(0, self.jitter_seconds))
+        state = self.store.get(job.name)
+        if state and state["next_run"] is not None:
+            missed = datetime.fromtimestamp(state["next_run"])
+            if missed <= now and job.catch_up and now - missed <= self.catch_up:
+                print(f"⏪ {job.name}: catching up the run missed at {missed:%Y-%m-%d %H:%M}")
+                return missed, now + jitter
+            if missed > now:
+                return missed, missed
+        if isinstance(job.trigger, IntervalTrigger) and not (state and state["runs"]):
+            # Interval jobs that never ran start right away
+            return now, now + jitter
+        scheduled = job.trigger.next_after(now)
+        return scheduled, scheduled
+
+    async def _run(self, job: Job, scheduled: datetime):
+        started = time.time()
+        self.store.start(job.name, started)
+        status, error = "ok", None
+        try:
+            await asyncio.wait_for(job.func(scheduled), timeout=job.timeout)
+        except asyncio.TimeoutError:
+            status, error = "timeout", f"cancelled after {job.timeout / 60:g} minutes"
+        except Exception as e:
+            status, error = "failed", str(e)
+        duration = time.time() - started
+        self.store.finish(job.name, duration, status, error)
+        if status == "ok":
+            print(f"[{datetime.now()}] ✅ {job.name} finished in {duration:.1f}s")
+        else:
+            print(f"[{datetime.now()}] ❌ {job.name} {status} after {duration:.1f}s: {error}")
+
+    async def _loop(self, job: Job):
+        scheduled, start_at = self._first_run(job, self.clock())
+        while True:
+            self.store.schedule(job.name, str(job.trigger), scheduled)
+            # Short sleeps so clock changes and system suspend are noticed
+            while (remaining := (start_at - self.clock()).total_seconds()) > 0:
+                await self.sleep(min(remaining, 60))
+
+            await self._run(job, scheduled)
+
+            now = self.clock()
+            if isinstance(job.trigger, IntervalTrigger):
+                scheduled = job.trigger.next_after(now)
+            else:
+                skipped = 0
+                scheduled = job.trigger.next_after(scheduled)
+                while scheduled <= now:
+                    skipped += 1
+                    scheduled = job.trigger.next_after(scheduled)
+                if skipped:
+                    self.store.skip(job.name, skipped)
+                    print(f"⏭️ {job.name}: {skipped} run(s) skipped while the previous one was running")
+            start_at = scheduled
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Stored state of the registered jobs"""
+        return [state for state in self.store.all() if state["name"] in self.jobs]
+
+    async def run(self):
+        """Run all jobs until cancelled"""
+        for job in self.jobs.values():
+            print(f"📅 {job.name} scheduled ({job.trigger})")
+        await asyncio.gather(*(self._loop(job) for job in self.jobs.values()))
+
+
+def format_status(states: List[Dict[str, Any]]) -> str:
+    """Table of last run, duration, next run and failures per job"""
+    def when(timestamp: Optional[float]) -> str:
+        return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M") if timestamp else "-"
+
+    lines = [f"{'JOB':<20} {'LAST RUN':<17} {'STATUS':<8} {'DURATION':>9} {'NEXT RUN':<17} {'RUNS':>5} "
+             f"{'FAILED':>6} {'SKIPPED':>7}"]
+    for state in states:
+        status = "running" if state["running"] else (state["last_status"] or "-")
+        duration = f"{state['last_duration']:.1f}s" if state["last_duration"] is not None else "-"
+        lines.append(f"{state['name']:<20} {when(state['last_started']):<17} {status:<8} {duration:>9} "
+                     f"{when(state['next_run']):<17} {state['runs']:>5} {state['failures']:>6} {state['skipped']:>7}")
+        if state["last_status"] not in (None, "ok") and state["last_error"]:
+            lines.append(f"{'':<20} {state['last_error']}")
+    return "\n".join(lines)
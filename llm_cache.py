@@ -0,0 +1,165 @@
+"""
+Cache of LLM parse results.
+
+Keys are the normalized message text plus the model and prompt version,
+so changing either starts from a clean slate. Lookups go through an
+in-process LRU first and a SQLite table second; the table survives
+restarts, expires entries after a TTL and is trimmed to a maximum size by
+least recent use. Each entry remembers the tokens its original call used,
+so hits can be reported as tokens saved.
+"""
+import copy
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from cache import MemoryStore
+from config import settings
+
+
+def normalize_text(text: str) -> str:
+    """Case, surrounding punctuation and repeated whitespace do not change a parse"""
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    return text.strip(" .!?,;")
+
+
+def cache_key(text: str, model: str, prompt_version: str) -> str:
+    raw = json.dumps([model, prompt_version, normalize_text(text)])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int, memory_entries: int):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.memory = MemoryStore(memory_entries)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        # Hits are written back to the table in bulk so memory hits stay I/O free
+        self._pending_hits: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_parse_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, tokens INTEGER NOT NULL DEFAULT 0, "
+            "hits INTEGER NOT NULL DEFAULT 0, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_parse_cache_last_used ON llm_parse_cache (last_used)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_parse_cache_expires_at ON llm_parse_cache (expires_at)")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached parse for key, or None; expired entries count as misses"""
+        now = time.time()
+        found, item = self.memory.get(key)
+        if found and item["expires_at"] > now:
+            self.memory_hits += 1
+            self.tokens_saved += item["tokens"]
+            self._touch(key)
+            # Callers may modify the result (e.g. its tags list)
+            return copy.deepcopy(item["value"])
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT value, tokens, expires_at FROM llm_parse_cache WHERE key = ? AND expires_at > ?",
+                (key, now)
+            ).fetchall()
+        if not rows:
+            self.misses += 1
+            return None
+
+        value, tokens, expires_at = json.loads(rows[0][0]), rows[0][1], rows[0][2]
+        self.memory.set(key, {"value": value, "tokens": tokens, "expires_at": expires_at})
+        self.disk_hits += 1
+        self.tokens_saved += tokens
+        self._touch(key)
+        return copy.deepcopy(value)
+
+    def _touch(self, key: str):
+        with self._lock:
+            self._pending_hits[key] = self._pending_hits.get(key, 0) + 1
+            if len(self._pending_hits) >= 100:
+                self._flush_hits()
+
+    def _flush_hits(self):
+        """Write buffered hit counts and recency back to the table; caller holds the lock"""
+        if not self._pending_hits:
+            return
+        now = time.time()
+        self._conn.executemany(
+            "UPDATE llm_parse_cache SET hits = hits + ?, last_used = ? WHERE key = ?",
+            [(count, now, key) for key, count in self._pending_hits.items()]
+        )
+        self._pending_hits.clear()
+
+    def set(self, key: str, value: Dict[str, Any], tokens: int = 0):
+        now = time.time()
+        expires_at = now + self.ttl
+        self.memory.set(key, {"value": copy.deepcopy(value), "tokens": tokens, "expires_at": expires_at})
+        with self._lock:
+            self._flush_hits()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_parse_cache (key, value, tokens, hits, expires_at, last_used) "
+                "VALUES (?, ?, ?, 0, ?, ?)",
+                (key, json.dumps(value), tokens, expires_at, now)
+            )
+            self._conn.execute("DELETE FROM llm_parse_cache WHERE expires_at <= ?", (now,))
+            self._conn.execute(
+                "DELETE FROM llm_parse_cache WHERE key IN ("
+                "SELECT key FROM llm_parse_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        with self._lock:
+            self._flush_hits()
+            size, lifetime_saved = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(hits * tokens), 0) FROM llm_parse_cache"
+            ).fetchall()[0]
+        return {
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "tokens_saved": self.tokens_saved,
+            "size": size,
+            # Over all processes since each cached entry was stored
+            "lifetime_tokens_saved": lifetime_saved,
+        }
+
+
+_default_cache: Optional[LLMCache] = None
+
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """Process-wide cache from settings, or None when disabled"""
+    global _default_cache
+    if not settings.llm_cache_enabled:
+        return None
+    if _default_cache is None:
+        _default_cache = LLMCache(
+            path=settings.llm_cache_path,
+            ttl_seconds=settings.llm_cache_ttl_days * 86400,
+            max_entries=settings.llm_cache_max_entries,
+            memory_entries=settings.llm_cache_memory_entries
+        )
+    return _default_cache
+
+
+if __name__ == "__main__":
+    llm_cache = get_llm_cache()
+    if llm_cache is None:
+        print("LLM cache is disabled (LLM_CACHE_ENABLED=false)")
+    else:
+        stats = llm_cache.stats()
+        print(f"Entries: {stats['size']}")
+        print(f"Tokens saved (lifetime): {stats['lifetime_tokens_saved']}")
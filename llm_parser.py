@@ -1,20 +1,92 @@
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from typing import Dict, Optional, List
+from batching import MicroBatcher
 from config import settings
+from context_builder import build_context
+from llm_cache import LLMCache, cache_key, get_llm_cache
+import asyncio
+import httpx
 import json
 import re
 
 
-class LLMParser:
+# Bump whenever the parse prompt or post-processing changes, so cached
+# results from the old prompt are no longer used
+PARSE_PROMPT_VERSION = "1"
+
+PARSE_SYSTEM_PROMPT = "You are a helpful assistant that parses natural language into structured JSON. Always return valid JSON only."
+QUERY_SYSTEM_PROMPT = "You are a helpful assistant that analyzes life logs and answers questions about them."
+
+
+class AsyncClientPool:
+    """
+    One AsyncOpenAI client (and its HTTP connection pool) plus a
+    concurrency limit per event loop, shared by every LLMParser.
+    Clients are bound to the loop they were created on, so short-lived
+    loops (asyncio.run in scripts) each get their own and should close it.
+    """
+
     def __init__(self):
+        self._loop = None
+        self._client: Optional[AsyncOpenAI] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def get(self):
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._loop = loop
+            self._client = AsyncOpenAI(
+                api_key=settings.openai_api_key,
+                timeout=settings.openai_timeout_seconds,
+                max_retries=settings.openai_max_retries,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=settings.openai_max_connections,
+                        max_keepalive_connections=settings.openai_max_connections
+                    )
+                )
+            )
+            self._semaphore = asyncio.Semaphore(settings.openai_max_concurrency)
+        return self._client, self._semaphore
+
+    async def aclose(self):
+        """Close the client of the running loop, if any"""
+        if self._client is not None and self._loop is asyncio.get_running_loop():
+            await self._client.close()
+        self._client = None
+        self._semaphore = None
+        self._loop = None
+
+
+async_clients = AsyncClientPool()
+
+
+class LLMParser:
+    def __init__(self, cache: Optional[LLMCache] = None):
         self.client = OpenAI(api_key=settings.openai_api_key)
         self.model = settings.openai_model
-    
-    def parse_natural_language(self, text: str) -> Dict:
+        self.cache = cache if cache is not None else get_llm_cache()
+
+    async def acomplete(self, messages: List[Dict], temperature: float, max_tokens: int,
+                        timeout: Optional[float] = None, **kwargs):
         """
-        Parse natural language text into structured log entry.
-        Returns a dictionary with action, project, duration, tags, etc.
+        Chat completion on the shared async client. Waits for a free slot
+        under OPENAI_MAX_CONCURRENCY; `timeout` (seconds) overrides
+        OPENAI_TIMEOUT_SECONDS for this call. Extra keyword arguments are
+        passed to the API (e.g. response_format).
         """
+        client, semaphore = async_clients.get()
+        async with semaphore:
+            return await client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout or settings.openai_timeout_seconds,
+                **kwargs
+            )
+
+    def _parse_messages(self, text: str) -> List[Dict]:
         prompt = f"""Parse the following natural language log entry into structured JSON format.
 Extract:
 - action: A brief action description (e.g., "Coding", "Reading", "Meeting", "Exercise")
@@ -34,46 +106,178 @@ Return ONLY valid JSON in this format:
 
 If a field cannot be determined, use null. Duration should be in minutes (convert hours to minutes)."""
 
+        return [
+            {"role": "system", "content": PARSE_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+
+    @staticmethod
+    def _parse_response(content: str) -> Dict:
+        content = content.strip()
+
+        # Extract JSON from response (handle markdown code blocks)
+        json_match = re.search(r'\{[^}]+\}', content, re.DOTALL)
+        if json_match:
+            content = json_match.group(0)
+
+        return LLMParser._normalize(json.loads(content))
+
+    @staticmethod
+    def _normalize(parsed: Dict) -> Dict:
+        # Ensure all fields are present
+        return {
+            "action": parsed.get("action", "Unknown"),
+            "project": parsed.get("project"),
+            "duration": parsed.get("duration"),
+            "tags": parsed.get("tags", [])
+        }
+
+    def fallback_parse(self, text: str) -> Dict:
+        """Regex-only parse, used when the LLM is unavailable"""
+        return {
+            "action": text[:50],  # Use first 50 chars as action
+            "project": None,
+            "duration": self._extract_duration(text),
+            "tags": []
+        }
+
+    def _cache_result(self, key: str, result: Dict, response):
+        if self.cache is not None:
+            tokens = response.usage.total_tokens if response.usage else 0
+            self.cache.set(key, result, tokens)
+
+    def _cached(self, key: str) -> Optional[Dict]:
+        return self.cache.get(key) if self.cache is not None else None
+
+    def parse_natural_language(self, text: str) -> Dict:
+        """
+        Parse natural language text into structured log entry.
+        Returns a dictionary with action, project, duration, tags, etc.
+        Results are cached by normalized text, model and prompt version.
+        """
+        key = cache_key(text, self.model, PARSE_PROMPT_VERSION)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+
         try:
             response = self.client.chat.completions.create(
                 model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that parses natural language into structured JSON. Always return valid JSON only."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=self._parse_messages(text),
                 temperature=0.3,
                 max_tokens=200
             )
-            
-            content = response.choices[0].message.content.strip()
-            
-            # Extract JSON from response (handle markdown code blocks)
-            json_match = re.search(r'\{[^}]+\}', content, re.DOTALL)
-            if json_match:
-                content = json_match.group(0)
-            
-            parsed = json.loads(content)
-            
-            # Ensure all fields are present
-            result = {
-                "action": parsed.get("action", "Unknown"),
-                "project": parsed.get("project"),
-                "duration": parsed.get("duration"),
-                "tags": parsed.get("tags", [])
-            }
-            
+            result = self._parse_response(response.choices[0].message.content)
+            self._cache_result(key, result, response)
             return result
-            
+
         except Exception as e:
             # Fallback parsing
-            return {
-                "action": text[:50],  # Use first 50 chars as action
-                "project": None,
-                "duration": self._extract_duration(text),
-                "tags": []
-            }
-    
-    def _extract_duration(self, text: str) -> Optional[float]:
+            return self.fallback_parse(text)
+
+    async def aparse_natural_language(self, text: str) -> Dict:
+        """Async parse_natural_language; does not block the event loop"""
+        key = cache_key(text, self.model, PARSE_PROMPT_VERSION)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+
+        try:
+            response = await self.acomplete(
+                self._parse_messages(text),
+                temperature=0.3,
+                max_tokens=200,
+                timeout=settings.openai_parse_timeout_seconds
+            )
+            result = self._parse_response(response.choices[0].message.content)
+            self._cache_result(key, result, response)
+            return result
+
+        except Exception as e:
+            # Fallback parsing (also on timeouts)
+            return self.fallback_parse(text)
+
+    def _batch_messages(self, texts: List[str]) -> List[Dict]:
+        inputs = "\n".join(f"{index}. {json.dumps(text)}" for index, text in enumerate(texts, 1))
+        prompt = f"""Parse each of the following natural language log entries into structured JSON.
+For every entry extract:
+- action: A brief action description (e.g., "Coding", "Reading", "Meeting", "Exercise")
+- project: Project name if mentioned (optional)
+- duration: Duration in minutes if mentioned (extract from phrases like "2 hours", "30 minutes", "45m")
+- tags: Relevant tags as a list (e.g., ["work", "backend", "bugfix"])
+
+Inputs:
+{inputs}
+
+Return ONLY a JSON object with one item per input, in input order:
+{{"entries": [{{"index": 1, "action": "...", "project": "...", "duration": ..., "tags": [...]}}, ...]}}
+
+If a field cannot be determined, use null. Duration should be in minutes (convert hours to minutes)."""
+
+        return [
+            {"role": "system", "content": PARSE_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+
+    @staticmethod
+    def _parse_batch_response(content: str, count: int) -> List[Optional[Dict]]:
+        """Entries by input position; missing or malformed items are None"""
+        results: List[Optional[Dict]] = [None] * count
+        try:
+            entries = json.loads(content).get("entries", [])
+        except (ValueError, AttributeError):
+            return results
+
+        for position, entry in enumerate(entries):
+            if not isinstance(entry, dict) or not entry.get("action"):
+                continue
+            index = entry.get("index", position + 1)
+            if isinstance(index, int) and 1 <= index <= count and results[index - 1] is None:
+                results[index - 1] = LLMParser._normalize(entry)
+        return results
+
+    async def aparse_batch(self, texts: List[str]) -> List[Dict]:
+        """
+        Parse several messages with one request; the instructions are sent
+        once instead of per message. Cached messages are not sent, and
+        items the model leaves out or garbles fall back to regex parsing
+        individually.
+        """
+        keys = [cache_key(text, self.model, PARSE_PROMPT_VERSION) for text in texts]
+        results = [self._cached(key) for key in keys]
+        pending = [i for i, result in enumerate(results) if result is None]
+
+        if len(pending) == 1:
+            results[pending[0]] = await self.aparse_natural_language(texts[pending[0]])
+        elif pending:
+            parsed: List[Optional[Dict]] = [None] * len(pending)
+            tokens = 0
+            try:
+                response = await self.acomplete(
+                    self._batch_messages([texts[i] for i in pending]),
+                    temperature=0.3,
+                    max_tokens=50 + 100 * len(pending),
+                    timeout=settings.openai_parse_timeout_seconds,
+                    response_format={"type": "json_object"}
+                )
+                parsed = self._parse_batch_response(response.choices[0].message.content, len(pending))
+                tokens = response.usage.total_tokens if response.usage else 0
+            except Exception as e:
+                # Every item falls back to regex parsing below
+                print(f"Error parsing batch of {len(pending)} messages: {str(e)}")
+
+            for slot, i in enumerate(pending):
+                if parsed[slot] is None:
+                    results[i] = self.fallback_parse(texts[i])
+                    continue
+                results[i] = parsed[slot]
+                if self.cache is not None:
+                    self.cache.set(keys[i], parsed[slot], tokens // len(pending))
+
+        return results
+
+    @staticmethod
+    def _extract_duration(text: str) -> Optional[float]:
         """Extract duration from text using regex"""
         # Patterns: "2 hours", "30 minutes", "45m", "1.5h"
         patterns = [
@@ -84,24 +288,18 @@ If a field cannot be determined, use null. Duration should be in minutes (conver
             (r'(\d+(?:\.\d+)?)\s*m\b', lambda m: float(m.group(1))),
             (r'(\d+(?:\.\d+)?)\s*h\b', lambda m: float(m.group(1)) * 60),
         ]
-        
+
         for pattern, converter in patterns:
             match = re.search(pattern, text.lower())
             if match:
                 return converter(match)
-        
+
         return None
-    
-    def answer_query(self, query: str, logs: List[Dict]) -> str:
-        """
-        Answer a natural language query about logs using AI.
-        """
-        # Format logs for context
-        logs_context = "\n".join([
-            f"- {log.get('action', 'Unknown')} ({log.get('duration', 0)} min) - {log.get('timestamp', '')}"
-            for log in logs[:50]  # Limit to 50 most recent
-        ])
-        
+
+    def _query_messages(self, query: str, logs: List[Dict]) -> List[Dict]:
+        # Repeats collapsed and trimmed to LLM_CONTEXT_MAX_TOKENS
+        logs_context = build_context(logs, label="Query context")
+
         prompt = f"""You are analyzing a user's life logs. Answer their question based on the following log entries:
 
 Logs:
@@ -111,19 +309,122 @@ Question: {query}
 
 Provide a concise, helpful answer. If the answer cannot be determined from the logs, say so."""
 
+        return [
+            {"role": "system", "content": QUERY_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+
+    def answer_query(self, query: str, logs: List[Dict]) -> str:
+        """
+        Answer a natural language query about logs using AI.
+        """
         try:
             response = self.client.chat.completions.create(
                 model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that analyzes life logs and answers questions about them."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=self._query_messages(query, logs),
+                temperature=0.5,
+                max_tokens=300
+            )
+
+            return response.choices[0].message.content.strip()
+
+        except Exception as e:
+            return f"Error processing query: {str(e)}"
+
+    async def aanswer_query(self, query: str, logs: List[Dict]) -> str:
+        """Async answer_query; does not block the event loop"""
+        try:
+            response = await self.acomplete(
+                self._query_messages(query, logs),
                 temperature=0.5,
                 max_tokens=300
             )
-            
+
             return response.choices[0].message.content.strip()
-            
+
         except Exception as e:
             return f"Error processing query: {str(e)}"
 
+    async def aphrase_answer(self, query: str, facts: str) -> str:
+        """
+        Phrase an answer to the question from already computed facts (a
+        few lines), instead of from raw log entries.
+        """
+        prompt = f"""Answer the user's question about their life logs using only these computed facts:
+
+{facts}
+
+Question: {query}
+
+Answer in one or two sentences."""
+        try:
+            response = await self.acomplete(
+                [
+                    {"role": "system", "content": QUERY_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.3,
+                max_tokens=150
+            )
+
+            return response.choices[0].message.content.strip()
+
+        except Exception:
+            # The facts are already a complete answer
+            return facts
+
+
+class BatchingParser(MicroBatcher):
+    """
+    Micro-batches parse requests from concurrent callers.
+
+    Messages arriving within `window_ms` of the first one (up to
+    `max_items`) are parsed with a single LLM request; each caller gets
+    its own result. Batches are dispatched as tasks, so a slow request
+    does not hold up collecting the next batch.
+    """
+
+    def __init__(self, parser: LLMParser, window_ms: float, max_items: int):
+        super().__init__(window_ms, max_items)
+        self.parser = parser
+        self.requests = 0
+        self.items = 0
+        self._inflight = set()
+
+    async def stop(self):
+        """Parse everything already submitted, then stop the collector task"""
+        await super().stop()
+        if self._inflight:
+            await asyncio.gather(*self._inflight)
+
+    async def parse(self, text: str) -> Dict:
+        """Queue a message and wait for its parse; starts the collector on first use"""
+        if not self.running:
+            await self.start()
+        return await self._submit(text)
+
+    async def _handle(self, batch: List):
+        task = asyncio.create_task(self._dispatch(batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List):
+        texts = [text for text, _ in batch]
+        try:
+            results = await self.parser.aparse_batch(texts)
+        except Exception as e:
+            print(f"Error parsing batch of {len(texts)} messages: {str(e)}")
+            results = [self.parser.fallback_parse(text) for text in texts]
+
+        self.requests += 1
+        self.items += len(batch)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> Dict:
+        return {
+            "batches": self.requests,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.requests, 2) if self.requests else 0.0,
+        }
@@ -1,21 +1,106 @@
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from typing import List, Optional
-from datetime import datetime, timedelta
+from fastapi import FastAPI, Depends, HTTPException, Body, Request, Response, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import desc, select
+from typing import List, Optional, Any, Literal
+from datetime import datetime
+import asyncio
 import uvicorn
 
-from database import init_db, get_db, LogEntry
-from models import LogEntryCreate, LogEntryResponse, QueryRequest
+from database import (
+    init_async_db, get_async_db, get_async_read_db, dispose_engines,
+    sqlite_profile_enabled, sqlite_maintenance_loop, LogEntry, AsyncSessionLocal
+)
+from models import (
+    LogEntryCreate, LogEntryResponse, QueryRequest, SearchResult,
+    BatchIngestResponse, StreamIngestResponse, JobStatus
+)
 from config import settings
+from ingest import (
+    validate_entries, upsert_entries, ingest_ndjson, entry_to_row, ensure_idempotency_key, GroupCommitWriter
+)
+from pagination import encode_cursor, after_cursor, InvalidCursor
+from export import EXPORT_FORMATS, export_statement, iter_export
+import rollup
+import tags as tag_index
+import search
+import query_planner
+from jobs import get_job_store
+from cache import response_cache
+from llm_parser import LLMParser, async_clients
+from retrieval import entry_index
 
 app = FastAPI(title="Loglify API", version="0.1.0")
 
+# Created on first use; the OpenAI client is only needed by /api/query
+llm_parser: Optional[LLMParser] = None
+
+group_writer = GroupCommitWriter(
+    AsyncSessionLocal,
+    window_ms=settings.group_commit_window_ms,
+    max_batch=settings.group_commit_max_batch
+)
+
+
+def apply_log_filters(
+    query,
+    source: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    project: Optional[str] = None,
+    tags: Optional[List[str]] = None,
+    tag_mode: str = "all"
+):
+    """Apply the common log entry filters to a query or select"""
+    if source:
+        query = query.filter(LogEntry.source == source)
+    
+    if start_date:
+        query = query.filter(LogEntry.timestamp >= start_date)
+    
+    if end_date:
+        query = query.filter(LogEntry.timestamp <= end_date)
+    
+    if project:
+        query = query.filter(LogEntry.project == project)
+    
+    if tags:
+        query = query.filter(tag_index.tag_filter(tags, tag_mode))
+    
+    return query
+
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on startup"""
-    init_db()
+    await init_async_db()
+    
+    async with AsyncSessionLocal() as db:
+        await db.run_sync(ensure_idempotency_key)
+        await db.run_sync(rollup.ensure_rollup)
+        await db.run_sync(search.ensure_index)
+    
+    await group_writer.start()
+    
+    # Embed existing entries in the background so the first query is fast
+    app.state.index_task = asyncio.create_task(entry_index.acatch_up())
+    
+    if sqlite_profile_enabled:
+        app.state.maintenance_task = asyncio.create_task(sqlite_maintenance_loop())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush pending writes and close pooled database connections"""
+    await group_writer.stop()
+    
+    for name in ("maintenance_task", "index_task"):
+        task = getattr(app.state, name, None)
+        if task:
+            task.cancel()
+    
+    await async_clients.aclose()
+    await dispose_engines()
 
 
 @app.get("/")
@@ -28,119 +113,278 @@ async def health():
     return {"status": "healthy"}
 
 
+@app.get("/api/jobs", response_model=List[JobStatus])
+async def job_status():
+    """Last run, duration, next run and failures of each scheduler job (see scheduler.py)"""
+    return get_job_store().all()
+
+
 @app.post("/api/logs", response_model=LogEntryResponse)
-async def create_log(entry: LogEntryCreate, db: Session = Depends(get_db)):
-    """Create a new log entry"""
-    db_entry = LogEntry(
-        source=entry.source,
-        raw_text=entry.raw_text,
-        action=entry.action,
-        project=entry.project,
-        duration=entry.duration,
-        tags=entry.tags,
-        metadata=entry.metadata
-    )
-    db.add(db_entry)
-    db.commit()
-    db.refresh(db_entry)
-    return db_entry
+async def create_log(entry: LogEntryCreate):
+    """
+    Create a new log entry.
+    The insert is committed together with other entries arriving within
+    GROUP_COMMIT_WINDOW_MS; the response is sent once that commit is done.
+    """
+    row = entry_to_row(entry)
+    entry_id = await group_writer.submit(row)
+    return {"id": entry_id, **row}
+
+
+@app.post("/api/logs/batch", response_model=BatchIngestResponse)
+async def create_logs_batch(
+    entries: List[Any] = Body(...),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Create many log entries in one transaction.
+    Items are validated individually; invalid items are reported by index
+    and the valid ones are inserted with a single bulk statement. Items
+    whose idempotency key is already stored update that entry instead.
+    """
+    if len(entries) > settings.batch_max_entries:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(entries)} entries (max {settings.batch_max_entries})"
+        )
+
+    rows, errors = validate_entries(entries)
+
+    ids, counts = await db.run_sync(upsert_entries, rows)
+    await db.commit()
+
+    return {**counts, "ids": ids, "errors": errors}
+
+
+@app.post("/api/logs/ingest", response_model=StreamIngestResponse)
+async def ingest_logs_stream(
+    request: Request,
+    source: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Stream newline-delimited JSON log entries (one LogEntryCreate per line).
+    The body is consumed as it arrives and inserted in fixed-size chunks,
+    so uploads of any size are handled in constant memory. `source` is used
+    for lines that do not set one.
+    """
+    return await ingest_ndjson(db, request.stream(), default_source=source)
 
 
 @app.get("/api/logs", response_model=List[LogEntryResponse])
 async def get_logs(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     source: Optional[str] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    db: Session = Depends(get_db)
+    project: Optional[str] = None,
+    tag: Optional[List[str]] = Query(None),
+    tag_mode: Literal["all", "any"] = "all",
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """Get log entries with optional filtering"""
-    query = db.query(LogEntry)
+    """
+    Get log entries with optional filtering, newest first.
+    Repeat `tag` to filter by several tags; `tag_mode` selects whether
+    entries need all of them or any.
+    When a full page is returned, the X-Next-Cursor header holds a cursor
+    for the next page; pass it back as `cursor` (instead of `skip`) to page
+    at constant cost.
+    """
+    async def fetch_page():
+        query = apply_log_filters(select(LogEntry), source, start_date, end_date, project, tag, tag_mode)
+        query = query.order_by(desc(LogEntry.timestamp), desc(LogEntry.id))
+        
+        if cursor:
+            try:
+                query = query.filter(after_cursor(cursor))
+            except InvalidCursor as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        else:
+            query = query.offset(skip)
+        
+        entries = (await db.scalars(query.limit(limit))).all()
+        
+        next_cursor = None
+        if entries and len(entries) == limit:
+            next_cursor = encode_cursor(entries[-1].timestamp, entries[-1].id)
+        
+        return {
+            "entries": [LogEntryResponse.model_validate(entry).model_dump(mode="json") for entry in entries],
+            "next_cursor": next_cursor
+        }
     
-    if source:
-        query = query.filter(LogEntry.source == source)
+    page = await response_cache.aget_or_compute("logs", {
+        "skip": skip,
+        "limit": limit,
+        "cursor": cursor,
+        "source": source,
+        "start_date": start_date,
+        "end_date": end_date,
+        "project": project,
+        "tag": tag,
+        "tag_mode": tag_mode
+    }, fetch_page)
     
-    if start_date:
-        query = query.filter(LogEntry.timestamp >= start_date)
+    if page["next_cursor"]:
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
     
-    if end_date:
-        query = query.filter(LogEntry.timestamp <= end_date)
+    return page["entries"]
+
+
+@app.get("/api/logs/search", response_model=List[SearchResult])
+async def search_logs(
+    q: str,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Full-text search over entry text (raw_text, action, project), best
+    match first. Matches in `snippet` are wrapped in <mark></mark>.
+    """
+    async def run_search():
+        results = await db.run_sync(search.search, q, limit)
+        return [
+            {
+                "entry": LogEntryResponse.model_validate(result["entry"]).model_dump(mode="json"),
+                "rank": result["rank"],
+                "snippet": result["snippet"]
+            }
+            for result in results
+        ]
+    
+    return await response_cache.aget_or_compute("search", {"q": q, "limit": limit}, run_search)
+
+
+@app.get("/api/logs/export")
+async def export_logs(
+    format: str = "ndjson",
+    source: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    project: Optional[str] = None,
+    tag: Optional[List[str]] = Query(None),
+    tag_mode: Literal["all", "any"] = "all"
+):
+    """
+    Export log entries as NDJSON or CSV, oldest first.
+    Rows are streamed from a server-side cursor, so exports of any size run
+    in constant memory. Tag filters work as in GET /api/logs.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported format: {format} (expected one of {', '.join(EXPORT_FORMATS)})"
+        )
+    
+    statement = apply_log_filters(export_statement(), source, start_date, end_date, project, tag, tag_mode)
     
-    entries = query.order_by(desc(LogEntry.timestamp)).offset(skip).limit(limit).all()
-    return entries
+    return StreamingResponse(
+        iter_export(statement, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="loglify-export.{format}"'}
+    )
 
 
 @app.get("/api/logs/stats")
 async def get_stats(
     days: int = 7,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    """Get statistics for the last N days"""
-    start_date = datetime.utcnow() - timedelta(days=days)
-    
-    total_logs = db.query(func.count(LogEntry.id)).filter(
-        LogEntry.timestamp >= start_date
-    ).scalar()
-    
-    total_duration = db.query(func.sum(LogEntry.duration)).filter(
-        LogEntry.timestamp >= start_date,
-        LogEntry.duration.isnot(None)
-    ).scalar() or 0
-    
-    logs_by_source = db.query(
-        LogEntry.source,
-        func.count(LogEntry.id)
-    ).filter(
-        LogEntry.timestamp >= start_date
-    ).group_by(LogEntry.source).all()
-    
-    logs_by_action = db.query(
-        LogEntry.action,
-        func.count(LogEntry.id)
-    ).filter(
-        LogEntry.timestamp >= start_date
-    ).group_by(LogEntry.action).order_by(desc(func.count(LogEntry.id))).limit(10).all()
+    """
+    Get statistics for the last N days.
+    Read from the daily rollup, so the cost does not depend on the window
+    size; the window is the last N calendar days (UTC), today included.
+    """
+    return await response_cache.aget_or_compute(
+        "stats",
+        {"days": days, "today": datetime.utcnow().date()},
+        lambda: db.run_sync(rollup.get_stats, days)
+    )
+
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Response cache hit/miss counters"""
+    return response_cache.stats()
+
+
+@app.post("/api/query/context")
+async def query_context(request: QueryRequest, db: AsyncSession = Depends(get_async_read_db)):
+    """The entries /api/query would give the LLM for this question, best match first"""
+    return await entry_index.aretrieve(
+        db, request.query, settings.retrieval_top_k,
+        start_date=request.start_date, end_date=request.end_date
+    )
+
+
+async def answer_planned_query(request: QueryRequest, plan: dict, db: AsyncSession):
+    """Answer an aggregate question from one SQL aggregate instead of raw entries"""
+    global llm_parser
+    
+    # Explicit request dates take precedence over a period in the question
+    if request.start_date or request.end_date:
+        plan.update(start=request.start_date, end=request.end_date, period=None)
+    
+    result = await query_planner.run_plan(db, plan)
+    answer = query_planner.template_answer(plan, result)
+    
+    if settings.query_planner_llm_phrasing and result["entries"]:
+        if llm_parser is None:
+            llm_parser = LLMParser()
+        answer = await llm_parser.aphrase_answer(request.query, answer)
     
     return {
-        "total_logs": total_logs,
-        "total_duration_minutes": total_duration,
-        "total_duration_hours": round(total_duration / 60, 2),
-        "logs_by_source": {source: count for source, count in logs_by_source},
-        "top_actions": {action: count for action, count in logs_by_action}
+        "query": request.query,
+        "answer": answer,
+        "plan": {
+            **plan,
+            "start": plan["start"].isoformat() if plan["start"] else None,
+            "end": plan["end"].isoformat() if plan["end"] else None,
+        },
+        "result": result
     }
 
 
 @app.post("/api/query")
-async def query_logs(request: QueryRequest, db: Session = Depends(get_db)):
+async def query_logs(request: QueryRequest, db: AsyncSession = Depends(get_async_read_db)):
     """Query logs using natural language (requires LLM)"""
-    from llm_parser import LLMParser
-    
-    # Get relevant logs
-    query = db.query(LogEntry)
+    global llm_parser
     
-    if request.start_date:
-        query = query.filter(LogEntry.timestamp >= request.start_date)
+    if settings.query_planner_enabled:
+        plan = query_planner.plan_query(request.query, await query_planner.load_vocabulary(db))
+        if plan is not None:
+            return await answer_planned_query(request, plan, db)
     
-    if request.end_date:
-        query = query.filter(LogEntry.timestamp <= request.end_date)
+    # The entries most relevant to the question, across all history
+    logs_dict = await entry_index.aretrieve(
+        db, request.query, settings.retrieval_top_k,
+        start_date=request.start_date, end_date=request.end_date
+    )
     
-    logs = query.order_by(desc(LogEntry.timestamp)).limit(100).all()
+    if not logs_dict:
+        # Nothing matched the question's words: fall back to recent entries
+        query = apply_log_filters(select(LogEntry), start_date=request.start_date, end_date=request.end_date)
+        logs = (await db.scalars(query.order_by(desc(LogEntry.timestamp)).limit(settings.retrieval_top_k))).all()
+        logs_dict = [
+            {
+                "action": log.action,
+                "project": log.project,
+                "duration": log.duration,
+                "timestamp": log.timestamp.isoformat(),
+                "tags": log.tags
+            }
+            for log in logs
+        ]
     
-    # Convert to dict format for LLM
-    logs_dict = [
-        {
-            "action": log.action,
-            "project": log.project,
-            "duration": log.duration,
-            "timestamp": log.timestamp.isoformat(),
-            "tags": log.tags
-        }
-        for log in logs
-    ]
+    # Chronological order reads better in the prompt
+    logs_dict.sort(key=lambda log: log["timestamp"])
     
-    parser = LLMParser()
-    answer = parser.answer_query(request.query, logs_dict)
+    if llm_parser is None:
+        llm_parser = LLMParser()
+    answer = await llm_parser.aanswer_query(request.query, logs_dict)
     
     return {"query": request.query, "answer": answer}
 
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field, AliasChoices
+from typing import Optional, List, Any
 from datetime import datetime
 
 
@@ -11,6 +11,10 @@ class LogEntryCreate(BaseModel):
     duration: Optional[float] = None
     tags: Optional[List[str]] = None
     metadata: Optional[dict] = None
+    timestamp: Optional[datetime] = None  # defaults to the time of ingest
+    # Entries sent again with the same key update the first one instead of
+    # being added twice (derived for GitHub commits and PRs)
+    idempotency_key: Optional[str] = Field(default=None, max_length=200)
 
 
 class LogEntryResponse(BaseModel):
@@ -22,15 +26,65 @@ class LogEntryResponse(BaseModel):
     project: Optional[str]
     duration: Optional[float]
     tags: Optional[List[str]]
-    metadata: Optional[dict]
+    metadata: Optional[dict] = Field(
+        default=None,
+        validation_alias=AliasChoices("entry_metadata", "metadata")
+    )
     created_at: datetime
-    
+    idempotency_key: Optional[str] = None
+
     class Config:
         from_attributes = True
 
 
+class SearchResult(BaseModel):
+    entry: LogEntryResponse
+    rank: float
+    snippet: Optional[str]
+
+
+class BatchItemError(BaseModel):
+    index: int
+    error: Any
+
+
+class BatchIngestResponse(BaseModel):
+    inserted: int
+    # Entries whose idempotency key was already stored
+    updated: int = 0
+    unchanged: int = 0
+    ids: List[int]
+    errors: List[BatchItemError]
+
+
+class LineError(BaseModel):
+    line: int
+    error: Any
+
+
+class StreamIngestResponse(BaseModel):
+    accepted: int
+    rejected: int
+    errors: List[LineError]
+    errors_truncated: bool
+
+
+class JobStatus(BaseModel):
+    name: str
+    trigger: Optional[str] = None
+    running: bool
+    last_started: Optional[datetime] = None
+    last_duration: Optional[float] = None
+    last_status: Optional[str] = None
+    last_error: Optional[str] = None
+    next_run: Optional[datetime] = None
+    runs: int
+    failures: int
+    consecutive_failures: int
+    skipped: int
+
+
 class QueryRequest(BaseModel):
     query: str
     start_date: Optional[datetime] = None
     end_date: Optional[datetime] = None
-
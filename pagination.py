@@ -0,0 +1,45 @@
+"""
+Opaque keyset cursors for paging through log entries.
+
+A cursor encodes the (timestamp, id) of the last row of a page. The next
+page starts strictly after that row in (timestamp DESC, id DESC) order, so
+each page is an index range scan no matter how deep it is, and rows that
+share a timestamp are neither repeated nor skipped.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+
+from sqlalchemy import and_, or_
+
+from database import LogEntry
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(timestamp: datetime, entry_id: int) -> str:
+    """Encode the position of a row as an opaque cursor string"""
+    payload = json.dumps([timestamp.isoformat(), entry_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, entry_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(timestamp), int(entry_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+
+def after_cursor(cursor: str):
+    """Filter clause selecting rows that come after the cursor position"""
+    timestamp, entry_id = decode_cursor(cursor)
+    return or_(
+        LogEntry.timestamp < timestamp,
+        and_(LogEntry.timestamp == timestamp, LogEntry.id < entry_id)
+    )
@@ -0,0 +1,290 @@
+"""
+Planner that answers aggregate-style questions with SQL.
+
+Questions such as "hours on DV Website this month" or "how many commits
+last week" are recognized with patterns and the names of known projects,
+actions and tags, turned into a plan (metric, filters, period, grouping)
+and run as one GROUP BY / SUM query over log_entries. The answer is then
+a template over the small result (or phrased by the LLM), so the cost
+does not grow with history.
+
+A question is only planned when every meaningful word in it is
+understood; anything else goes through retrieval and the LLM as before.
+"""
+import calendar
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import desc, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import DailyRollup, DailyTagRollup, LogEntry, LogEntryTag, Tag
+from tags import tag_filter
+
+# Filler words that do not change what is being asked
+FILLER = {
+    "how", "many", "much", "what", "was", "were", "is", "are", "did", "do", "i", "my", "me",
+    "on", "in", "for", "the", "a", "an", "of", "at", "to", "with", "total", "spend", "spent",
+    "log", "logged", "entries", "entry", "activities", "activity", "times", "number", "count",
+    "work", "worked", "working", "have", "had", "since", "during", "overall", "all", "and",
+}
+DURATION_WORDS = {"hours", "hour", "minutes", "minute", "mins", "time", "long"}
+COUNT_RE = re.compile(r"\bhow many\b|\bnumber of\b|\bcount\b|\bhow often\b", re.IGNORECASE)
+DURATION_RE = re.compile(r"\bhours?\b|\bminutes?\b|\bmins\b|\bhow long\b|\bhow much time\b|\btime\b", re.IGNORECASE)
+GROUP_RE = re.compile(
+    r"\b(?:by|per|each|which|breakdown by)\s+(projects?|actions?|activities|activity|sources?|days?|tags?)\b",
+    re.IGNORECASE
+)
+GROUP_COLUMNS = {
+    "project": "project", "projects": "project",
+    "action": "action", "actions": "action", "activity": "action", "activities": "action",
+    "source": "source", "sources": "source",
+    "day": "day", "days": "day",
+    "tag": "tag", "tags": "tag",
+}
+# Built-in subjects that map to aggregator actions
+SUBJECTS = {
+    "commits": {"action": "GitHub Commit"},
+    "commit": {"action": "GitHub Commit"},
+    "pull requests": {"action_prefix": "GitHub PR"},
+    "prs": {"action_prefix": "GitHub PR"},
+}
+MONTHS = {name.lower(): index for index, name in enumerate(calendar.month_name) if name}
+WORD_RE = re.compile(r"[\w'-]+")
+
+
+def _remove(text: str, match) -> str:
+    return text[:match.start()] + " " + text[match.end():]
+
+
+def _names_pattern(names: Iterable[str]):
+    names = sorted({name for name in names if name}, key=len, reverse=True)
+    if not names:
+        return None
+    return re.compile(r"(?<!\w)(" + "|".join(re.escape(name) for name in names) + r")(?!\w)", re.IGNORECASE)
+
+
+def resolve_period(text: str, now: datetime) -> Tuple[Optional[datetime], Optional[datetime], Optional[str], str]:
+    """(start, end, label, remaining text) for the first period phrase; end is exclusive"""
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    week = today - timedelta(days=today.weekday())
+    month = today.replace(day=1)
+    previous_month = (month - timedelta(days=1)).replace(day=1)
+
+    fixed = [
+        (r"\btoday\b", today, None, "today"),
+        (r"\byesterday\b", today - timedelta(days=1), today, "yesterday"),
+        (r"\bthis week\b", week, None, "this week"),
+        (r"\blast week\b", week - timedelta(days=7), week, "last week"),
+        (r"\bthis month\b", month, None, "this month"),
+        (r"\blast month\b", previous_month, month, "last month"),
+        (r"\bthis year\b", today.replace(month=1, day=1), None, "this year"),
+        (r"\blast year\b", today.replace(year=today.year - 1, month=1, day=1), today.replace(month=1, day=1), "last year"),
+    ]
+    for pattern, start, end, label in fixed:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            return start, end, label, _remove(text, match)
+
+    match = re.search(r"\b(?:last|past)\s+(\d+)\s+(days?|weeks?|months?)\b", text, re.IGNORECASE)
+    if match:
+        count, unit = int(match.group(1)), match.group(2).lower()
+        days = count * {"d": 1, "w": 7, "m": 30}[unit[0]]
+        return now - timedelta(days=days), None, f"in the last {count} {unit}", _remove(text, match)
+
+    match = re.search(
+        r"\b(?:in\s+)?(" + "|".join(MONTHS) + r")(?:\s+(\d{4}))?\b", text, re.IGNORECASE
+    )
+    if match:
+        month_number = MONTHS[match.group(1).lower()]
+        year = int(match.group(2)) if match.group(2) else (
+            now.year if month_number <= now.month else now.year - 1
+        )
+        start = datetime(year, month_number, 1)
+        end = (start + timedelta(days=32)).replace(day=1)
+        return start, end, f"in {calendar.month_name[month_number]} {year}", _remove(text, match)
+
+    return None, None, None, text
+
+
+def plan_query(question: str, vocabulary: Dict[str, List[str]], now: datetime = None) -> Optional[Dict[str, Any]]:
+    """
+    Plan an aggregate question, or return None if it is not one (or has
+    words the planner does not understand).
+    """
+    now = now or datetime.utcnow()
+    text = question.strip().rstrip("?!.")
+
+    counting = bool(COUNT_RE.search(text))
+    timing = bool(DURATION_RE.search(text))
+    if not counting and not timing:
+        return None
+
+    start, end, period, text = resolve_period(text, now)
+
+    group_by = None
+    match = GROUP_RE.search(text)
+    if match:
+        group_by = GROUP_COLUMNS[match.group(1).lower()]
+        text = _remove(text, match)
+
+    filters: Dict[str, str] = {}
+    for subject, subject_filters in SUBJECTS.items():
+        match = re.search(rf"\b{re.escape(subject)}\b", text, re.IGNORECASE)
+        if match:
+            filters.update(subject_filters)
+            text = _remove(text, match)
+            break
+
+    for key in ("project", "action", "tag"):
+        if key in filters or "action_prefix" in filters and key == "action":
+            continue
+        names = {name.lower(): name for name in vocabulary.get(key, [])}
+        pattern = _names_pattern(names)
+        match = pattern.search(text) if pattern else None
+        if match:
+            filters[key] = names[match.group(1).lower()]
+            text = _remove(text, match)
+        elif key == "tag":
+            match = re.search(r"#([\w-]+)", text)
+            if match:
+                filters["tag"] = match.group(1).lower()
+                text = _remove(text, match)
+
+    unexplained = [
+        word for word in WORD_RE.findall(text.lower())
+        if word not in FILLER and word not in DURATION_WORDS
+    ]
+    if unexplained:
+        return None
+
+    return {
+        "metric": "count" if counting and not timing else "duration",
+        "group_by": group_by,
+        "filters": filters,
+        "start": start,
+        "end": end,
+        "period": period,
+    }
+
+
+async def load_vocabulary(db: AsyncSession, limit: int = 1000) -> Dict[str, List[str]]:
+    """Known project, action and tag names, most used first (from the rollups)"""
+    vocabulary = {}
+    for key, column, weight in (
+        ("project", DailyRollup.project, DailyRollup.entry_count),
+        ("action", DailyRollup.action, DailyRollup.entry_count),
+        ("tag", DailyTagRollup.tag, DailyTagRollup.entry_count),
+    ):
+        vocabulary[key] = list((await db.scalars(
+            select(column).where(column != "").group_by(column).order_by(desc(func.sum(weight))).limit(limit)
+        )).all())
+    return vocabulary
+
+
+async def run_plan(db: AsyncSession, plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Run the plan as one aggregate query; returns totals and per-group rows"""
+    filters = plan["filters"]
+    group_columns = {
+        "project": LogEntry.project,
+        "action": LogEntry.action,
+        "source": LogEntry.source,
+        "day": func.date(LogEntry.timestamp),
+    }
+
+    count = func.count(LogEntry.id)
+    minutes = func.coalesce(func.sum(LogEntry.duration), 0.0)
+    group_by = plan["group_by"]
+
+    if group_by == "tag":
+        group_column = Tag.name
+        statement = (
+            select(group_column, count, minutes)
+            .select_from(LogEntry)
+            .join(LogEntryTag, LogEntryTag.entry_id == LogEntry.id)
+            .join(Tag, Tag.id == LogEntryTag.tag_id)
+        )
+    elif group_by:
+        group_column = group_columns[group_by]
+        statement = select(group_column, count, minutes)
+    else:
+        group_column = None
+        statement = select(count, minutes)
+
+    def apply_filters(statement):
+        if "project" in filters:
+            statement = statement.where(func.lower(LogEntry.project) == filters["project"].lower())
+        if "action" in filters:
+            statement = statement.where(func.lower(LogEntry.action) == filters["action"].lower())
+        if "action_prefix" in filters:
+            statement = statement.where(LogEntry.action.startswith(filters["action_prefix"]))
+        if "tag" in filters:
+            statement = statement.where(tag_filter([filters["tag"]]))
+        if plan["start"]:
+            statement = statement.where(LogEntry.timestamp >= plan["start"])
+        if plan["end"]:
+            statement = statement.where(LogEntry.timestamp < plan["end"])
+        return statement
+
+    statement = apply_filters(statement)
+    if group_column is None:
+        entries, total_minutes = (await db.execute(statement)).one()
+        return {"entries": entries, "minutes": float(total_minutes), "groups": []}
+
+    order = minutes if plan["metric"] == "duration" else count
+    rows = (await db.execute(
+        statement.group_by(group_column).order_by(group_column if group_by == "day" else desc(order))
+    )).all()
+    groups = [
+        {"key": str(key) if key is not None else None, "entries": entries, "minutes": float(total_minutes)}
+        for key, entries, total_minutes in rows
+    ]
+    if group_by == "tag":
+        # Entries with several tags are in several groups and untagged ones in none
+        entries, total_minutes = (await db.execute(apply_filters(select(count, minutes)))).one()
+        return {"entries": entries, "minutes": float(total_minutes), "groups": groups}
+    return {
+        "entries": sum(group["entries"] for group in groups),
+        "minutes": sum(group["minutes"] for group in groups),
+        "groups": groups,
+    }
+
+
+def _subject(filters: Dict[str, str]) -> str:
+    parts = []
+    if "action" in filters:
+        parts.append(filters["action"])
+    if "action_prefix" in filters:
+        parts.append(f"{filters['action_prefix']}s")
+    if "project" in filters:
+        parts.append(f"on {filters['project']}" if parts else filters["project"])
+    if "tag" in filters:
+        parts.append(f"tagged #{filters['tag']}" if parts else f"#{filters['tag']}")
+    return " ".join(parts) or "All activities"
+
+
+def _amount(plan: Dict[str, Any], entries: int, minutes: float) -> str:
+    if plan["metric"] == "count":
+        return f"{entries} {'entry' if entries == 1 else 'entries'}"
+    return f"{round(minutes / 60, 1)} hours ({entries} {'entry' if entries == 1 else 'entries'})"
+
+
+def template_answer(plan: Dict[str, Any], result: Dict[str, Any], max_groups: int = 10) -> str:
+    """Plain-text answer for a plan's result"""
+    period = f" {plan['period']}" if plan["period"] else ""
+    subject = _subject(plan["filters"])
+
+    if not result["entries"]:
+        return f"No matching entries{period}."
+
+    answer = f"{subject}{period}: {_amount(plan, result['entries'], result['minutes'])}"
+    if not plan["group_by"]:
+        return answer + "."
+
+    lines = [answer, f"By {plan['group_by']}:"]
+    for group in result["groups"][:max_groups]:
+        lines.append(f"• {group['key'] or '(none)'}: {_amount(plan, group['entries'], group['minutes'])}")
+    if len(result["groups"]) > max_groups:
+        lines.append(f"• … and {len(result['groups']) - max_groups} more")
+    return "\n".join(lines)
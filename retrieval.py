@@ -0,0 +1,284 @@
+"""
+Relevance-ranked retrieval of log entries for natural language questions.
+
+Entries are embedded into vectors and kept in an in-process index; a
+question is embedded the same way and the closest entries (cosine
+similarity, brute force with NumPy) are returned from the whole history.
+
+The embedder is pluggable (settings.retrieval_embedder). The default
+HashingEmbedder is offline and deterministic: words, word pairs and the
+entry's month/weekday are hashed into a fixed number of dimensions, so
+questions like "how much did I exercise in March?" match on both the
+activity and the period.
+
+The index is filled lazily and then updated incrementally: before each
+search it embeds entries with ids above the last indexed id, and drops
+and re-embeds entries listed in log_entry_changes since the last call
+(updates and deletes committed by any process through upsert_entries or
+a Session). Bulk statements elsewhere are picked up by rebuild().
+"""
+import asyncio
+import importlib
+import re
+import zlib
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import LogEntry, LogEntryChange, SessionLocal
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Question words that would otherwise match unrelated entries
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "to", "for", "on", "in", "at", "of", "with", "by",
+    "i", "me", "my", "did", "do", "does", "was", "were", "is", "are", "be", "been",
+    "how", "much", "many", "what", "when", "which", "who", "where", "long", "time",
+    "spend", "spent", "have", "had", "this", "that", "last", "any",
+}
+
+
+def entry_text(action: Optional[str], project: Optional[str], tags: Optional[Sequence[str]],
+               raw_text: Optional[str], timestamp: Optional[datetime]) -> str:
+    """Text that represents an entry for embedding"""
+    parts = [action or "", project or "", " ".join(tags or [])]
+    if raw_text and raw_text != action:
+        parts.append(raw_text)
+    if timestamp:
+        parts.append(timestamp.strftime("%B %Y %A"))
+    return " ".join(part for part in parts if part)
+
+
+class HashingEmbedder:
+    """
+    Offline feature-hashing embedder: unigrams and bigrams are hashed
+    (crc32, stable across processes) into `dim` signed buckets with
+    sublinear term frequency, then L2-normalized.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _tokens(self, text: str) -> List[str]:
+        words = [word for word in TOKEN_RE.findall(text.lower()) if word not in STOPWORDS]
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts: Dict[int, float] = {}
+            for token in self._tokens(text):
+                hashed = zlib.crc32(token.encode())
+                bucket = hashed % self.dim
+                sign = 1.0 if hashed & 0x80000000 else -1.0
+                counts[bucket] = counts.get(bucket, 0.0) + sign
+            for bucket, value in counts.items():
+                vectors[row, bucket] = np.sign(value) * (1.0 + np.log(abs(value))) if value else 0.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+def load_embedder(spec: str):
+    """
+    "hashing" for the built-in embedder, or "module:factory" for any
+    callable returning an object with `dim` and `embed(texts) -> ndarray`
+    (rows L2-normalized).
+    """
+    if spec == "hashing":
+        return HashingEmbedder(settings.retrieval_dim)
+    module_name, _, attr = spec.partition(":")
+    factory: Callable = getattr(importlib.import_module(module_name), attr)
+    return factory()
+
+
+class VectorIndex:
+    """Append-only matrix of entry vectors with ids and timestamps for filtering"""
+
+    def __init__(self, embedder, chunk_size: int = 1000):
+        self.embedder = embedder
+        self.chunk_size = chunk_size
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.timestamps = np.zeros(0, dtype="datetime64[s]")
+        self.vectors = np.zeros((0, embedder.dim), dtype=np.float32)
+        self.size = 0
+        self.last_id = 0
+        # Last log_entry_changes row applied
+        self.last_change = 0
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop = None
+
+    def _reserve(self, extra: int):
+        capacity = len(self.ids)
+        if self.size + extra <= capacity:
+            return
+        capacity = max(self.size + extra, capacity * 2, 1024)
+        self.ids = np.resize(self.ids, capacity)
+        self.timestamps = np.resize(self.timestamps, capacity)
+        vectors = np.zeros((capacity, self.embedder.dim), dtype=np.float32)
+        vectors[:self.size] = self.vectors[:self.size]
+        self.vectors = vectors
+
+    def add(self, rows: Iterable[Tuple[int, Optional[datetime], str]]):
+        """Embed and append (id, timestamp, text) rows"""
+        rows = list(rows)
+        if not rows:
+            return
+        self._reserve(len(rows))
+        end = self.size + len(rows)
+        self.ids[self.size:end] = [row[0] for row in rows]
+        self.timestamps[self.size:end] = [
+            np.datetime64(row[1].replace(tzinfo=None), "s") if row[1] else np.datetime64("NaT")
+            for row in rows
+        ]
+        self.vectors[self.size:end] = self.embedder.embed([row[2] for row in rows])
+        self.size = end
+        self.last_id = max(self.last_id, max(row[0] for row in rows))
+
+    def remove(self, entry_ids: Iterable[int]):
+        """Drop the vectors of these entries"""
+        keep = np.flatnonzero(~np.isin(self.ids[:self.size], list(entry_ids)))
+        if len(keep) == self.size:
+            return
+        self.ids[:len(keep)] = self.ids[keep]
+        self.timestamps[:len(keep)] = self.timestamps[keep]
+        self.vectors[:len(keep)] = self.vectors[keep]
+        self.size = len(keep)
+
+    def _index_rows(self, db: Session, condition):
+        result = db.execute(
+            select(LogEntry.id, LogEntry.timestamp, LogEntry.action, LogEntry.project,
+                   LogEntry.tags, LogEntry.raw_text)
+            .where(condition)
+            .order_by(LogEntry.id)
+            .execution_options(yield_per=self.chunk_size)
+        )
+        for partition in result.partitions():
+            self.add(
+                (row.id, row.timestamp, entry_text(row.action, row.project, row.tags, row.raw_text, row.timestamp))
+                for row in partition
+            )
+
+    def _apply_changes(self, db: Session):
+        """Drop and re-embed entries updated or deleted since the last call"""
+        first = db.scalar(select(func.min(LogEntryChange.seq)))
+        if first is not None and first > self.last_change + 1:
+            # Changes this index has not seen were pruned; start over
+            self.clear()
+            return
+        changes = db.execute(
+            select(LogEntryChange.seq, LogEntryChange.entry_id)
+            .where(LogEntryChange.seq > self.last_change)
+            .order_by(LogEntryChange.seq)
+        ).all()
+        if not changes:
+            return
+        self.last_change = changes[-1].seq
+        # Entries above last_id are not indexed yet and are read fresh anyway
+        stale = sorted({change.entry_id for change in changes if change.entry_id <= self.last_id})
+        self.remove(stale)
+        for start in range(0, len(stale), 500):
+            self._index_rows(db, LogEntry.id.in_(stale[start:start + 500]))
+
+    def catch_up(self, db: Session):
+        """Index entries added since the last call and re-embed changed ones"""
+        max_id = db.scalar(select(func.max(LogEntry.id))) or 0
+        if max_id < self.last_id:
+            # The table was emptied or recreated; ids no longer line up
+            self.clear()
+        if self.last_id:
+            self._apply_changes(db)
+        if not self.last_id:
+            # Every entry is read below, so earlier changes are already reflected
+            self.last_change = db.scalar(select(func.max(LogEntryChange.seq))) or 0
+        if max_id > self.last_id:
+            self._index_rows(db, LogEntry.id > self.last_id)
+
+    def clear(self):
+        self.size = 0
+        self.last_id = 0
+        self.last_change = 0
+
+    def rebuild(self, db: Session):
+        self.clear()
+        self.catch_up(db)
+
+    def search(self, query: str, k: int, start_date: Optional[datetime] = None,
+               end_date: Optional[datetime] = None) -> List[Tuple[int, float]]:
+        """(entry_id, score) of the k best matches, best first"""
+        if not self.size or k <= 0:
+            return []
+        scores = self.vectors[:self.size] @ self.embedder.embed([query])[0]
+
+        if start_date or end_date:
+            timestamps = self.timestamps[:self.size]
+            mask = np.ones(self.size, dtype=bool)
+            if start_date:
+                mask &= timestamps >= np.datetime64(start_date.replace(tzinfo=None), "s")
+            if end_date:
+                mask &= timestamps <= np.datetime64(end_date.replace(tzinfo=None), "s")
+            scores = np.where(mask, scores, -np.inf)
+
+        k = min(k, self.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(self.ids[i]), float(scores[i])) for i in top if np.isfinite(scores[i]) and scores[i] > 0]
+
+    def _catch_up_in_new_session(self):
+        db = SessionLocal()
+        try:
+            self.catch_up(db)
+        finally:
+            db.close()
+
+    async def acatch_up(self):
+        """
+        catch_up on a worker thread with its own session, so embedding a
+        large backlog does not block the event loop; one catch-up at a time.
+        """
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        async with self._lock:
+            await asyncio.to_thread(self._catch_up_in_new_session)
+
+    async def aretrieve(self, db, query: str, k: int, start_date: Optional[datetime] = None,
+                        end_date: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        Catch up on new entries, search, and load the matching entries
+        (best match first) through the async session as dicts with a `score`.
+        """
+        await self.acatch_up()
+
+        matches = self.search(query, k, start_date, end_date)
+        if not matches:
+            return []
+
+        entries = {
+            entry.id: entry
+            for entry in (await db.scalars(select(LogEntry).where(LogEntry.id.in_([i for i, _ in matches])))).all()
+        }
+        # Entries deleted since they were indexed are skipped
+        return [
+            {
+                "action": entries[entry_id].action,
+                "project": entries[entry_id].project,
+                "duration": entries[entry_id].duration,
+                "timestamp": entries[entry_id].timestamp.isoformat(),
+                "tags": entries[entry_id].tags,
+                "score": round(score, 4),
+            }
+            for entry_id, score in matches
+            if entry_id in entries
+        ]
+
+
+entry_index = VectorIndex(load_embedder(settings.retrieval_embedder))
+
@@ -1,12 +1,56 @@
+"""
+AI reviews of a day, week or month.
+
+Each day's review is stored in review_summaries with a hash of the
+entries it was generated from, so a day is only sent to the LLM again
+when its entries change. Weekly and monthly reviews are generated from
+the stored daily summaries rather than from raw entries.
+
+    python review.py                                  # today's review
+    python review.py week|month [YYYY-MM-DD]          # review of the week/month containing the date
+    python review.py backfill START END [CONCURRENCY] # store missing daily summaries
+"""
 import asyncio
-from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from database import get_db, LogEntry
-from llm_parser import LLMParser
+import hashlib
+import json
+import sys
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal, LogEntry, ReviewSummary, dispose_engines
+from llm_parser import LLMParser, async_clients
 from config import settings
+from context_builder import build_context, count_tokens
 import httpx
 from telegram import Bot
 
+# Bump whenever a review prompt changes, so stored summaries are regenerated
+REVIEW_PROMPT_VERSION = "1"
+
+REVIEW_SYSTEM_PROMPT = "You are a helpful assistant that provides daily life log reviews. Be encouraging and insightful."
+
+# Daily summaries longer than this (in total) are cut to their first paragraph
+PERIOD_CONTEXT_MAX_TOKENS = 6000
+
+
+def period_bounds(period: str, day: date) -> Tuple[date, date]:
+    """First day and the day after the last day of the day/week/month containing day"""
+    if period == "day":
+        return day, day + timedelta(days=1)
+    if period == "week":
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=7)
+    if period == "month":
+        start = day.replace(day=1)
+        return start, (start + timedelta(days=32)).replace(day=1)
+    raise ValueError(f"Unknown review period: {period}")
+
+
+def content_hash(parts) -> str:
+    raw = json.dumps([settings.openai_model, REVIEW_PROMPT_VERSION, parts], default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
 
 class DailyReview:
     def __init__(self):
@@ -15,43 +59,72 @@ class DailyReview:
         if settings.telegram_token:
             self.bot = Bot(token=settings.telegram_token)
     
-    async def generate_review(self, db: Session) -> str:
-        """Generate daily review using AI"""
-        # Get today's logs
-        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_end = datetime.utcnow()
-        
-        logs = db.query(LogEntry).filter(
-            LogEntry.timestamp >= today_start,
-            LogEntry.timestamp <= today_end
-        ).order_by(LogEntry.timestamp).all()
+    async def _complete(self, prompt: str) -> str:
+        review = await self.parser.acomplete(
+            messages=[
+                {"role": "system", "content": REVIEW_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.7,
+            max_tokens=500
+        )
+        return review.choices[0].message.content.strip()
+    
+    async def _store(self, db: AsyncSession, period: str, start: date, digest: str, summary: str,
+                     entry_count: int, duration_sum: float) -> ReviewSummary:
+        await db.merge(ReviewSummary(
+            period=period,
+            start=start,
+            content_hash=digest,
+            summary=summary,
+            entry_count=entry_count,
+            duration_sum=duration_sum,
+            created_at=datetime.utcnow()
+        ))
+        await db.commit()
+        return await db.get(ReviewSummary, (period, start))
+    
+    async def summarize_day(self, db: AsyncSession, day: date) -> Optional[ReviewSummary]:
+        """
+        Stored review of a day (UTC), regenerated only when the day's entries
+        changed since it was stored. None if nothing was logged that day.
+        """
+        start = datetime.combine(day, datetime.min.time())
+        logs = (await db.scalars(
+            select(LogEntry).filter(
+                LogEntry.timestamp >= start,
+                LogEntry.timestamp < start + timedelta(days=1)
+            ).order_by(LogEntry.timestamp, LogEntry.id)
+        )).all()
         
         if not logs:
-            return "📝 No activities logged today."
-        
-        # Format logs for AI
-        logs_summary = []
-        total_duration = 0
+            # Entries of a summarized day may have been deleted since
+            stored = await db.get(ReviewSummary, ("day", day))
+            if stored is not None:
+                await db.delete(stored)
+                await db.commit()
+            return None
         
-        for log in logs:
-            entry = {
-                "time": log.timestamp.strftime("%H:%M"),
+        entries = [
+            {
                 "action": log.action,
                 "project": log.project,
                 "duration": log.duration,
+                "timestamp": log.timestamp,
                 "tags": log.tags
             }
-            logs_summary.append(entry)
-            if log.duration:
-                total_duration += log.duration
+            for log in logs
+        ]
+        digest = content_hash([[log.id] + list(entry.values()) for log, entry in zip(logs, entries)])
+        
+        stored = await db.get(ReviewSummary, ("day", day))
+        if stored is not None and stored.content_hash == digest:
+            return stored
         
-        # Create prompt for AI review
-        logs_text = "\n".join([
-            f"{log['time']}: {log['action']}"
-            + (f" ({log['duration']} min)" if log.get('duration') else "")
-            + (f" - {log['project']}" if log.get('project') else "")
-            for log in logs_summary
-        ])
+        total_duration = sum(log.duration or 0 for log in logs)
+        
+        # Repeats collapsed and trimmed to LLM_CONTEXT_MAX_TOKENS
+        logs_text = build_context(entries, label="Review context", show_day=False)
         
         prompt = f"""Analyze the following daily activity log and provide:
 1. A brief summary of the day
@@ -66,20 +139,95 @@ Total logged time: {round(total_duration / 60, 1)} hours
 
 Provide a friendly, concise review (2-3 paragraphs)."""
         
-        review = self.parser.client.chat.completions.create(
-            model=settings.openai_model,
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that provides daily life log reviews. Be encouraging and insightful."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=500
+        summary = await self._complete(prompt)
+        return await self._store(db, "day", day, digest, summary, len(logs), total_duration)
+    
+    async def summarize_period(self, db: AsyncSession, period: str, day: date) -> Optional[ReviewSummary]:
+        """
+        Stored review of the week or month containing day, generated from
+        the daily summaries (missing or stale days are summarized first).
+        None if nothing was logged in the period.
+        """
+        start, end = period_bounds(period, day)
+        end = min(end, datetime.utcnow().date() + timedelta(days=1))
+        await self.backfill(start, end - timedelta(days=1))
+        
+        days = (await db.scalars(
+            select(ReviewSummary).filter(
+                ReviewSummary.period == "day",
+                ReviewSummary.start >= start,
+                ReviewSummary.start < end
+            ).order_by(ReviewSummary.start)
+        )).all()
+        
+        if not days:
+            return None
+        
+        digest = content_hash([[summary.start, summary.content_hash] for summary in days])
+        stored = await db.get(ReviewSummary, (period, start))
+        if stored is not None and stored.content_hash == digest:
+            return stored
+        
+        entry_count = sum(summary.entry_count for summary in days)
+        total_duration = sum(summary.duration_sum for summary in days)
+        
+        summaries = [summary.summary for summary in days]
+        if count_tokens("\n\n".join(summaries)) > PERIOD_CONTEXT_MAX_TOKENS:
+            summaries = [summary.split("\n\n")[0] for summary in summaries]
+        days_text = "\n\n".join(
+            f"{summary.start.strftime('%A %Y-%m-%d')} ({summary.entry_count} entries, "
+            f"{round(summary.duration_sum / 60, 1)} hours):\n{text}"
+            for summary, text in zip(days, summaries)
         )
         
-        return review.choices[0].message.content.strip()
+        prompt = f"""Below are the daily reviews of one {period} of a personal activity log. Provide:
+1. A brief summary of the {period}
+2. Key highlights or achievements
+3. Trends and patterns across the days
+4. Suggestions for the next {period}
+
+Daily reviews:
+{days_text}
+
+Total: {entry_count} activities, {round(total_duration / 60, 1)} hours logged on {len(days)} days
+
+Provide a friendly, concise review (2-3 paragraphs)."""
+        
+        summary = await self._complete(prompt)
+        return await self._store(db, period, start, digest, summary, entry_count, total_duration)
+    
+    async def _backfill_day(self, day: date, semaphore: asyncio.Semaphore, counts: Dict[str, int]):
+        async with semaphore:
+            async with AsyncSessionLocal() as db:
+                try:
+                    stored = await self.summarize_day(db, day)
+                except Exception as e:
+                    print(f"Error summarizing {day}: {str(e)}")
+                    counts["failed"] += 1
+                    return
+        counts["summarized" if stored is not None else "empty"] += 1
+    
+    async def backfill(self, start: date, end: date, concurrency: int = None) -> Dict[str, int]:
+        """
+        Make sure every day from start to end (inclusive) has an up-to-date
+        stored summary; up to `concurrency` days are summarized at once.
+        """
+        semaphore = asyncio.Semaphore(concurrency or settings.review_backfill_concurrency)
+        counts = {"summarized": 0, "empty": 0, "failed": 0}
+        days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+        await asyncio.gather(*(self._backfill_day(day, semaphore, counts) for day in days))
+        return counts
+    
+    async def generate_review(self, db: AsyncSession, day: date = None) -> str:
+        """Generate daily review using AI (default: today)"""
+        summary = await self.summarize_day(db, day or datetime.utcnow().date())
+        if summary is None:
+            return "📝 No activities logged today."
+        return summary.summary
     
-    async def send_review(self, review_text: str):
+    async def send_review(self, review_text: str, title: str = None):
         """Send review to Telegram"""
+        title = title or f"📊 Daily Review - {datetime.utcnow().strftime('%Y-%m-%d')}"
         if not self.bot or not settings.telegram_chat_id:
             print("Telegram bot or chat ID not configured. Review:")
             print(review_text)
@@ -88,29 +236,54 @@ Provide a friendly, concise review (2-3 paragraphs)."""
         try:
             await self.bot.send_message(
                 chat_id=settings.telegram_chat_id,
-                text=f"📊 Daily Review - {datetime.utcnow().strftime('%Y-%m-%d')}\n\n{review_text}"
+                text=f"{title}\n\n{review_text}"
             )
-            print("✅ Daily review sent to Telegram")
+            print("✅ Review sent to Telegram")
         except Exception as e:
             print(f"Error sending review: {str(e)}")
     
-    async def run(self):
-        """Run daily review"""
-        from database import SessionLocal
-        
-        db = SessionLocal()
-        try:
-            review_text = await self.generate_review(db)
-            await self.send_review(review_text)
-        finally:
-            db.close()
+    async def run(self, day: date = None):
+        """Run the daily review of day (default today)"""
+        day = day or datetime.utcnow().date()
+        async with AsyncSessionLocal() as db:
+            review_text = await self.generate_review(db, day)
+        await self.send_review(review_text, f"📊 Daily Review - {day}")
+    
+    async def run_period(self, period: str, day: date = None):
+        """Run the weekly or monthly review of the period containing day (default today)"""
+        day = day or datetime.utcnow().date()
+        async with AsyncSessionLocal() as db:
+            summary = await self.summarize_period(db, period, day)
+        start, _ = period_bounds(period, day)
+        label = "Weekly" if period == "week" else "Monthly"
+        if summary is None:
+            await self.send_review(f"📝 No activities logged this {period}.", f"📊 {label} Review - {start}")
+        else:
+            await self.send_review(summary.summary, f"📊 {label} Review - {start}")
 
 
-async def main():
+async def main(args: List[str]):
     review = DailyReview()
-    await review.run()
+    try:
+        if not args:
+            await review.run()
+        elif args[0] in ("week", "month") and len(args) <= 2:
+            await review.run_period(args[0], date.fromisoformat(args[1]) if len(args) == 2 else None)
+        elif args[0] == "backfill" and len(args) in (3, 4):
+            counts = await review.backfill(
+                date.fromisoformat(args[1]),
+                date.fromisoformat(args[2]),
+                int(args[3]) if len(args) == 4 else None
+            )
+            print(f"✅ Backfill done: {counts['summarized']} days summarized, "
+                  f"{counts['empty']} without entries, {counts['failed']} failed")
+        else:
+            print(__doc__)
+            sys.exit(1)
+    finally:
+        await async_clients.aclose()
+        await dispose_engines()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
-
+    asyncio.run(main(sys.argv[1:]))
@@ -0,0 +1,308 @@
+"""
+Daily rollups of log entries.
+
+- daily_rollups: day x source x action x project
+- daily_tag_rollups: day x tag (tags normalized as in tags.normalize_tags)
+
+Both are kept in step with log_entries incrementally:
+- bulk inserts from ingest.insert_entries call apply_rows directly
+- inserts, updates and deletes of LogEntry objects through a Session are
+  picked up by a flush listener
+
+Bulk UPDATE/DELETE statements bypass both paths; run rebuild() (or
+`python rollup.py rebuild`) after changing log_entries that way.
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, desc, event, func, insert, inspect, select, update
+from sqlalchemy.orm import Session
+
+from database import (
+    DailyRollup, DailyTagRollup, LogEntry, LogEntryTag, SessionLocal, Tag,
+    mark_entries_changed, upsert_insert
+)
+import tags as tag_index
+
+rollup_table = DailyRollup.__table__
+tag_rollup_table = DailyTagRollup.__table__
+
+RollupKey = Tuple[date, str, str, str]
+
+# (rollup key, duration, sign, tags)
+Change = Tuple[RollupKey, Optional[float], int, Optional[Sequence[str]]]
+
+
+def _key(timestamp: Optional[datetime], source: Optional[str],
+         action: Optional[str], project: Optional[str]) -> RollupKey:
+    day = (timestamp or datetime.utcnow()).date()
+    return day, source or "", action or "", project or ""
+
+
+def _aggregate(changes: Iterable[Change]) -> Tuple[Dict[tuple, list], Dict[tuple, list]]:
+    """Sum changes into count/duration deltas per rollup key and per (day, tag)"""
+    deltas = defaultdict(lambda: [0, 0.0])
+    tag_deltas = defaultdict(lambda: [0, 0.0])
+    for key, duration, sign, tags in changes:
+        deltas[key][0] += sign
+        deltas[key][1] += sign * (duration or 0.0)
+        for tag in tag_index.normalize_tags(tags):
+            tag_deltas[(key[0], tag)][0] += sign
+            tag_deltas[(key[0], tag)][1] += sign * (duration or 0.0)
+
+    def nonzero(items):
+        return {key: delta for key, delta in items.items() if delta[0] or delta[1]}
+
+    return nonzero(deltas), nonzero(tag_deltas)
+
+
+def _apply_deltas(connection, table, deltas: Dict[tuple, list]):
+    """Add count and duration deltas to a rollup table, creating rows as needed"""
+    if not deltas:
+        return
+
+    key_columns = [c.name for c in table.primary_key]
+    values = [
+        {**dict(zip(key_columns, key)), "entry_count": count, "duration_sum": duration}
+        for key, (count, duration) in deltas.items()
+    ]
+
+    statement = upsert_insert(connection, table)
+    if statement is not None:
+        statement = statement.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={
+                "entry_count": table.c.entry_count + statement.excluded.entry_count,
+                "duration_sum": table.c.duration_sum + statement.excluded.duration_sum,
+            }
+        )
+        connection.execute(statement, values)
+    else:
+        for value in values:
+            match = [table.c[column] == value[column] for column in key_columns]
+            result = connection.execute(
+                update(table).where(*match).values(
+                    entry_count=table.c.entry_count + value["entry_count"],
+                    duration_sum=table.c.duration_sum + value["duration_sum"],
+                )
+            )
+            if result.rowcount == 0:
+                connection.execute(insert(table), value)
+
+    if any(count < 0 for count, _ in deltas.values()):
+        connection.execute(
+            delete(table).where(
+                table.c.entry_count <= 0,
+                table.c.day.in_({key[0] for key in deltas})
+            )
+        )
+
+
+def _apply_changes(connection, changes: List[Change]):
+    deltas, tag_deltas = _aggregate(changes)
+    _apply_deltas(connection, rollup_table, deltas)
+    _apply_deltas(connection, tag_rollup_table, tag_deltas)
+
+
+def apply_rows(db: Session, rows: Iterable[Dict[str, Any]], sign: int = 1):
+    """Add (or with sign=-1, remove) bulk-inserted rows to the rollups"""
+    _apply_changes(db.connection(), [
+        (_key(row.get("timestamp"), row.get("source"), row.get("action"), row.get("project")),
+         row.get("duration"), sign, row.get("tags"))
+        for row in rows
+    ])
+
+
+_TRACKED_ATTRS = ("timestamp", "source", "action", "project", "duration", "tags")
+
+
+def _old_values(obj: LogEntry) -> Dict[str, Any]:
+    state = inspect(obj)
+    values = {}
+    for attr in _TRACKED_ATTRS:
+        history = state.attrs[attr].history
+        if history.deleted:
+            values[attr] = history.deleted[0]
+        elif history.unchanged:
+            values[attr] = history.unchanged[0]
+        else:
+            values[attr] = getattr(obj, attr)
+    return values
+
+
+def _change(values: Dict[str, Any], sign: int) -> Change:
+    return (
+        _key(values["timestamp"], values["source"], values["action"], values["project"]),
+        values["duration"],
+        sign,
+        values["tags"]
+    )
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_changed_entries(session: Session, flush_context, instances):
+    """Record the old values of updated and deleted entries before they are written"""
+    changes = session.info.setdefault("rollup_changes", [])
+
+    for obj in session.deleted:
+        if isinstance(obj, LogEntry):
+            changes.append(_change(_old_values(obj), -1))
+
+    for obj in session.dirty:
+        if not isinstance(obj, LogEntry):
+            continue
+        state = inspect(obj)
+        if not any(state.attrs[attr].history.has_changes() for attr in _TRACKED_ATTRS):
+            continue
+        changes.append(_change(_old_values(obj), -1))
+        changes.append(_change({attr: getattr(obj, attr) for attr in _TRACKED_ATTRS}, 1))
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_flushed_entries(session: Session, flush_context):
+    """Apply the recorded changes plus new entries, whose defaults are now set"""
+    changes = session.info.pop("rollup_changes", [])
+
+    for obj in session.new:
+        if isinstance(obj, LogEntry):
+            changes.append(_change({attr: getattr(obj, attr) for attr in _TRACKED_ATTRS}, 1))
+
+    if changes:
+        mark_entries_changed(session)
+        _apply_changes(session.connection(), changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session: Session):
+    session.info.pop("rollup_changes", None)
+
+
+def rebuild(db: Session):
+    """Recompute the tag index and both rollups from log_entries"""
+    tag_index.rebuild_index(db)
+
+    day = func.date(LogEntry.timestamp)
+    source = func.coalesce(LogEntry.source, "")
+    action = func.coalesce(LogEntry.action, "")
+    project = func.coalesce(LogEntry.project, "")
+
+    aggregated = select(
+        day,
+        source,
+        action,
+        project,
+        func.count(LogEntry.id),
+        func.coalesce(func.sum(LogEntry.duration), 0.0),
+    ).group_by(day, source, action, project)
+
+    tag_aggregated = (
+        select(
+            day,
+            Tag.name,
+            func.count(LogEntry.id),
+            func.coalesce(func.sum(LogEntry.duration), 0.0),
+        )
+        .select_from(LogEntryTag)
+        .join(Tag, Tag.id == LogEntryTag.tag_id)
+        .join(LogEntry, LogEntry.id == LogEntryTag.entry_id)
+        .group_by(day, Tag.name)
+    )
+
+    db.execute(delete(rollup_table))
+    db.execute(
+        insert(rollup_table).from_select(
+            ["day", "source", "action", "project", "entry_count", "duration_sum"],
+            aggregated
+        )
+    )
+    db.execute(delete(tag_rollup_table))
+    db.execute(
+        insert(tag_rollup_table).from_select(
+            ["day", "tag", "entry_count", "duration_sum"],
+            tag_aggregated
+        )
+    )
+    mark_entries_changed(db)
+    db.commit()
+
+
+def ensure_rollup(db: Session):
+    """Build the tag index and rollups once for databases that predate them"""
+    has_rollup = db.execute(select(rollup_table.c.day).limit(1)).first()
+    has_entries = db.execute(select(LogEntry.id).limit(1)).first()
+    if has_entries and not has_rollup:
+        rebuild(db)
+        return
+
+    has_tag_index = db.execute(select(LogEntryTag.entry_id).limit(1)).first()
+    if not has_tag_index and tag_index.has_tagged_entries(db):
+        rebuild(db)
+
+
+def get_stats(db: Session, days: int, top: int = 10) -> Dict[str, Any]:
+    """Statistics for the last N calendar days (today included), read from the rollups"""
+    start_day = (datetime.utcnow() - timedelta(days=days - 1)).date()
+    in_window = DailyRollup.day >= start_day
+    total_count = func.sum(DailyRollup.entry_count)
+    total_duration = func.sum(DailyRollup.duration_sum)
+
+    total_logs, duration = db.execute(
+        select(func.coalesce(total_count, 0), func.coalesce(total_duration, 0.0)).where(in_window)
+    ).one()
+
+    by_source = db.execute(
+        select(DailyRollup.source, total_count)
+        .where(in_window)
+        .group_by(DailyRollup.source)
+    ).all()
+
+    by_action = db.execute(
+        select(DailyRollup.action, total_count)
+        .where(in_window)
+        .group_by(DailyRollup.action)
+        .order_by(desc(total_count))
+        .limit(top)
+    ).all()
+
+    by_project = db.execute(
+        select(DailyRollup.project, total_duration)
+        .where(in_window, DailyRollup.project != "")
+        .group_by(DailyRollup.project)
+        .order_by(desc(total_duration))
+        .limit(top)
+    ).all()
+
+    tag_duration = func.sum(DailyTagRollup.duration_sum)
+    by_tag = db.execute(
+        select(DailyTagRollup.tag, tag_duration)
+        .where(DailyTagRollup.day >= start_day)
+        .group_by(DailyTagRollup.tag)
+        .order_by(desc(tag_duration))
+        .limit(top)
+    ).all()
+
+    return {
+        "total_logs": total_logs,
+        "total_duration_minutes": duration,
+        "total_duration_hours": round(duration / 60, 2),
+        "logs_by_source": {source: count for source, count in by_source},
+        "top_actions": {action: count for action, count in by_action},
+        "top_projects_minutes": {project: minutes for project, minutes in by_project},
+        "top_tags_minutes": {tag: minutes for tag, minutes in by_tag},
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] != ["rebuild"]:
+        print("Usage: python rollup.py rebuild")
+        sys.exit(1)
+
+    db = SessionLocal()
+    try:
+        rebuild(db)
+        print("✅ Tag index and daily rollups rebuilt")
+    finally:
+        db.close()
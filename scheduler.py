@@ -1,49 +1,89 @@
 """
-Scheduler for running periodic tasks (daily review, GitHub sync, etc.)
+Scheduler for running periodic tasks (daily review, aggregator syncs, etc.)
+
+    python scheduler.py          # run the scheduler
+    python scheduler.py status   # last run, duration, next run and failures of each job
 """
-import schedule
-import time
 import asyncio
+import sys
+from contextlib import AsyncExitStack
 from datetime import datetime
 from config import settings
+from database import dispose_engines
 from review import DailyReview
-from aggregators.github import GitHubAggregator
+from llm_parser import async_clients
+from aggregators.base import Aggregator
+from aggregators.runtime import AggregatorRuntime, create_aggregators
+from jobs import CronTrigger, IntervalTrigger, JobScheduler, format_status, get_job_store
 
 
-def run_daily_review():
-    """Run daily review"""
-    print(f"[{datetime.now()}] Running daily review...")
-    review = DailyReview()
-    asyncio.run(review.run())
+def add_review_jobs(scheduler: JobScheduler, review: DailyReview):
+    """Daily, weekly (Sundays) and monthly (last day) reviews at REVIEW_TIME"""
+    hour, minute = (int(part) for part in settings.review_time.split(":"))
+    
+    async def daily(run_at: datetime):
+        await review.run(run_at.date())
+    
+    async def weekly(run_at: datetime):
+        await review.run_period("week", run_at.date())
+    
+    async def monthly(run_at: datetime):
+        await review.run_period("month", run_at.date())
+    
+    scheduler.add_job("daily_review", daily, CronTrigger(f"{minute} {hour} * * *"))
+    if settings.enable_weekly_review:
+        scheduler.add_job("weekly_review", weekly, CronTrigger(f"{minute} {hour} * * 0"))
+    if settings.enable_monthly_review:
+        scheduler.add_job("monthly_review", monthly, CronTrigger(f"{minute} {hour} L * *"))
 
 
-def run_github_sync():
-    """Run GitHub sync"""
-    print(f"[{datetime.now()}] Running GitHub sync...")
-    aggregator = GitHubAggregator()
-    asyncio.run(aggregator.sync(days=1))
+def add_sync_job(scheduler: JobScheduler, runtime: AggregatorRuntime, aggregator: Aggregator):
+    async def sync(run_at: datetime):
+        if not await runtime.run_once(aggregator):
+            raise RuntimeError(f"{aggregator.name} sync failed")
+    
+    scheduler.add_job(f"sync_{aggregator.name}", sync, IntervalTrigger(aggregator.interval_minutes))
 
 
-def start_scheduler():
-    """Start the scheduler"""
+async def run_scheduler():
+    """Run all jobs on this event loop until cancelled"""
+    scheduler = JobScheduler()
+    
     if settings.enable_daily_review:
-        # Schedule daily review
-        review_time = settings.review_time
-        schedule.every().day.at(review_time).do(run_daily_review)
-        print(f"📅 Daily review scheduled for {review_time}")
+        add_review_jobs(scheduler, DailyReview())
     
-    # Schedule GitHub sync (every 6 hours)
-    if settings.github_token:
-        schedule.every(6).hours.do(run_github_sync)
-        print("🔄 GitHub sync scheduled (every 6 hours)")
+    # Passive sources (GitHub every 6 hours by default), each on its own interval
+    runtime = AggregatorRuntime(create_aggregators())
+    aggregators = [aggregator for aggregator in runtime.aggregators if aggregator.configured()]
+    for aggregator in aggregators:
+        add_sync_job(scheduler, runtime, aggregator)
     
     print("⏰ Scheduler started")
     
-    while True:
-        schedule.run_pending()
-        time.sleep(60)  # Check every minute
+    try:
+        async with AsyncExitStack() as stack:
+            # Connection pools stay open across runs, like the database and OpenAI ones
+            for aggregator in aggregators:
+                await stack.enter_async_context(aggregator.session())
+            await scheduler.run()
+    finally:
+        await async_clients.aclose()
+        await dispose_engines()
 
 
-if __name__ == "__main__":
-    start_scheduler()
+def start_scheduler():
+    """Start the scheduler"""
+    try:
+        asyncio.run(run_scheduler())
+    except KeyboardInterrupt:
+        print("⏰ Scheduler stopped")
+
 
+if __name__ == "__main__":
+    if sys.argv[1:] == ["status"]:
+        print(format_status(get_job_store().all()))
+    elif sys.argv[1:]:
+        print(__doc__)
+        sys.exit(1)
+    else:
+        start_scheduler()
@@ -0,0 +1,203 @@
+"""
+Full-text search over log entries.
+
+The text of each entry (raw_text, action, project) is indexed with the
+native engine of the database in use:
+- SQLite: an FTS5 table using log_entries as external content, kept in
+  sync by triggers
+- PostgreSQL: a generated tsvector column with a GIN index
+
+Both follow every write without application code. The index is created
+with the log_entries table (or by ensure_index() on startup for older
+databases) and can be rebuilt with `python search.py rebuild`.
+"""
+import re
+from typing import Any, Dict, List
+
+from sqlalchemy import column, event, func, literal, literal_column, or_, select, table, text
+from sqlalchemy.orm import Session
+
+from database import LogEntry, SessionLocal
+
+FTS_TABLE = "log_entries_fts"
+PG_VECTOR_COLUMN = "search_vector"
+PG_INDEX = "ix_log_entries_search_vector"
+PG_CONFIG = "english"
+
+fts_table = table(FTS_TABLE, column("rowid"))
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+
+_SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "raw_text, action, project, "
+    "content='log_entries', content_rowid='id', tokenize='porter unicode61')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON log_entries BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, raw_text, action, project) "
+    "VALUES (new.id, new.raw_text, new.action, new.project); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON log_entries BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, raw_text, action, project) "
+    "VALUES ('delete', old.id, old.raw_text, old.action, old.project); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF raw_text, action, project ON log_entries BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, raw_text, action, project) "
+    "VALUES ('delete', old.id, old.raw_text, old.action, old.project); "
+    f"INSERT INTO {FTS_TABLE}(rowid, raw_text, action, project) "
+    "VALUES (new.id, new.raw_text, new.action, new.project); END",
+]
+
+_PG_DDL = [
+    f"ALTER TABLE log_entries ADD COLUMN IF NOT EXISTS {PG_VECTOR_COLUMN} tsvector "
+    f"GENERATED ALWAYS AS (to_tsvector('{PG_CONFIG}', "
+    "coalesce(raw_text, '') || ' ' || coalesce(action, '') || ' ' || coalesce(project, ''))) STORED",
+    f"CREATE INDEX IF NOT EXISTS {PG_INDEX} ON log_entries USING GIN ({PG_VECTOR_COLUMN})",
+]
+
+
+def _index_exists(connection) -> bool:
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        return connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE}
+        ).first() is not None
+    if dialect == "postgresql":
+        return connection.execute(
+            text("SELECT 1 FROM pg_indexes WHERE indexname = :name"),
+            {"name": PG_INDEX}
+        ).first() is not None
+    return True
+
+
+def create_index(connection):
+    """Create the search index for the connection's dialect (no-op elsewhere)"""
+    dialect = connection.dialect.name
+    statements = _SQLITE_DDL if dialect == "sqlite" else _PG_DDL if dialect == "postgresql" else []
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+def rebuild_index(connection):
+    """Re-index every entry from log_entries"""
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    elif dialect == "postgresql":
+        connection.execute(text(f"REINDEX INDEX {PG_INDEX}"))
+
+
+@event.listens_for(LogEntry.__table__, "after_create")
+def _create_with_table(target, connection, **kw):
+    create_index(connection)
+
+
+@event.listens_for(LogEntry.__table__, "before_drop")
+def _drop_with_table(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+
+
+def ensure_index(db: Session):
+    """Create and fill the search index once for databases that predate it"""
+    connection = db.connection()
+    if _index_exists(connection):
+        return
+    create_index(connection)
+    if connection.dialect.name == "sqlite":
+        # Postgres computes the generated column for existing rows itself
+        rebuild_index(connection)
+    db.commit()
+
+
+def _fts5_query(q: str) -> str:
+    """
+    Turn free text into an FTS5 query: every word must match, the last one
+    as a prefix. Words are quoted so FTS5 operators in the input are inert.
+    """
+    words = re.findall(r"\w+", q)
+    if not words:
+        return ""
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_statement(dialect: str, q: str, limit: int):
+    """
+    Select (LogEntry, rank, snippet) for entries matching q, best match
+    first. Higher rank is better. Returns None if q has no searchable words.
+    """
+    if dialect == "sqlite":
+        match = _fts5_query(q)
+        if not match:
+            return None
+        fts = literal_column(FTS_TABLE)
+        # bm25() is lower for better matches
+        rank = (-func.bm25(fts)).label("rank")
+        snippet = func.snippet(fts, -1, HIGHLIGHT_START, HIGHLIGHT_END, "…", 12)
+        return (
+            select(LogEntry, rank, snippet.label("snippet"))
+            .join(fts_table, fts_table.c.rowid == LogEntry.id)
+            .where(fts.op("MATCH")(match))
+            .order_by(rank.desc(), LogEntry.id.desc())
+            .limit(limit)
+        )
+
+    if dialect == "postgresql":
+        if not q.strip():
+            return None
+        config = literal_column(f"'{PG_CONFIG}'::regconfig")
+        vector = literal_column(f"log_entries.{PG_VECTOR_COLUMN}")
+        query = func.websearch_to_tsquery(config, q)
+        rank = func.ts_rank_cd(vector, query).label("rank")
+        document = func.concat_ws(" ", LogEntry.raw_text, LogEntry.action, LogEntry.project)
+        snippet = func.ts_headline(
+            config, document, query,
+            f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxWords=24, MinWords=8"
+        )
+        return (
+            select(LogEntry, rank, snippet.label("snippet"))
+            .where(vector.op("@@")(query))
+            .order_by(rank.desc(), LogEntry.id.desc())
+            .limit(limit)
+        )
+
+    # Other databases: unranked substring match
+    if not q.strip():
+        return None
+    pattern = f"%{q.strip()}%"
+    return (
+        select(LogEntry, literal(0.0).label("rank"), LogEntry.raw_text.label("snippet"))
+        .where(or_(LogEntry.raw_text.ilike(pattern), LogEntry.action.ilike(pattern)))
+        .order_by(LogEntry.timestamp.desc(), LogEntry.id.desc())
+        .limit(limit)
+    )
+
+
+def search(db: Session, q: str, limit: int = 20) -> List[Dict[str, Any]]:
+    """Run a search and return entries with their rank and highlighted snippet"""
+    statement = search_statement(db.get_bind().dialect.name, q, limit)
+    if statement is None:
+        return []
+    return [
+        {"entry": entry, "rank": float(rank or 0.0), "snippet": snippet}
+        for entry, rank, snippet in db.execute(statement).all()
+    ]
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] != ["rebuild"]:
+        print("Usage: python search.py rebuild")
+        sys.exit(1)
+
+    db = SessionLocal()
+    try:
+        connection = db.connection()
+        create_index(connection)
+        rebuild_index(connection)
+        db.commit()
+        print("✅ Search index rebuilt")
+    finally:
+        db.close()
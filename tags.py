@@ -0,0 +1,153 @@
+"""
+Normalized tag index.
+
+LogEntry.tags stays the source of truth (a JSON list), but every tag is
+also interned in `tags` and linked to its entries through
+`log_entry_tags`, so tag filters run as index lookups instead of scans
+with JSON parsing. The index is kept in sync by ingest.insert_entries and
+by a flush listener for ORM writes; rebuild_index() recreates it (the
+daily tag rollup is rebuilt with it by `python rollup.py rebuild`).
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import String, and_, cast, delete, event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from database import LogEntry, LogEntryTag, SessionLocal, Tag, upsert_insert
+
+tag_table = Tag.__table__
+entry_tag_table = LogEntryTag.__table__
+
+
+def normalize_tags(tags: Optional[Iterable[str]]) -> List[str]:
+    """Lowercase, strip a leading '#', drop blanks and duplicates (order kept)"""
+    seen = []
+    for tag in tags or []:
+        if not isinstance(tag, str):
+            continue
+        name = tag.strip().lstrip("#").strip().lower()
+        if name and name not in seen:
+            seen.append(name)
+    return seen
+
+
+def intern_tags(connection, names: Iterable[str]) -> Dict[str, int]:
+    """Return ids for the given tag names, creating missing tags"""
+    names = sorted(set(names))
+    if not names:
+        return {}
+
+    ids = dict(connection.execute(
+        select(tag_table.c.name, tag_table.c.id).where(tag_table.c.name.in_(names))
+    ).all())
+
+    missing = [name for name in names if name not in ids]
+    if missing:
+        statement = upsert_insert(connection, tag_table)
+        if statement is not None:
+            connection.execute(
+                statement.on_conflict_do_nothing(index_elements=["name"]),
+                [{"name": name} for name in missing]
+            )
+        else:
+            for name in missing:
+                connection.execute(tag_table.insert(), {"name": name})
+        ids.update(connection.execute(
+            select(tag_table.c.name, tag_table.c.id).where(tag_table.c.name.in_(missing))
+        ).all())
+
+    return ids
+
+
+def index_entries(connection, entries: Iterable[Tuple[int, Optional[Sequence[str]]]]):
+    """Link (entry_id, tags) pairs to their interned tags"""
+    normalized = [(entry_id, normalize_tags(tags)) for entry_id, tags in entries]
+    normalized = [(entry_id, names) for entry_id, names in normalized if names]
+    if not normalized:
+        return
+
+    ids = intern_tags(connection, (name for _, names in normalized for name in names))
+    connection.execute(entry_tag_table.insert(), [
+        {"entry_id": entry_id, "tag_id": ids[name]}
+        for entry_id, names in normalized
+        for name in names
+    ])
+
+
+def unindex_entries(connection, entry_ids: Iterable[int]):
+    entry_ids = list(entry_ids)
+    if entry_ids:
+        connection.execute(delete(entry_tag_table).where(entry_tag_table.c.entry_id.in_(entry_ids)))
+
+
+def tag_filter(tags: Sequence[str], mode: str = "all"):
+    """
+    Clause matching entries tagged with all (mode="all") or any
+    (mode="any") of the given tags, resolved through the tag index.
+    """
+    names = normalize_tags(tags)
+    matching = (
+        select(LogEntryTag.entry_id)
+        .join(Tag, Tag.id == LogEntryTag.tag_id)
+        .where(Tag.name.in_(names))
+    )
+    if mode == "all" and len(names) > 1:
+        matching = matching.group_by(LogEntryTag.entry_id).having(func.count() == len(names))
+    return LogEntry.id.in_(matching)
+
+
+@event.listens_for(Session, "after_flush")
+def _index_flushed_entries(session: Session, flush_context):
+    """Keep the tag index in step with LogEntry objects flushed through the ORM"""
+    stale = []
+    fresh = []
+
+    for obj in session.deleted:
+        if isinstance(obj, LogEntry):
+            stale.append(inspect(obj).identity[0])
+
+    for obj in session.dirty:
+        if isinstance(obj, LogEntry) and inspect(obj).attrs.tags.history.has_changes():
+            stale.append(obj.id)
+            fresh.append((obj.id, obj.tags))
+
+    for obj in session.new:
+        if isinstance(obj, LogEntry):
+            fresh.append((obj.id, obj.tags))
+
+    if stale or fresh:
+        connection = session.connection()
+        unindex_entries(connection, stale)
+        index_entries(connection, fresh)
+
+
+def has_tagged_entries(db: Session) -> bool:
+    """Whether any entry carries a non-empty tag list"""
+    tags_text = cast(LogEntry.tags, String)
+    return db.execute(
+        select(LogEntry.id).where(and_(
+            LogEntry.tags.isnot(None),
+            tags_text.notin_(["null", "[]"])
+        )).limit(1)
+    ).first() is not None
+
+
+def rebuild_index(db: Session, chunk_size: int = 1000):
+    """Recreate log_entry_tags from LogEntry.tags; the caller commits"""
+    db.execute(delete(entry_tag_table))
+    result = db.execute(
+        select(LogEntry.id, LogEntry.tags).execution_options(yield_per=chunk_size)
+    )
+    connection = db.connection()
+    for partition in result.partitions():
+        index_entries(connection, partition)
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        rebuild_index(db)
+        db.commit()
+        print("✅ Tag index rebuilt")
+    finally:
+        db.close()
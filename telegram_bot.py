@@ -1,9 +1,9 @@
 import asyncio
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from sqlalchemy.orm import Session
-from database import get_db, LogEntry
-from llm_parser import LLMParser
+from database import SessionLocal
+from fast_parser import HybridParser
+from llm_parser import BatchingParser, LLMParser, async_clients
 from models import LogEntryCreate
 from config import settings
 from datetime import datetime
@@ -12,7 +12,15 @@ import httpx
 
 class TelegramBot:
     def __init__(self):
-        self.parser = LLMParser()
+        llm_parser = LLMParser()
+        batcher = None
+        if settings.llm_batch_enabled:
+            batcher = BatchingParser(
+                llm_parser,
+                window_ms=settings.llm_batch_window_ms,
+                max_items=settings.llm_batch_max_items
+            )
+        self.parser = HybridParser(llm_parser=llm_parser, batcher=batcher)
         self.application = None
     
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -26,7 +34,8 @@ class TelegramBot:
             "• 'Ate a chicken salad and a soda'\n\n"
             "Commands:\n"
             "/stats - Get your statistics\n"
-            "/query <question> - Ask questions about your logs"
+            "/query <question> - Ask questions about your logs\n"
+            "/parserstats - How messages were parsed"
         )
     
     async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -47,6 +56,14 @@ class TelegramBot:
                 message += "\nTop Actions:\n"
                 for action, count in list(stats['top_actions'].items())[:5]:
                     message += f"  • {action}: {count}\n"
+                if stats.get('top_projects_minutes'):
+                    message += "\nTop Projects:\n"
+                    for project, minutes in list(stats['top_projects_minutes'].items())[:5]:
+                        message += f"  • {project}: {round(minutes / 60, 1)}h\n"
+                if stats.get('top_tags_minutes'):
+                    message += "\nTop Tags:\n"
+                    for tag, minutes in list(stats['top_tags_minutes'].items())[:5]:
+                        message += f"  • #{tag}: {round(minutes / 60, 1)}h\n"
                 
                 await update.message.reply_text(message)
             except Exception as e:
@@ -71,6 +88,22 @@ class TelegramBot:
             except Exception as e:
                 await update.message.reply_text(f"Error processing query: {str(e)}")
     
+    async def parser_stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /parserstats command"""
+        stats = self.parser.stats()
+        message = "🧠 Parser Statistics\n\n"
+        message += f"Messages: {stats['total']}\n"
+        message += f"Local: {stats['local']['count']} (avg {stats['local']['avg_ms']} ms)\n"
+        message += f"LLM: {stats['llm']['count']} (avg {stats['llm']['avg_ms']} ms)\n"
+        message += f"Skipped LLM: {round(stats['local_ratio'] * 100)}%"
+        if stats['llm_cache']:
+            cache_stats = stats['llm_cache']
+            message += f"\n\nLLM cache hit rate: {round(cache_stats['hit_rate'] * 100)}%\n"
+            message += f"Tokens saved: {cache_stats['tokens_saved']} (lifetime {cache_stats['lifetime_tokens_saved']})"
+        if stats['llm_batches'] and stats['llm_batches']['batches']:
+            message += f"\nLLM requests: {stats['llm_batches']['batches']} (avg {stats['llm_batches']['avg_batch_size']} messages each)"
+        await update.message.reply_text(message)
+    
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle regular messages - parse and log them"""
         text = update.message.text
@@ -78,8 +111,8 @@ class TelegramBot:
         if not text:
             return
         
-        # Parse the message using LLM
-        parsed = self.parser.parse_natural_language(text)
+        # Parse locally; the LLM is only called for messages the local parser is unsure about
+        parsed = await self.parser.aparse(text)
         
         # Create log entry
         log_entry = LogEntryCreate(
@@ -88,7 +121,8 @@ class TelegramBot:
             action=parsed["action"],
             project=parsed.get("project"),
             duration=parsed.get("duration"),
-            tags=parsed.get("tags", [])
+            tags=parsed.get("tags", []),
+            timestamp=parsed.get("timestamp")
         )
         
         # Send to API
@@ -96,11 +130,12 @@ class TelegramBot:
             try:
                 response = await client.post(
                     f"http://localhost:{settings.port}/api/logs",
-                    json=log_entry.dict()
+                    json=log_entry.model_dump(mode="json")
                 )
                 
                 if response.status_code == 200:
                     entry = response.json()
+                    self.parser.learn(entry["action"], entry.get("project"))
                     confirmation = f"✅ Logged: {entry['action']}"
                     if entry.get('duration'):
                         confirmation += f" ({entry['duration']} min)"
@@ -112,18 +147,40 @@ class TelegramBot:
             except Exception as e:
                 await update.message.reply_text(f"❌ Error: {str(e)}")
     
+    async def post_shutdown(self, application: Application):
+        """Finish pending LLM batches and close the shared OpenAI connection pool"""
+        if self.parser.batcher is not None:
+            await self.parser.batcher.stop()
+        await async_clients.aclose()
+    
     def run(self):
         """Start the Telegram bot"""
         if not settings.telegram_token:
             print("Warning: TELEGRAM_TOKEN not set. Telegram bot will not start.")
             return
         
-        self.application = Application.builder().token(settings.telegram_token).build()
+        db = SessionLocal()
+        try:
+            self.parser.local.load_vocabulary(db)
+        except Exception as e:
+            print(f"Warning: could not load parser vocabulary: {str(e)}")
+        finally:
+            db.close()
+        
+        self.application = (
+            Application.builder()
+            .token(settings.telegram_token)
+            .post_shutdown(self.post_shutdown)
+            # Handle messages concurrently so bursts can share LLM batches
+            .concurrent_updates(settings.llm_batch_enabled)
+            .build()
+        )
         
         # Add handlers
         self.application.add_handler(CommandHandler("start", self.start_command))
         self.application.add_handler(CommandHandler("stats", self.stats_command))
         self.application.add_handler(CommandHandler("query", self.query_command))
+        self.application.add_handler(CommandHandler("parserstats", self.parser_stats_command))
         self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
         
         print("🤖 Telegram bot starting...")
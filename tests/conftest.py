@@ -0,0 +1,76 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Settings are read at import time, so the test environment must be in place
+# before any application module is imported.
+_db_dir = tempfile.mkdtemp(prefix="loglify-test-")
+os.environ.setdefault("TELEGRAM_TOKEN", "test-token")
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'loglify.db')}"
+os.environ["LLM_CACHE_PATH"] = os.path.join(_db_dir, "llm_cache.db")
+os.environ["GITHUB_CACHE_PATH"] = os.path.join(_db_dir, "github_cache.db")
+os.environ["SYNC_STATE_PATH"] = os.path.join(_db_dir, "sync_state.db")
+os.environ["SCHEDULER_STATE_PATH"] = os.path.join(_db_dir, "scheduler_state.db")
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from cache import response_cache  # noqa: E402
+from database import Base, engine  # noqa: E402
+from main import app  # noqa: E402
+from retrieval import entry_index  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    """API client on a fresh database, dropped (with the response cache and vector index) afterwards"""
+    with TestClient(app) as test_client:
+        yield test_client
+    Base.metadata.drop_all(bind=engine)
+    response_cache.invalidate()
+    entry_index.clear()
+
+
+@pytest.fixture
+def completion_server(monkeypatch):
+    """
+    Local stand-in for the OpenAI API. Replies with respond(request_json)
+    as the message content and records requests and peak concurrency.
+    """
+    state = {"requests": [], "active": 0, "peak": 0, "respond": lambda request: "", "delay": 0.0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            with lock:
+                state["requests"].append(request)
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(state["delay"])
+            with lock:
+                state["active"] -= 1
+            body = json.dumps({
+                "id": "x", "object": "chat.completion", "created": 0, "model": "test",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": state["respond"](request)}}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_port}/v1")
+    yield state
+    server.shutdown()
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from click.testing import CliRunner
+
+import aggregators.runtime
+from aggregators.base import Aggregator
+from aggregators.cursors import SyncCursors
+from aggregators.local_file import LocalFileAggregator
+from aggregators.runtime import AggregatorRuntime
+from cli import cli
+from config import settings
+from database import dispose_engines
+
+
+class BrokenAggregator(Aggregator):
+    name = "broken"
+
+    async def fetch(self):
+        raise RuntimeError("source unavailable")
+        yield
+
+
+def test_runtime_writes_batches_and_isolates_failing_sources(client, tmp_path, monkeypatch, capsys):
+    """Test that sources run side by side, write directly and resume from their cursors"""
+    monkeypatch.setattr(settings, "aggregator_batch_size", 2)
+    path = tmp_path / "activity.ndjson"
+    lines = [{"action": f"Task {i}", "duration": 10} for i in range(3)]
+    path.write_text("".join(json.dumps(line) + "\n" for line in lines) + "not json\n" + '{"action": "Hal')
+
+    cursors = SyncCursors(str(tmp_path / "sync_state.db"))
+    local_file = LocalFileAggregator(str(path), cursors=cursors)
+    runtime = AggregatorRuntime([local_file, BrokenAggregator(cursors=cursors)])
+
+    async def run():
+        try:
+            return await runtime.run_all()
+        finally:
+            await dispose_engines()
+
+    assert asyncio.run(run()) == {"local_file": True, "broken": False}
+    output = capsys.readouterr().out
+    assert "local_file: 3 inserted" in output
+    assert "broken failed" in output
+
+    # Only the line completed since is read on the next run
+    with open(path, "a") as f:
+        f.write('f marathon"}\n')
+    asyncio.run(run())
+
+    entries = client.get("/api/logs", params={"source": "local_file"}).json()
+    assert sorted(entry["action"] for entry in entries) == ["Half marathon", "Task 0", "Task 1", "Task 2"]
+    assert cursors.get("local_file", str(path)) == str(path.stat().st_size)
+
+
+def test_local_file_resumes_after_the_last_stored_batch(tmp_path, monkeypatch):
+    """Test that a write failing part way keeps the batches stored before it"""
+    monkeypatch.setattr(settings, "aggregator_batch_size", 2)
+    path = tmp_path / "activity.ndjson"
+    path.write_text("".join(json.dumps({"action": f"Task {i}"}) + "\n" for i in range(5)))
+    aggregator = LocalFileAggregator(str(path), cursors=SyncCursors(str(tmp_path / "sync_state.db")))
+    stored = []
+    failures = {"left": 1}
+
+    async def writer(source, entries):
+        # The second batch fails once
+        if len(stored) == 2 and failures["left"]:
+            failures["left"] -= 1
+            raise RuntimeError("database unavailable")
+        stored.extend(entry["action"] for entry in entries)
+        return {"inserted": len(entries)}
+
+    runtime = AggregatorRuntime([aggregator], writer)
+    assert not asyncio.run(runtime.run_once(aggregator))
+    assert asyncio.run(runtime.run_once(aggregator))
+    assert stored == [f"Task {i}" for i in range(5)]
+
+
+def test_cli_sync_runs_the_selected_sources(monkeypatch):
+    """Test that `loglify sync` passes the chosen sources (or all) to the runtime"""
+    requested = []
+
+    async def run_aggregators(names=None):
+        requested.append(names)
+        return {name: True for name in names or ["github", "local_file"]}
+
+    monkeypatch.setattr(aggregators.runtime, "run_aggregators", run_aggregators)
+    runner = CliRunner()
+
+    assert runner.invoke(cli, ["sync"]).exit_code == 0
+    assert runner.invoke(cli, ["sync", "-s", "local_file"]).exit_code == 0
+    assert runner.invoke(cli, ["sync", "--github", "-s", "local_file"]).exit_code == 0
+    assert requested == [None, ["local_file"], ["local_file", "github"]]
+
+
+def test_writes_from_another_process_reach_the_api(client):
+    """Test that cached responses and the vector index see a sync run by another process"""
+    client.post("/api/logs", json={"source": "cli", "action": "Reading", "raw_text": "Read Dune",
+                                   "idempotency_key": "reading-1"})
+    assert client.get("/api/logs/stats").json()["total_logs"] == 1
+    assert len(client.get("/api/logs").json()) == 1
+    assert client.post("/api/query/context", json={"query": "dune"}).json()[0]["action"] == "Reading"
+
+    script = (
+        "import asyncio\n"
+        "from aggregators.runtime import write_entries\n"
+        "from database import dispose_engines\n"
+        "async def main():\n"
+        "    try:\n"
+        "        await write_entries('local_file', [\n"
+        "            {'source': 'local_file', 'action': 'Gym', 'duration': 45},\n"
+        "            {'source': 'cli', 'action': 'Reading', 'raw_text': 'Read Foundation',\n"
+        "             'idempotency_key': 'reading-1'},\n"
+        "        ])\n"
+        "    finally:\n"
+        "        await dispose_engines()\n"
+        "asyncio.run(main())\n"
+    )
+    subprocess.run([sys.executable, "-c", script], cwd=Path(__file__).parent.parent, env=os.environ, check=True)
+
+    assert client.get("/api/logs/stats").json()["total_logs"] == 2
+    assert sorted(entry["action"] for entry in client.get("/api/logs").json()) == ["Gym", "Reading"]
+    assert client.post("/api/query/context", json={"query": "dune"}).json() == []
+    assert client.post("/api/query/context", json={"query": "foundation"}).json()[0]["action"] == "Reading"
@@ -0,0 +1,419 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import database
+import query_planner
+import rollup
+from config import settings
+from database import LogEntry, SessionLocal, AsyncSessionLocal, dispose_engines
+from ingest import GroupCommitWriter, entry_to_row
+from models import LogEntryCreate
+
+
+def test_create_log(client):
+    """Test creating a single log entry"""
+    response = client.post("/api/logs", json={
+        "source": "cli",
+        "action": "Coding",
+        "duration": 30,
+        "metadata": {"key": "value"}
+    })
+
+    assert response.status_code == 200
+    entry = response.json()
+    assert entry["action"] == "Coding"
+    assert entry["metadata"] == {"key": "value"}
+
+
+def test_batch_ingest_reports_item_errors(client):
+    """Test that a batch inserts valid items and reports invalid ones"""
+    entries = [
+        {"source": "import", "action": "Reading", "duration": 20},
+        {"source": "import"},
+        {"source": "import", "action": "Gym", "timestamp": "2024-01-02T08:00:00"},
+    ]
+
+    response = client.post("/api/logs/batch", json=entries)
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["inserted"] == 2
+    assert len(result["ids"]) == 2
+    assert [error["index"] for error in result["errors"]] == [1]
+
+    logs = client.get("/api/logs", params={"source": "import"}).json()
+    assert {log["action"] for log in logs} == {"Reading", "Gym"}
+
+
+def test_ndjson_ingest_reports_rejected_lines(client):
+    """Test streaming NDJSON ingest with a mix of valid and invalid lines"""
+    body = b"\n".join([
+        b'{"action": "Journal", "timestamp": "2019-05-01T21:00:00"}',
+        b'not json',
+        b'',
+        b'{"source": "tracker", "duration": 5}',
+        b'{"source": "tracker", "action": "Run", "duration": 30}',
+    ])
+
+    response = client.post(
+        "/api/logs/ingest",
+        params={"source": "backfill"},
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["accepted"] == 2
+    assert result["rejected"] == 2
+    assert [error["line"] for error in result["errors"]] == [2, 4]
+    assert result["errors_truncated"] is False
+
+
+def test_cursor_pagination_handles_timestamp_ties(client):
+    """Test that keyset pages cover every row once, even with equal timestamps"""
+    entries = [
+        {"source": "paging", "action": f"Entry {i}", "timestamp": f"2024-03-0{1 + i // 3}T10:00:00"}
+        for i in range(7)
+    ]
+    client.post("/api/logs/batch", json=entries)
+
+    seen = []
+    params = {"source": "paging", "limit": 2}
+    while True:
+        response = client.get("/api/logs", params=params)
+        seen.extend(entry["id"] for entry in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        params["cursor"] = cursor
+
+    assert len(seen) == 7
+    assert len(set(seen)) == 7
+
+    response = client.get("/api/logs", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def test_export_streams_filtered_rows(client):
+    """Test NDJSON and CSV export with project and tag filters"""
+    client.post("/api/logs/batch", json=[
+        {"source": "cli", "action": "Deploy", "project": "Loglify", "tags": ["work", "ops"]},
+        {"source": "cli", "action": "Review", "project": "Loglify", "tags": ["work"]},
+        {"source": "cli", "action": "Gym", "tags": ["health"]},
+    ])
+
+    response = client.get("/api/logs/export", params={"project": "Loglify", "tag": ["work", "ops"]})
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["action"] for line in lines] == ["Deploy"]
+
+    response = client.get("/api/logs/export", params={"format": "csv", "project": "Loglify"})
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0][:3] == ["id", "timestamp", "source"]
+    assert len(rows) == 3
+
+    assert client.get("/api/logs/export", params={"format": "xml"}).status_code == 400
+
+
+def test_stats_follow_inserts_updates_and_deletes(client):
+    """Test that the daily rollup tracks every write path"""
+    client.post("/api/logs", json={"source": "cli", "action": "Coding", "project": "Loglify", "duration": 60})
+    client.post("/api/logs/batch", json=[
+        {"source": "github", "action": "GitHub Commit", "project": "Loglify"},
+        {"source": "cli", "action": "Coding", "duration": 30},
+    ])
+
+    stats = client.get("/api/logs/stats").json()
+    assert stats["total_logs"] == 3
+    assert stats["total_duration_minutes"] == 90
+    assert stats["logs_by_source"] == {"cli": 2, "github": 1}
+    assert stats["top_actions"]["Coding"] == 2
+    assert stats["top_projects_minutes"] == {"Loglify": 60}
+
+    db = SessionLocal()
+    try:
+        entry = db.query(LogEntry).filter(LogEntry.duration == 60).one()
+        entry.duration = 90
+        db.commit()
+        db.delete(db.query(LogEntry).filter(LogEntry.source == "github").one())
+        db.commit()
+
+        stats = client.get("/api/logs/stats").json()
+        assert stats["total_logs"] == 2
+        assert stats["total_duration_minutes"] == 120
+
+        rollup.rebuild(db)
+        assert client.get("/api/logs/stats").json() == stats
+    finally:
+        db.close()
+
+    # days=7 is today and the six days before it
+    today = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0)
+    for days_ago in (6, 7):
+        client.post("/api/logs", json={"source": "cli", "action": f"{days_ago} days ago",
+                                       "timestamp": (today - timedelta(days=days_ago)).isoformat()})
+    top_actions = client.get("/api/logs/stats", params={"days": 7}).json()["top_actions"]
+    assert "6 days ago" in top_actions
+    assert "7 days ago" not in top_actions
+
+
+def test_resent_entries_are_deduplicated_by_idempotency_key(client):
+    """Test that re-synced and retried entries update instead of duplicating"""
+    timestamp = datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+    commit = {"source": "github", "action": "GitHub Commit", "project": "Loglify",
+              "timestamp": timestamp, "metadata": {"sha": "abc123", "repo": "Loglify"}}
+    pr = {"source": "github", "action": "GitHub PR (open)", "project": "Loglify", "tags": ["pr"],
+          "timestamp": timestamp, "metadata": {"number": 7, "repo": "Loglify"}}
+
+    first = client.post("/api/logs/batch", json=[commit, pr, commit]).json()
+    assert (first["inserted"], first["unchanged"]) == (2, 0)
+    assert first["ids"][0] == first["ids"][2]
+
+    again = client.post("/api/logs/batch", json=[commit, {**pr, "action": "GitHub PR (closed)"}]).json()
+    assert (again["inserted"], again["updated"], again["unchanged"]) == (0, 1, 1)
+    assert again["ids"] == first["ids"][:2]
+
+    retried = [
+        client.post("/api/logs", json={"source": "cli", "action": "Reading", "duration": 30,
+                                       "idempotency_key": "cli-retry-1"}).json()
+        for _ in range(2)
+    ]
+    assert retried[0]["id"] == retried[1]["id"]
+
+    stats = client.get("/api/logs/stats").json()
+    assert stats["total_logs"] == 3
+    assert stats["top_actions"] == {"GitHub Commit": 1, "GitHub PR (closed)": 1, "Reading": 1}
+    assert [entry["tags"] for entry in client.get("/api/logs", params={"tag": "pr"}).json()] == [["pr"]]
+
+
+def test_tag_filters_and_tag_stats(client):
+    """Test AND/OR tag filtering through the tag index and per-tag durations"""
+    client.post("/api/logs", json={"source": "cli", "action": "Deploy", "duration": 30, "tags": ["Work", "#ops"]})
+    client.post("/api/logs/batch", json=[
+        {"source": "cli", "action": "Review", "duration": 60, "tags": ["work"]},
+        {"source": "cli", "action": "Gym", "duration": 45, "tags": ["health"]},
+    ])
+
+    def actions(**params):
+        return sorted(entry["action"] for entry in client.get("/api/logs", params=params).json())
+
+    assert actions(tag="work") == ["Deploy", "Review"]
+    assert actions(tag=["work", "ops"]) == ["Deploy"]
+    assert actions(tag=["ops", "health"], tag_mode="any") == ["Deploy", "Gym"]
+
+    stats = client.get("/api/logs/stats").json()
+    assert stats["top_tags_minutes"] == {"work": 90, "health": 45, "ops": 30}
+
+    db = SessionLocal()
+    try:
+        entry = db.query(LogEntry).filter(LogEntry.action == "Gym").one()
+        entry.tags = ["health", "ops"]
+        db.commit()
+        assert actions(tag="ops") == ["Deploy", "Gym"]
+
+        rollup.rebuild(db)
+        assert client.get("/api/logs/stats").json()["top_tags_minutes"] == {"work": 90, "ops": 75, "health": 45}
+    finally:
+        db.close()
+
+
+def test_full_text_search_ranks_and_highlights(client):
+    """Test search over raw_text through the text index, including updates"""
+    client.post("/api/logs/batch", json=[
+        {"source": "telegram", "action": "Debugging", "raw_text": "Debugged the migration script for two hours"},
+        {"source": "github", "action": "GitHub Commit", "raw_text": "Fix migration ordering"},
+        {"source": "cli", "action": "Gym"},
+    ])
+
+    results = client.get("/api/logs/search", params={"q": "debugging migration"}).json()
+    assert [result["entry"]["source"] for result in results] == ["telegram"]
+    assert "<mark>" in results[0]["snippet"]
+
+    results = client.get("/api/logs/search", params={"q": "migration"}).json()
+    assert len(results) == 2
+    assert results[0]["rank"] >= results[1]["rank"]
+
+    db = SessionLocal()
+    try:
+        entry = db.query(LogEntry).filter(LogEntry.action == "Gym").one()
+        entry.raw_text = "Leg day before the migration freeze"
+        db.commit()
+    finally:
+        db.close()
+
+    assert len(client.get("/api/logs/search", params={"q": "migration"}).json()) == 3
+    assert len(client.get("/api/logs/search", params={"q": "migra"}).json()) == 3
+    assert client.get("/api/logs/search", params={"q": "\"*"}).json() == []
+
+
+def test_query_context_retrieves_relevant_entries_from_all_history(client):
+    """Test that retrieval finds old matching entries and picks up new ones"""
+    client.post("/api/logs/batch", json=[
+        {"source": "cli", "action": "Exercise", "raw_text": "gym leg day", "duration": 60,
+         "timestamp": "2024-03-05T07:00:00"},
+        {"source": "cli", "action": "Exercise", "raw_text": "gym run", "duration": 30,
+         "timestamp": "2024-04-02T07:00:00"},
+    ] + [
+        {"source": "cli", "action": "Coding", "project": "Loglify", "duration": 45} for _ in range(200)
+    ])
+
+    context = client.post("/api/query/context", json={"query": "How much did I exercise in March?"}).json()
+    assert context[0]["timestamp"].startswith("2024-03-05")
+    assert {entry["action"] for entry in context[:2]} == {"Exercise"}
+
+    client.post("/api/logs", json={"source": "cli", "action": "Reading", "raw_text": "Read Dune",
+                                   "idempotency_key": "reading-1"})
+    context = client.post("/api/query/context", json={"query": "when did I read dune"}).json()
+    assert context[0]["action"] == "Reading"
+
+    # Updated entries are re-embedded, not matched on their old text
+    client.post("/api/logs", json={"source": "cli", "action": "Reading", "raw_text": "Read Foundation",
+                                   "idempotency_key": "reading-1"})
+    assert client.post("/api/query/context", json={"query": "dune"}).json() == []
+    context = client.post("/api/query/context", json={"query": "when did I read foundation"}).json()
+    assert context[0]["action"] == "Reading"
+
+    context = client.post("/api/query/context", json={
+        "query": "exercise", "start_date": "2024-04-01T00:00:00"
+    }).json()
+    assert [entry["timestamp"][:10] for entry in context] == ["2024-04-02"]
+
+
+def test_aggregate_questions_are_answered_with_sql(client):
+    """Test that aggregate questions are planned and answered without the LLM"""
+    client.post("/api/logs/batch", json=[
+        {"source": "cli", "action": "Coding", "project": "DV Website", "duration": 90,
+         "timestamp": "2024-03-04T10:00:00"},
+        {"source": "cli", "action": "Coding", "project": "DV Website", "duration": 60,
+         "timestamp": "2024-03-20T10:00:00"},
+        {"source": "cli", "action": "Coding", "project": "Loglify", "duration": 30,
+         "timestamp": "2024-03-21T10:00:00"},
+        {"source": "github", "action": "GitHub Commit", "project": "Loglify",
+         "timestamp": "2024-04-02T10:00:00"},
+    ])
+
+    body = client.post("/api/query", json={"query": "How many hours on dv website in March 2024?"}).json()
+    assert body["plan"]["filters"] == {"project": "DV Website"}
+    assert body["result"]["minutes"] == 150
+    assert body["answer"] == "DV Website in March 2024: 2.5 hours (2 entries)."
+
+    body = client.post("/api/query", json={"query": "hours per project in March 2024"}).json()
+    assert [group["key"] for group in body["result"]["groups"]] == ["DV Website", "Loglify"]
+
+    body = client.post("/api/query", json={"query": "how many commits in April 2024"}).json()
+    assert body["plan"]["metric"] == "count"
+    assert body["result"]["entries"] == 1
+
+    # Totals count each entry once, whatever its tags
+    client.post("/api/logs/batch", json=[
+        {"source": "cli", "action": "Review", "duration": 60, "tags": ["work", "code"],
+         "timestamp": "2024-05-06T10:00:00"},
+        {"source": "cli", "action": "Walk", "duration": 30, "timestamp": "2024-05-07T10:00:00"},
+    ])
+    body = client.post("/api/query", json={"query": "hours per tag in May 2024"}).json()
+    assert body["plan"]["group_by"] == "tag"
+    assert (body["result"]["entries"], body["result"]["minutes"]) == (2, 90)
+    assert sorted(group["key"] for group in body["result"]["groups"]) == ["code", "work"]
+    assert body["answer"].startswith("All activities in May 2024: 1.5 hours (2 entries)")
+
+    # Anything the planner does not fully understand goes to the LLM
+    assert query_planner.plan_query("how many hours did I feel tired", {"project": ["DV Website"]}) is None
+
+
+def test_cached_stats_are_invalidated_by_writes(client):
+    """Test that cached responses are reused until the data changes"""
+    client.post("/api/logs", json={"source": "cli", "action": "Reading"})
+
+    before = client.get("/api/cache/stats").json()
+    first = client.get("/api/logs/stats").json()
+    second = client.get("/api/logs/stats").json()
+    after = client.get("/api/cache/stats").json()
+
+    assert first == second
+    assert after["hits"] == before["hits"] + 1
+    assert after["misses"] == before["misses"] + 1
+
+    client.post("/api/logs/batch", json=[{"source": "cli", "action": "Reading"}])
+    assert client.get("/api/logs/stats").json()["total_logs"] == first["total_logs"] + 1
+
+
+def test_group_commit_writer_batches_concurrent_writes(client):
+    """Test that concurrent single-entry writes share commits"""
+    writer = GroupCommitWriter(AsyncSessionLocal, window_ms=20, max_batch=100)
+
+    async def write_many():
+        await writer.start()
+        try:
+            rows = [entry_to_row(LogEntryCreate(source="bench", action=f"Entry {i}")) for i in range(50)]
+            return await asyncio.gather(*(writer.submit(row) for row in rows))
+        finally:
+            await writer.stop()
+            await dispose_engines()
+
+    ids = asyncio.run(write_many())
+
+    assert len(set(ids)) == 50
+    assert writer.rows == 50
+    assert writer.batches < 5
+
+
+def test_group_commit_writer_refuses_rows_while_stopping(client):
+    """Test that rows submitted during stop() fail instead of hanging"""
+    writer = GroupCommitWriter(AsyncSessionLocal, window_ms=20, max_batch=100)
+    row = entry_to_row(LogEntryCreate(source="bench", action="Entry"))
+
+    async def stop_while_writing():
+        await writer.start()
+        try:
+            first = asyncio.create_task(writer.submit(row))
+            await asyncio.sleep(0)
+            stopping = asyncio.create_task(writer.stop())
+            await asyncio.sleep(0)
+            with pytest.raises(RuntimeError):
+                await asyncio.wait_for(writer.submit(row), timeout=1)
+            await stopping
+            return await first
+        finally:
+            await dispose_engines()
+
+    assert isinstance(asyncio.run(stop_while_writing()), int)
+    assert writer.rows == 1
+
+
+def test_sqlite_performance_profile(client, monkeypatch):
+    """Test WAL on pooled connections, the read-only pool and maintenance"""
+    writer = create_async_engine(database.async_database_url(settings.database_url))
+    database.apply_sqlite_profile(writer)
+    reader = database.create_sqlite_read_engine(settings.database_url)
+    monkeypatch.setattr(database, "sqlite_profile_enabled", True)
+
+    async def check():
+        try:
+            async with writer.connect() as conn:
+                assert (await conn.exec_driver_sql("PRAGMA journal_mode")).scalar() == "wal"
+                await conn.exec_driver_sql("INSERT INTO log_entries (source, action) VALUES ('cli', 'Coding')")
+                await conn.commit()
+
+            async with reader.connect() as conn:
+                assert (await conn.exec_driver_sql("SELECT count(*) FROM log_entries")).scalar() == 1
+                with pytest.raises(OperationalError, match="readonly"):
+                    await conn.exec_driver_sql("DELETE FROM log_entries")
+
+            await database.run_sqlite_maintenance()
+            async with writer.connect() as conn:
+                # ANALYZE wrote planner statistics
+                assert (await conn.exec_driver_sql("SELECT count(*) FROM sqlite_stat1")).scalar() > 0
+        finally:
+            await writer.dispose()
+            await reader.dispose()
+            await dispose_engines()
+
+    asyncio.run(check())
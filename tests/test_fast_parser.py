@@ -0,0 +1,56 @@
+from datetime import datetime
+
+from fast_parser import HybridParser, LocalParser
+
+
+class StubLLMParser:
+    """Stands in for LLMParser so no API call is made"""
+
+    def __init__(self):
+        self.calls = []
+
+    def parse_natural_language(self, text):
+        self.calls.append(text)
+        return {"action": "Fixing", "project": None, "duration": 120.0, "tags": ["backend"]}
+
+
+def test_simple_messages_parse_locally():
+    """Test action, project, duration and tag extraction without the LLM"""
+    parser = LocalParser()
+    parser.learn(project="Loglify")
+
+    parsed = parser.parse("gym 45m")
+    assert parsed["action"] == "Exercise"
+    assert parsed["duration"] == 45.0
+    assert parsed["confidence"] == 1.0
+
+    parsed = parser.parse("coding loglify 1h30m #Backend")
+    assert parsed["action"] == "Coding"
+    assert parsed["project"] == "Loglify"
+    assert parsed["duration"] == 90.0
+    assert parsed["tags"] == ["backend"]
+    assert parsed["confidence"] == 1.0
+
+    parsed = parser.parse("reading @novel yesterday at 21:15", now=datetime(2024, 5, 10, 12, 0))
+    assert parsed["project"] == "novel"
+    assert parsed["timestamp"] is not None
+
+
+def test_low_confidence_messages_go_to_llm():
+    """Test routing between the local parser and the LLM, with metrics"""
+    llm = StubLLMParser()
+    parser = HybridParser(llm_parser=llm, min_confidence=0.75, enabled=True)
+
+    assert parser.parse("gym 45m")["action"] == "Exercise"
+    parsed = parser.parse("I just spent 2 hours fixing a bug in the backend")
+    assert parsed["action"] == "Fixing"
+
+    # A project the parser has not learned is left to the LLM instead of dropped
+    assert parser.local.parse("coding loglify 2h #backend")["confidence"] < 0.75
+    parser.parse("coding loglify 2h #backend")
+    assert llm.calls == ["I just spent 2 hours fixing a bug in the backend", "coding loglify 2h #backend"]
+
+    stats = parser.stats()
+    assert stats["local"]["count"] == 1
+    assert stats["llm"]["count"] == 2
+    assert stats["local_ratio"] == round(1 / 3, 4)
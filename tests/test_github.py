@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode
+
+import pytest
+
+from aggregators.cursors import SyncCursors
+from aggregators.github import GitHubAggregator
+from aggregators.http_cache import ConditionalCache
+from aggregators.runtime import AggregatorRuntime
+from config import settings
+
+
+def commit(sha, date):
+    return {"sha": sha, "commit": {"message": f"Commit {sha}", "author": {"date": date},
+                                   "committer": {"date": date}}}
+
+
+def pull(number, updated_at, login="octocat"):
+    return {"number": number, "title": f"PR {number}", "state": "open", "created_at": updated_at,
+            "updated_at": updated_at, "user": {"login": login}}
+
+
+@pytest.fixture
+def github_server(monkeypatch):
+    """
+    Local stand-in for the GitHub API. Serves state["commits"][repo] and
+    state["pulls"][repo] (newest first; one of each by default) in pages
+    with Link headers after a short delay, with an ETag (304 when it
+    matches); the first `limited` requests get a secondary rate limit.
+    Records requests, client ports and peak concurrency.
+    """
+    state = {"requests": [], "ports": set(), "active": 0, "peak": 0, "delay": 0.05,
+             "limited": 0, "not_modified": 0, "commits": {}, "pulls": {}}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            with lock:
+                state["requests"].append(self.path)
+                state["ports"].add(self.client_address[1])
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(state["delay"])
+            with lock:
+                state["active"] -= 1
+
+            with lock:
+                limited = state["limited"] > 0
+                state["limited"] -= limited
+            if limited:
+                self.send_response(403)
+                self.send_header("Retry-After", "0")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            path, _, query = self.path.partition("?")
+            query = dict(parse_qsl(query))
+            repo = path.split("/")[3]
+            if path.endswith("/commits"):
+                items = state["commits"].get(repo, [commit(f"{repo}-1", "2030-01-01T10:00:00Z")])
+                if "since" in query:
+                    items = [item for item in items if item["commit"]["committer"]["date"] >= query["since"]]
+            else:
+                items = state["pulls"].get(repo, [pull(1, "2030-01-01T11:00:00Z")])
+
+            per_page, page = int(query.get("per_page", 30)), int(query.get("page", 1))
+            body = json.dumps(items[(page - 1) * per_page:page * per_page]).encode()
+            etag = f'"{hashlib.md5(body).hexdigest()}"'
+            headers = {"ETag": etag, "X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "4000",
+                       "X-RateLimit-Reset": str(int(time.time()) + 3600)}
+            if page * per_page < len(items):
+                next_url = f"http://{self.headers['Host']}{path}?{urlencode({**query, 'page': page + 1})}"
+                headers["Link"] = f'<{next_url}>; rel="next"'
+
+            if self.headers.get("If-None-Match") == etag:
+                state["not_modified"] += 1
+                self.send_response(304)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(settings, "github_token", "test-token")
+    monkeypatch.setattr(settings, "github_username", "octocat")
+    monkeypatch.setattr(settings, "github_api_url", f"http://127.0.0.1:{server.server_port}")
+    yield state
+    server.shutdown()
+
+
+def test_repos_are_fetched_concurrently_over_pooled_connections(github_server, monkeypatch, capsys):
+    """Test that a sync overlaps requests up to the limit and reuses connections"""
+    monkeypatch.setattr(settings, "github_repos", ",".join(f"octocat/repo{i}" for i in range(10)))
+    monkeypatch.setattr(settings, "github_max_concurrency", 4)
+
+    aggregator = GitHubAggregator()
+    commits, prs = asyncio.run(aggregator.fetch_all(since=None))
+
+    assert len(commits) == 10 and len(prs) == 10
+    assert len(github_server["requests"]) == 20
+    assert github_server["peak"] == 4
+    # Four at a time, on at most four connections
+    assert len(github_server["ports"]) <= 4
+    assert "octocat/repo0: 1 commits, 1 PRs in" in capsys.readouterr().out
+
+
+def test_unchanged_pages_are_revalidated_and_rate_limits_retried(github_server, monkeypatch, tmp_path):
+    """Test ETag revalidation across aggregator instances and Retry-After handling"""
+    monkeypatch.setattr(settings, "github_repos", "octocat/a,octocat/b")
+    cache_path = str(tmp_path / "github_cache.db")
+
+    github_server["limited"] = 2
+    aggregator = GitHubAggregator(cache=ConditionalCache(cache_path))
+    first = asyncio.run(aggregator.fetch_all())
+    assert aggregator.rate_limiter.retries == 2
+    assert aggregator.rate_limiter.remaining == 4000
+
+    # A later sync (new process) sends the stored ETags and reuses the bodies
+    aggregator = GitHubAggregator(cache=ConditionalCache(cache_path))
+    assert asyncio.run(aggregator.fetch_all()) == first
+    assert aggregator.stats == {"requests": 4, "not_modified": 4}
+    assert github_server["not_modified"] == 4
+
+
+def test_syncs_continue_from_cursors_and_stop_paginating_early(github_server, monkeypatch, tmp_path):
+    """Test that a sync only fetches and logs activity since the previous one"""
+    monkeypatch.setattr(settings, "github_repos", "octocat/busy")
+    github_server["delay"] = 0
+    github_server["commits"]["busy"] = [
+        commit(f"c{i}", f"2030-01-01T{i // 60:02d}:{i % 60:02d}:00Z") for i in range(150, 0, -1)
+    ]
+    github_server["pulls"]["busy"] = [
+        pull(i, f"2030-01-01T{i // 60:02d}:{i % 60:02d}:30Z", "octocat" if i % 10 else "someone")
+        for i in range(250, 0, -1)
+    ]
+
+    def sync():
+        aggregator = GitHubAggregator(
+            cache=ConditionalCache(str(tmp_path / "github_cache.db")),
+            cursors=SyncCursors(str(tmp_path / "sync_state.db"))
+        )
+        posted = []
+
+        async def writer(source, entries):
+            posted.extend(entries)
+            return {"inserted": len(entries)}
+
+        github_server["requests"].clear()
+        assert asyncio.run(AggregatorRuntime([aggregator], writer).run_once(aggregator))
+        return posted
+
+    posted = sync()
+    assert len(posted) == 150 + 225
+    # Two pages of commits and three of PRs
+    assert len(github_server["requests"]) == 5
+
+    github_server["commits"]["busy"].insert(0, commit("c151", "2030-01-01T02:31:00Z"))
+    github_server["pulls"]["busy"].insert(0, pull(7, "2030-01-01T05:00:00Z"))
+    posted = sync()
+    assert sorted(entry["raw_text"] for entry in posted) == ["Commit c151", "PR 7"]
+    assert len(github_server["requests"]) == 2
+
+    # Nothing new: one small page per stream, the unchanged PR page as a 304
+    assert sync() == []
+    assert len(github_server["requests"]) == 2
+    assert github_server["not_modified"] == 1
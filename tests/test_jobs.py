@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from jobs import CronTrigger, IntervalTrigger, JobScheduler, JobStore
+
+
+def test_cron_trigger_next_run():
+    """Test cron fields, weekday numbering and the last day of the month"""
+    assert CronTrigger("*/15 * * * *").next_after(datetime(2024, 3, 8, 10, 7, 30)) == datetime(2024, 3, 8, 10, 15)
+    # Friday evening -> Monday morning
+    assert CronTrigger("30 9 * * 1-5").next_after(datetime(2024, 3, 8, 10, 0)) == datetime(2024, 3, 11, 9, 30)
+    assert CronTrigger("0 22 * * 0").next_after(datetime(2024, 3, 10, 22, 0)) == datetime(2024, 3, 17, 22, 0)
+    assert CronTrigger("0 22 L * *").next_after(datetime(2024, 2, 10)) == datetime(2024, 2, 29, 22, 0)
+    assert CronTrigger("0 0 29 2 *").next_after(datetime(2024, 3, 1)) == datetime(2028, 2, 29, 0, 0)
+    # Day and weekday both set: either matches
+    assert CronTrigger("0 0 1 * 0").next_after(datetime(2024, 3, 1, 12, 0)) == datetime(2024, 3, 3, 0, 0)
+
+
+def test_scheduler_catches_up_and_records_failures(tmp_path):
+    """Test missed-run catch-up, timeouts and failures in the persisted job state"""
+    store = JobStore(str(tmp_path / "scheduler_state.db"))
+    start = datetime(2024, 3, 8, 10, 0, 30)
+    missed = datetime(2024, 3, 8, 8, 0)
+    store.schedule("report", "cron 0 * * * *", missed)
+    store.schedule("stale", "cron 0 * * * *", missed - timedelta(days=2))
+    calls = {"report": [], "stale": [], "flaky": 0}
+
+    # Virtual time: sleeping moves the clock forward, and a job whose next
+    # run is after the horizon stays asleep; once all four are, the test ends
+    clock = {"now": start, "parked": 0}
+    horizon = start + timedelta(seconds=0.3)
+    all_parked = asyncio.Event()
+
+    async def sleep(seconds):
+        wake = clock["now"] + timedelta(seconds=seconds)
+        if wake > horizon:
+            clock["parked"] += 1
+            if clock["parked"] == 4:
+                all_parked.set()
+            await asyncio.Event().wait()
+        clock["now"] = max(clock["now"], wake)
+        await asyncio.sleep(0)
+
+    async def report(run_at):
+        calls["report"].append(run_at)
+
+    async def stale(run_at):
+        calls["stale"].append(run_at)
+
+    async def slow(run_at):
+        await asyncio.Event().wait()
+
+    async def flaky(run_at):
+        calls["flaky"] += 1
+        raise RuntimeError("source unavailable")
+
+    scheduler = JobScheduler(store, jitter_seconds=0, catch_up_hours=24,
+                             clock=lambda: clock["now"], sleep=sleep)
+    scheduler.add_job("report", report, CronTrigger("0 * * * *"))
+    scheduler.add_job("stale", stale, CronTrigger("0 * * * *"))
+    scheduler.add_job("slow", slow, IntervalTrigger(60), timeout_minutes=0.001)
+    # Every 0.12 s: at 0, 0.12 and 0.24 s before the horizon
+    scheduler.add_job("flaky", flaky, IntervalTrigger(0.002))
+
+    async def run():
+        task = asyncio.create_task(scheduler.run())
+        await all_parked.wait()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(run())
+
+    # Caught up once, for the time it was missed; too-late runs are dropped
+    assert calls["report"] == [missed]
+    assert calls["stale"] == []
+    states = {state["name"]: state for state in scheduler.status()}
+    assert states["report"]["last_status"] == "ok"
+    assert datetime.fromtimestamp(states["report"]["next_run"]) == datetime(2024, 3, 8, 11, 0)
+    assert datetime.fromtimestamp(states["stale"]["next_run"]) == datetime(2024, 3, 8, 11, 0)
+    assert states["slow"]["last_status"] == "timeout"
+    assert states["flaky"]["runs"] == calls["flaky"] == 3
+    assert states["flaky"]["consecutive_failures"] == states["flaky"]["failures"] == 3
+    assert states["flaky"]["last_error"] == "source unavailable"
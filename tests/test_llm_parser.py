@@ -1,5 +1,11 @@
-import pytest
-from llm_parser import LLMParser
+import asyncio
+import json
+from types import SimpleNamespace
+
+from config import settings
+from context_builder import build_context, count_tokens
+from llm_cache import LLMCache, cache_key
+from llm_parser import PARSE_PROMPT_VERSION, BatchingParser, LLMParser, async_clients
 
 
 def test_duration_extraction():
@@ -22,3 +28,104 @@ def test_parse_natural_language_mock():
     duration = parser._extract_duration(text)
     assert duration == 120.0
 
+
+def test_parse_results_are_cached(tmp_path):
+    """Test that repeat messages are served from the cache without an API call"""
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        message = SimpleNamespace(content='{"action": "Standup", "project": null, "duration": 15, "tags": ["work"]}')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=SimpleNamespace(total_tokens=120))
+
+    cache = LLMCache(str(tmp_path / "llm_cache.db"), ttl_seconds=3600, max_entries=10, memory_entries=10)
+    parser = LLMParser(cache=cache)
+    parser.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    first = parser.parse_natural_language("Standup")
+    assert parser.parse_natural_language("  standup! ") == first
+    assert len(calls) == 1
+
+    # Results are copies; changing one does not change the cached parse
+    first["tags"].append("edited")
+    assert parser.parse_natural_language("Standup")["tags"] == ["work"]
+
+    # A new process only has the on-disk tier
+    restarted = LLMCache(str(tmp_path / "llm_cache.db"), ttl_seconds=3600, max_entries=10, memory_entries=10)
+    assert restarted.get(cache_key("Standup", parser.model, PARSE_PROMPT_VERSION))["tags"] == ["work"]
+
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["tokens_saved"] == 240
+
+
+def test_async_calls_share_a_bounded_client(tmp_path, monkeypatch, completion_server):
+    """Test that async calls run concurrently up to OPENAI_MAX_CONCURRENCY"""
+    completion_server["respond"] = lambda request: "You coded for 2 hours."
+    completion_server["delay"] = 0.05
+    monkeypatch.setattr(settings, "openai_max_concurrency", 2)
+
+    parser = LLMParser(cache=LLMCache(str(tmp_path / "llm_cache.db"), 3600, 10, 10))
+
+    async def ask_many():
+        try:
+            return await asyncio.gather(*(parser.aanswer_query("How long?", []) for _ in range(6)))
+        finally:
+            await async_clients.aclose()
+
+    answers = asyncio.run(ask_many())
+
+    assert answers == ["You coded for 2 hours."] * 6
+    assert completion_server["peak"] == 2
+
+
+def test_bursts_are_parsed_in_one_request(tmp_path, completion_server):
+    """Test micro-batching, including per-item fallback for skipped items"""
+    def respond(request):
+        # Parse every input except the last one
+        lines = request["messages"][1]["content"].split("Inputs:\n")[1].split("\n\n")[0].splitlines()
+        return json.dumps({"entries": [
+            {"index": index, "action": "Note", "project": None, "duration": None, "tags": []}
+            for index in range(1, len(lines))
+        ]})
+
+    completion_server["respond"] = respond
+    parser = LLMParser(cache=LLMCache(str(tmp_path / "llm_cache.db"), 3600, 10, 10))
+    batcher = BatchingParser(parser, window_ms=50, max_items=10)
+    texts = [f"note {i}" for i in range(4)] + ["walked the dog for 20 minutes"]
+
+    async def parse_burst():
+        try:
+            return await asyncio.gather(*(batcher.parse(text) for text in texts))
+        finally:
+            await batcher.stop()
+            await async_clients.aclose()
+
+    results = asyncio.run(parse_burst())
+
+    assert len(completion_server["requests"]) == 1
+    assert [result["action"] for result in results[:4]] == ["Note"] * 4
+    assert results[4]["action"] == "walked the dog for 20 minutes"
+    assert results[4]["duration"] == 20.0
+    assert batcher.stats()["avg_batch_size"] == 5
+
+
+def test_query_context_is_collapsed_and_fits_the_budget():
+    """Test that repeated entries share a line and long contexts are trimmed"""
+    commits = [
+        {"action": "GitHub Commit", "project": "Loglify", "duration": None,
+         "timestamp": f"2024-03-05T{hour:02d}:00:00", "tags": ["github"]}
+        for hour in range(9, 18)
+    ]
+    assert build_context(commits) == "2024-03-05 09:00-17:00 GitHub Commit x9 @Loglify #github"
+
+    tasks = [
+        {"action": f"Task {i}", "project": None, "duration": 30 + i,
+         "timestamp": f"2024-03-{i % 28 + 1:02d}T10:00:00", "tags": []}
+        for i in range(300)
+    ]
+    context = build_context(commits + tasks, max_tokens=200)
+    assert count_tokens(context) <= 200
+    assert "Task 299" in context
+    assert context.splitlines()[-1].startswith("...")
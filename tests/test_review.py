@@ -0,0 +1,53 @@
+import asyncio
+from datetime import date, datetime
+
+from database import AsyncSessionLocal, Base, LogEntry, SessionLocal, dispose_engines, engine, init_db
+from llm_parser import async_clients
+from review import DailyReview
+
+
+def test_review_summaries_are_stored_and_reused(completion_server):
+    """Test that days are only summarized again when their entries change"""
+    completion_server["respond"] = lambda request: "A productive day."
+    init_db()
+    db = SessionLocal()
+    db.add_all([
+        LogEntry(source="cli", action="Coding", duration=60, timestamp=datetime(2024, 3, 4, 10)),
+        LogEntry(source="cli", action="Reading", duration=30, timestamp=datetime(2024, 3, 5, 21)),
+    ])
+    db.commit()
+
+    async def run(coro_fn):
+        try:
+            return await coro_fn()
+        finally:
+            await async_clients.aclose()
+            await dispose_engines()
+
+    review = DailyReview()
+    try:
+        counts = asyncio.run(run(lambda: review.backfill(date(2024, 3, 3), date(2024, 3, 6), 2)))
+        assert counts == {"summarized": 2, "empty": 2, "failed": 0}
+        assert len(completion_server["requests"]) == 2
+
+        asyncio.run(run(lambda: review.backfill(date(2024, 3, 3), date(2024, 3, 6))))
+        assert len(completion_server["requests"]) == 2
+
+        db.add(LogEntry(source="cli", action="Gym", duration=45, timestamp=datetime(2024, 3, 5, 7)))
+        db.commit()
+
+        async def weekly():
+            async with AsyncSessionLocal() as session:
+                return await review.summarize_period(session, "week", date(2024, 3, 6))
+
+        summary = asyncio.run(run(weekly))
+        # Only the changed day and the week itself
+        assert len(completion_server["requests"]) == 4
+        assert "A productive day." in completion_server["requests"][-1]["messages"][1]["content"]
+        assert (summary.start, summary.entry_count, summary.duration_sum) == (date(2024, 3, 4), 3, 135)
+
+        asyncio.run(run(weekly))
+        assert len(completion_server["requests"]) == 4
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)